@@ -13,3 +13,10 @@ administrators = [
 
     # 'pigboy@4cikGaYjWGam955VmYbH3rAq1oN7MGcD7K',
 ]
+
+#
+#  Reports are aggregated into digests
+#
+report_interval = 60  # seconds between digests
+report_limit = 30     # max digests per hour (0 means unlimited)
+report_details = 10   # max event lines in a digest
@@ -21,3 +21,40 @@ ans_reserved_records = {
     'moki': 'moki@4WDfe3zZ4T7opFSi3iDAKiuTnUHjxmXekk',
     'hulk': 'hulk@4YeVEN3aUnvC1DNUufCq1bs9zoBSJTzVEj',
 }
+
+#
+#  Directory layout for entities
+#
+#      'flat'    - '.dim/public/{ADDRESS}'
+#      'sharded' - '.dim/public/ab/cd/{ADDRESS}', run 'tools/dbtool.py migrate'
+#                  after switching, the old directories are still readable
+#                  while migrating.
+#
+db_layout = 'flat'
+
+#
+#  Memory caches: {name: (max_entries, max_bytes)}
+#
+cache_capacities = {
+    'meta': (100000, 128 * 1024 * 1024),
+    'profile': (100000, 128 * 1024 * 1024),
+    'device': (100000, 32 * 1024 * 1024),
+    'contacts': (10000, 32 * 1024 * 1024),
+    'contacts_command': (10000, 32 * 1024 * 1024),
+    'block_command': (10000, 16 * 1024 * 1024),
+    'mute_command': (10000, 16 * 1024 * 1024),
+    'members': (10000, 64 * 1024 * 1024),
+}
+
+#
+#  Offline messages are delivered in lanes by weights:
+#
+#      [commands, text & others, images & voices, files & videos]
+#
+msg_lane_weights = [8, 4, 2, 1]
+
+# seconds to remember the missing profiles/device tokens/contacts...
+cache_missing_ttl = 300
+
+# evict cache entries changed by other processes (station, web server, robots)
+cache_watching = True
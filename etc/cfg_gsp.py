@@ -22,6 +22,29 @@ station_name = 'Genesis Station (GZ)'
 station_host = '0.0.0.0'
 station_port = 9394
 
+# workers pushing offline messages, guests are sharded by ID hash
+station_receptionists = 4
+
+# local HTTP port for metrics (Prometheus text format), 0 means disabled
+station_metrics_port = 9395
+
+# log messages processed slower than this (seconds) with stage breakdown
+station_slow_message = 1.0
+
+# log level ('debug', 'info', 'warning', 'error') and file rotated by size (None for stdout)
+station_log_level = 'info'
+station_log_file = None
+station_log_max_bytes = 64 * 1024 * 1024
+station_log_backups = 5
+
+# close connections without any data in these seconds,
+# clients which have sent heartbeats ('\n') are expected to keep sending them
+station_idle_timeout = 600
+station_heartbeat_timeout = 180
+
+# seconds between rebuilding the online users snapshot (for 'users' command)
+station_users_refresh = 10
+
 #
 #  All Station List
 #
@@ -59,6 +59,10 @@ class SearchCommandProcessor(CommandProcessor):
         results = content.get('results')
         if results is not None:
             print('      results:', json.dumps(results))
+        # next page
+        cursor = content.get('cursor')
+        if cursor is not None:
+            print('      cursor:', cursor)
         return None
 
 
@@ -34,6 +34,8 @@ from .utils import base64_encode, base64_decode
 from .utils import hex_encode, hex_decode
 from .utils import sha1
 from .utils import Log
+from .utils import Metrics, MetricsServer
+from .utils import MessageTrace
 
 from .protocol import SearchCommand
 from .cpu import *
@@ -52,6 +54,8 @@ __all__ = [
     'hex_encode', 'hex_decode',
     'sha1',
     'Log',
+    'Metrics', 'MetricsServer',
+    'MessageTrace',
 
     #
     #   Protocol
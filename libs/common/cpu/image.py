@@ -46,10 +46,10 @@ class ImageContentProcessor(ContentProcessor):
         super().__init__(messenger=messenger)
 
     def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
 
     def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
 
     #
     #   main
@@ -50,10 +50,10 @@ class TextContentProcessor(ContentProcessor):
         self.__dialog: Dialog = None
 
     def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
 
     def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
 
     @property
     def bots(self) -> list:
@@ -29,11 +29,16 @@
 
 """
 
+import os
+from typing import Optional
+
 from dimp import PrivateKey
 from dimp import ID, Meta, Profile
 from dimp import Command
 from dimp import ReliableMessage
 
+from ..utils import LRUCache
+
 from .storage import Storage
 from .private_table import PrivateKeyTable
 from .meta_table import MetaTable
@@ -42,6 +47,8 @@ from .user_table import UserTable
 from .group_table import GroupTable
 from .message_table import MessageTable
 from .ans_table import AddressNameTable
+from .watcher import ChangeWatcher
+from .name_index import NameIndex
 
 
 __all__ = [
@@ -68,6 +75,13 @@ class Database:
         self.__message_table = MessageTable()
         # ANS
         self.__ans_table = AddressNameTable()
+        # full-text index of names, updated on saving profiles
+        self.__names = NameIndex()
+        self.__meta_table.names = self.__names
+        self.__profile_table.names = self.__names
+        self.__meta_table.scanner = self.__profile_table.scan_names
+        # cross-process cache invalidation
+        self.__watcher: ChangeWatcher = None
 
     @property
     def base_dir(self) -> str:
@@ -77,6 +91,84 @@ class Database:
     def base_dir(self, root: str):
         Storage.root = root
 
+    @property
+    def layout(self) -> str:
+        return Storage.layout
+
+    @layout.setter
+    def layout(self, value: str):
+        assert value in ['flat', 'sharded'], 'directory layout error: %s' % value
+        Storage.layout = value
+
+    @staticmethod
+    def migrate_layout() -> int:
+        """ Move entity directories into the sharded layout """
+        return Storage.migrate()
+
+    """
+        Memory Caches
+        ~~~~~~~~~~~~~
+
+        capacities: {name: (max_entries, max_bytes)}
+    """
+    @staticmethod
+    def resize_caches(capacities: dict):
+        for name, (max_entries, max_bytes) in capacities.items():
+            cache = LRUCache.cache(name=name)
+            if cache is not None:
+                cache.resize(max_entries=max_entries, max_bytes=max_bytes)
+
+    @property
+    def missing_ttl(self) -> float:
+        """ Seconds to remember the files not exist """
+        return LRUCache.missing_ttl
+
+    @missing_ttl.setter
+    def missing_ttl(self, value: float):
+        LRUCache.missing_ttl = value
+
+    @staticmethod
+    def avoided_probes() -> int:
+        """ Count of disk probes saved by remembering missing files """
+        return sum([item['avoided'] for item in LRUCache.all_statistics()])
+
+    @staticmethod
+    def cache_statistics() -> list:
+        return LRUCache.all_statistics()
+
+    @staticmethod
+    def dump_caches() -> str:
+        return LRUCache.dump()
+
+    def start_watching(self, interval: float=1.0):
+        """ Log local changes, and evict cache entries changed by other processes """
+        if self.__watcher is not None:
+            return
+        Storage.log_changes = True
+        self.__watcher = ChangeWatcher(path=Storage.changes_path(), callback=self.evict, interval=interval)
+        self.__watcher.start()
+
+    def stop_watching(self):
+        if self.__watcher is not None:
+            self.__watcher.stop()
+            self.__watcher = None
+
+    def evict(self, table: str, identifier: str):
+        identifier = Storage.identifier(string=identifier)
+        if table == 'meta':
+            self.__meta_table.evict(identifier=identifier)
+        elif table == 'profile':
+            self.__profile_table.evict(identifier=identifier)
+        elif table == 'members':
+            self.__group_table.evict(identifier=identifier)
+        elif table == 'groups':
+            self.__group_table.evict_groups(identifier=identifier)
+
+    @staticmethod
+    def flush():
+        """ Sync pending directory entries to disk """
+        Storage.flush()
+
     """
         Private Key file for Users
         ~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -210,6 +302,7 @@ class Database:
         ~~~~~~~~~~~~~
 
         file path: '.dim/protected/{ADDRESS}/members.txt'
+        file path: '.dim/protected/{ADDRESS}/members.delta'
     """
     def save_members(self, members: list, group: ID) -> bool:
         return self.__group_table.save_members(members=members, group=group)
@@ -217,6 +310,61 @@ class Database:
     def members(self, group: ID) -> list:
         return self.__group_table.members(group=group)
 
+    def exists_member(self, member: ID, group: ID) -> bool:
+        return self.__group_table.exists_member(member=member, group=group)
+
+    def add_member(self, member: ID, group: ID) -> bool:
+        return self.__group_table.add_member(member=member, group=group)
+
+    def remove_member(self, member: ID, group: ID) -> bool:
+        return self.__group_table.remove_member(member=member, group=group)
+
+    """
+        Groups of User
+        ~~~~~~~~~~~~~~
+
+        file path: '.dim/protected/{ADDRESS}/groups.txt'
+    """
+    def groups(self, member: ID) -> list:
+        return self.__group_table.groups(member=member)
+
+    def rebuild_groups(self) -> int:
+        """ Rebuild groups of all users from group members, return count of groups """
+        mapping = {}
+        stale = []
+        count = 0
+        for address, path in Storage.scan_directories(category='protected'):
+            if os.path.exists(os.path.join(path, 'groups.txt')):
+                stale.append(address)
+            if not os.path.exists(os.path.join(path, 'members.txt')):
+                continue
+            group = Storage.identifier(string=address)
+            if group is None or not group.type.is_group():
+                continue
+            meta = self.meta(identifier=group)
+            if meta is not None:
+                # the ID contains group name
+                group = meta.generate_identifier(network=group.type)
+            members = self.members(group=group)
+            if members is None:
+                continue
+            for item in members:
+                array = mapping.get(item)
+                if array is None:
+                    mapping[item] = [group]
+                else:
+                    array.append(group)
+            count = count + 1
+        for item, groups in mapping.items():
+            self.__group_table.save_groups(groups=groups, member=item)
+        # clear users not in any group now
+        users = set([str(Storage.identifier(string=item).address) for item in mapping.keys()])
+        for address in stale:
+            if address not in users:
+                self.__group_table.save_groups(groups=[], member=address)
+        Storage.info('Rebuilt groups for %d user(s) from %d group(s)' % (len(mapping), count))
+        return count
+
     def founder(self, group: ID) -> ID:
         return self.__group_table.founder(group=group)
 
@@ -238,18 +386,49 @@ class Database:
     def remove_message_batch(self, batch: dict, removed_count: int) -> bool:
         return self.__message_table.remove_message_batch(batch=batch, removed_count=removed_count)
 
+    @property
+    def lane_weights(self) -> list:
+        """ Delivering weights of offline message lanes (commands, text, images/voices, files/videos) """
+        return MessageTable.lane_weights
+
+    @lane_weights.setter
+    def lane_weights(self, value: list):
+        assert len(value) > 0 and min(value) > 0, 'lane weights error: %s' % value
+        MessageTable.lane_weights = value
+
+    def pending_messages(self, receiver: ID) -> int:
+        return self.__message_table.pending_messages(receiver=receiver)
+
+    def load_pending(self) -> int:
+        return self.__message_table.load_pending()
+
+    def save_pending(self) -> bool:
+        return self.__message_table.save_pending()
+
     """
         Search Engine
         ~~~~~~~~~~~~~
 
-        Search accounts by the 'Search Number'
+        Search accounts by the names, IDs and 'Search Number'
     """
-    def search(self, keywords: list) -> dict:
-        return self.__meta_table.search(keywords=keywords)
+    def search(self, keywords: list, start: int=0, max_count: int=20) -> dict:
+        return self.__meta_table.search(keywords=keywords, start=start, max_count=max_count)
+
+    def search_ids(self, keywords: list, cursor: str=None, max_count: int=20) -> (list, Optional[str]):
+        return self.__meta_table.search_ids(keywords=keywords, cursor=cursor, max_count=max_count)
 
     def scan_ids(self):
         return self.__meta_table.scan_ids()
 
+    def load_snapshot(self) -> bool:
+        return self.__meta_table.load_snapshot()
+
+    def save_snapshot(self) -> bool:
+        return self.__meta_table.save_snapshot()
+
+    def rebuild_snapshot(self) -> bool:
+        return self.__meta_table.rebuild_snapshot()
+
     """
         Address Name Service
         ~~~~~~~~~~~~~~~~~~~~
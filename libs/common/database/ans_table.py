@@ -28,21 +28,33 @@ import os
 from mkm import ANYONE, EVERYONE
 from dimp import ID
 
+from ..utils import ReadWriteLock
+
 from .storage import Storage
 
 
 class AddressNameTable(Storage):
 
+    # compact the journal when it has this many more lines than records
+    compact_threshold = 1024
+
     def __init__(self):
         super().__init__()
+        self.__lock = ReadWriteLock()
         # memory caches
-        self.__caches: dict = None
+        self.__caches: dict = None   # name => ID
+        self.__names: dict = None    # ID => set(name)
+        self.__journal_lines = 0
 
     """
         Address Name Service
         ~~~~~~~~~~~~~~~~~~~~
 
         file path: '.dim/ans.txt'
+
+        Append-only journal, one "name\tID" record per line, the later record
+        overrides the earlier one with the same name. It's rewritten with only
+        the current records when too many lines are overridden.
     """
     def __path(self) -> str:
         return os.path.join(self.root, 'ans.txt')
@@ -51,13 +63,25 @@ class AddressNameTable(Storage):
         if name is None or len(name) == 0:
             return False
         assert identifier.valid, 'ID not valid: %s' % identifier
+        old = self.__caches.get(name)
+        if old is not None:
+            names = self.__names.get(old)
+            if names is not None:
+                names.discard(name)
         self.__caches[name] = identifier
+        names = self.__names.get(identifier)
+        if names is None:
+            self.__names[identifier] = {name}
+        else:
+            names.add(name)
         return True
 
-    def __load_records(self) -> dict:
+    def __load_records(self):
         path = self.__path()
         self.info('Loading ANS records from: %s' % path)
-        dictionary = {}
+        self.__caches = {}
+        self.__names = {}
+        self.__journal_lines = 0
         data = self.read_text(path=path)
         if data is not None:
             lines = data.splitlines()
@@ -66,61 +90,68 @@ class AddressNameTable(Storage):
                 if len(pair) != 2:
                     self.error('invalid record: %s' % record)
                     continue
-                k = pair[0]
-                v = pair[1]
-                dictionary[k] = self.identifier(v)
+                self.__cache_record(name=pair[0], identifier=self.identifier(pair[1]))
+            self.__journal_lines = len(lines)
         #
         #  Reserved names
         #
-        dictionary['all'] = EVERYONE
-        dictionary[EVERYONE.name] = EVERYONE
-        dictionary[ANYONE.name] = ANYONE
-        dictionary['owner'] = ANYONE
-        dictionary['founder'] = ID('moky@4DnqXWdTV8wuZgfqSCX9GjE2kNq7HJrUgQ')  # 'Albert Moky'
-        return dictionary
-
-    def __save_records(self, caches: dict) -> bool:
-        text = ''
-        keys = caches.keys()
-        for k in keys:
-            v = caches.get(k)
-            if v is not None:
-                text = text + k + '\t' + v + '\n'
+        self.__cache_record(name='all', identifier=EVERYONE)
+        self.__cache_record(name=EVERYONE.name, identifier=EVERYONE)
+        self.__cache_record(name=ANYONE.name, identifier=ANYONE)
+        self.__cache_record(name='owner', identifier=ANYONE)
+        self.__cache_record(name='founder', identifier=ID('moky@4DnqXWdTV8wuZgfqSCX9GjE2kNq7HJrUgQ'))  # 'Albert Moky'
+
+    def __prepare(self):
+        if self.__caches is None:
+            with self.__lock.writing:
+                if self.__caches is None:
+                    self.__load_records()
+
+    def __append_record(self, name: str, identifier: ID) -> bool:
         path = self.__path()
-        self.info('Saving ANS records(%d) into: %s' % (len(keys), path))
-        return self.write_text(text=text, path=path)
+        self.info('Appending ANS record into: %s' % path)
+        self.__journal_lines += 1
+        return self.append_text(text='%s\t%s\n' % (name, identifier), path=path)
+
+    def __compact_records(self) -> bool:
+        lines = ['%s\t%s\n' % (k, v) for k, v in self.__caches.items()]
+        path = self.__path()
+        self.info('Compacting ANS records(%d/%d) into: %s' % (len(lines), self.__journal_lines, path))
+        self.__journal_lines = len(lines)
+        return self.write_text(text=''.join(lines), path=path)
 
     def save_record(self, name: str, identifier: ID) -> bool:
         """ Save ANS record """
-        if self.__caches is None:
-            self.__caches = self.__load_records()
-        # try to cache it
-        if not self.__cache_record(name=name, identifier=identifier):
-            return False
-        # save to local storage
-        caches = self.__caches.copy()
-        return self.__save_records(caches=caches)
+        self.__prepare()
+        with self.__lock.writing:
+            if self.__caches.get(name) == identifier:
+                # record not changed
+                return True
+            # try to cache it
+            if not self.__cache_record(name=name, identifier=identifier):
+                return False
+            # save to local storage
+            if self.__journal_lines > len(self.__caches) + self.compact_threshold:
+                return self.__compact_records()
+            return self.__append_record(name=name, identifier=identifier)
 
     def record(self, name: str) -> ID:
         """ Get ID by short name """
-        if self.__caches is None:
-            self.__caches = self.__load_records()
+        self.__prepare()
         name = name.lower()
-        return self.__caches.get(name)
+        with self.__lock.reading:
+            return self.__caches.get(name)
 
     def names(self, identifier: str) -> list:
         """ Get all short names with this ID """
-        if self.__caches is None:
-            self.__caches = self.__load_records()
-        caches: dict = self.__caches.copy()
-        # all names
-        if '*' == identifier:
-            return list(caches.keys())
-        # get keys with the same value
-        identifier = self.identifier(identifier)
-        array = []
-        for k in caches:
-            v = caches[k]
-            if v == identifier:
-                array.append(k)
-        return array
+        self.__prepare()
+        with self.__lock.reading:
+            # all names
+            if '*' == identifier:
+                return list(self.__caches.keys())
+            # get names from reverse index
+            identifier = self.identifier(identifier)
+            names = self.__names.get(identifier)
+            if names is None:
+                return []
+            return list(names)
@@ -24,59 +24,282 @@
 # ==============================================================================
 
 import os
+import threading
+from typing import Optional
 
 from dimp import ID
 
+from ..utils import LRUCache
+
 from .storage import Storage
 
 
+class MemberSet(dict):
+    """ Ordered set of members (str(ID) => ID), with a cached list view """
+
+    def __init__(self, members: list=None):
+        super().__init__()
+        self.__array = None
+        # lines in the delta journal
+        self.journal = 0
+        if members is not None:
+            for item in members:
+                self[str(item)] = item
+
+    @property
+    def array(self) -> list:
+        if self.__array is None:
+            self.__array = list(self.values())
+        return self.__array
+
+    def add(self, member: ID) -> bool:
+        key = str(member)
+        if key in self:
+            return False
+        self[key] = member
+        self.__array = None
+        return True
+
+    def remove(self, member: ID) -> bool:
+        if self.pop(str(member), None) is None:
+            return False
+        self.__array = None
+        return True
+
+
 class GroupTable(Storage):
 
     def __init__(self):
         super().__init__()
+        self.__lock = threading.Lock()
         # memory caches
-        self.__members: dict = {}
+        self.__members = LRUCache(name='members', max_entries=10000, max_bytes=64 * 1024 * 1024)
+        self.__groups = LRUCache(name='groups', max_entries=100000, max_bytes=32 * 1024 * 1024)
 
     """
         Group members
         ~~~~~~~~~~~~~
 
         file path: '.dim/protected/{ADDRESS}/members.txt'
+        file path: '.dim/protected/{ADDRESS}/members.delta'
+
+        'members.txt' is the full list, 'members.delta' journals the changes
+        since then, one "+ID" or "-ID" per line; the list will be rewritten
+        and the journal removed when there are too many changes.
+
+        Writers in all processes hold the lock file 'members.lock' while
+        appending or compacting, so no change is lost by compaction.
     """
     def __members_path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'protected', identifier.address, 'members.txt')
+        return os.path.join(self.directory('protected', identifier.address), 'members.txt')
 
-    def __cache_members(self, members: list, identifier: ID) -> bool:
-        assert identifier.type.is_group(), 'group ID error: %s' % identifier
-        if members is None or len(members) == 0:
-            return False
-        self.__members[identifier] = members
-        return True
+    def __delta_path(self, identifier: ID) -> str:
+        return os.path.join(self.directory('protected', identifier.address), 'members.delta')
 
-    def __load_members(self, identifier: ID) -> list:
+    def __lock_path(self, identifier: ID) -> str:
+        return os.path.join(self.directory('protected', identifier.address), 'members.lock')
+
+    def __load_members(self, identifier: ID) -> Optional[MemberSet]:
         path = self.__members_path(identifier=identifier)
         self.info('Loading members from: %s' % path)
         data = self.read_text(path=path)
         if data is not None and len(data) > 1:
-            return data.splitlines()
+            members = MemberSet(members=data.splitlines())
+        else:
+            members = MemberSet()
+        # apply changes
+        path = self.__delta_path(identifier=identifier)
+        data = self.read_text(path=path)
+        if data is not None:
+            lines = data.splitlines()
+            for line in lines:
+                if line.startswith('+'):
+                    members.add(member=line[1:])
+                elif line.startswith('-'):
+                    members.remove(member=line[1:])
+            members.journal = len(lines)
+        if len(members) > 0:
+            return members
 
-    def __save_members(self, members: list, identifier: ID) -> bool:
+    def __save_members(self, members: MemberSet, identifier: ID) -> bool:
+        """ Rewrite the full list, call with the lock file acquired """
         path = self.__members_path(identifier=identifier)
         self.info('Saving members into: %s' % path)
-        text = '\n'.join(members)
-        return self.write_text(text=text, path=path)
+        text = '\n'.join(members.array)
+        if not self.write_text(text=text, path=path):
+            return False
+        # changes merged
+        self.remove(path=self.__delta_path(identifier=identifier))
+        members.journal = 0
+        return True
+
+    def __save_changes(self, members: MemberSet, added: list, removed: list, identifier: ID) -> bool:
+        """ Journal the changes of the cached members, and cache it again for the new size """
+        count = len(added) + len(removed)
+        if count == 0:
+            return True
+        lines = ['-%s\n' % item for item in removed] + ['+%s\n' % item for item in added]
+        path = self.__delta_path(identifier=identifier)
+        with self.file_lock(path=self.__lock_path(identifier=identifier)):
+            self.info('Saving %d member change(s) into: %s' % (count, path))
+            if not self.append_text(text=''.join(lines), path=path):
+                return False
+            members.journal += count
+            if members.journal > max(64, len(members) // 2):
+                # too many changes, merge the journal (with changes from other processes) into the full list
+                merged = self.__load_members(identifier=identifier)
+                if merged is None:
+                    merged = MemberSet()
+                if not self.__save_members(members=merged, identifier=identifier):
+                    return False
+                members = merged
+        self.__members.put(identifier, members)
+        self.log_change(table='members', identifier=identifier)
+        return True
+
+    def __member_set(self, group: ID) -> Optional[MemberSet]:
+        members = self.__members.get(group)
+        if members is LRUCache.MISSING:
+            return None
+        if members is None:
+            members = self.__load_members(identifier=group)
+            if members is None:
+                self.__members.put_missing(group)
+                return None
+            self.__members.put(group, members)
+        return members
+
+    def members(self, group: ID) -> Optional[list]:
+        members = self.__member_set(group=group)
+        if members is not None:
+            return members.array
 
-    def members(self, group: ID) -> list:
-        array = self.__members.get(group)
-        if array is not None:
-            return array
-        array = self.__load_members(identifier=group)
-        if self.__cache_members(members=array, identifier=group):
-            return array
+    def exists_member(self, member: ID, group: ID) -> bool:
+        members = self.__member_set(group=group)
+        return members is not None and str(member) in members
 
     def save_members(self, members: list, group: ID) -> bool:
-        if self.__cache_members(members=members, identifier=group):
-            return self.__save_members(members=members, identifier=group)
+        assert group.type.is_group(), 'group ID error: %s' % group
+        if members is None or len(members) == 0:
+            return False
+        with self.__lock:
+            current = self.__member_set(group=group)
+            if current is None:
+                current = MemberSet(members=members)
+                self.__members.put(group, current)
+                with self.file_lock(path=self.__lock_path(identifier=group)):
+                    if not self.__save_members(members=current, identifier=group):
+                        return False
+                self.log_change(table='members', identifier=group)
+                return self.__update_groups(group=group, added=current.array, removed=[])
+            new_set = MemberSet(members=members)
+            removed = [item for key, item in current.items() if key not in new_set]
+            added = [item for key, item in new_set.items() if key not in current]
+            for item in removed:
+                current.remove(member=item)
+            for item in added:
+                current.add(member=item)
+            if not self.__save_changes(members=current, added=added, removed=removed, identifier=group):
+                return False
+            return self.__update_groups(group=group, added=added, removed=removed)
+
+    def add_member(self, member: ID, group: ID) -> bool:
+        assert group.type.is_group(), 'group ID error: %s' % group
+        with self.__lock:
+            current = self.__member_set(group=group)
+            if current is None:
+                current = MemberSet()
+                self.__members.put(group, current)
+            if not current.add(member=member):
+                # already exists
+                return True
+            if not self.__save_changes(members=current, added=[member], removed=[], identifier=group):
+                return False
+            return self.__update_groups(group=group, added=[member], removed=[])
+
+    def remove_member(self, member: ID, group: ID) -> bool:
+        assert group.type.is_group(), 'group ID error: %s' % group
+        with self.__lock:
+            current = self.__member_set(group=group)
+            if current is None or not current.remove(member=member):
+                # not exists
+                return False
+            if not self.__save_changes(members=current, added=[], removed=[member], identifier=group):
+                return False
+            return self.__update_groups(group=group, added=[], removed=[member])
+
+    def evict(self, identifier: ID):
+        self.__members.pop(identifier)
+
+    def evict_groups(self, identifier: ID):
+        self.__groups.pop(identifier)
+
+    """
+        Groups of User
+        ~~~~~~~~~~~~~~
+
+        file path: '.dim/protected/{ADDRESS}/groups.txt'
+
+        Reverse index of group members, updated when members changed
+    """
+    def __groups_path(self, identifier: ID) -> str:
+        return os.path.join(self.directory('protected', identifier.address), 'groups.txt')
+
+    def __groups_lock_path(self, identifier: ID) -> str:
+        return os.path.join(self.directory('protected', identifier.address), 'groups.lock')
+
+    def __load_groups(self, identifier: ID) -> MemberSet:
+        path = self.__groups_path(identifier=identifier)
+        self.info('Loading groups from: %s' % path)
+        data = self.read_text(path=path)
+        if data is not None and len(data) > 1:
+            return MemberSet(members=data.splitlines())
+        return MemberSet()
+
+    def __group_set(self, member: ID) -> MemberSet:
+        groups = self.__groups.get(member)
+        if groups is None:
+            groups = self.__load_groups(identifier=member)
+            self.__groups.put(member, groups)
+        return groups
+
+    def save_groups(self, groups: list, member: ID) -> bool:
+        member = self.identifier(member)
+        groups = MemberSet(members=groups)
+        self.__groups.put(member, groups)
+        path = self.__groups_path(identifier=member)
+        if len(groups) == 0:
+            self.info('Removing groups: %s' % path)
+            self.remove(path=path)
+            ok = True
+        else:
+            self.info('Saving groups into: %s' % path)
+            ok = self.write_text(text='\n'.join(groups.array), path=path)
+        if ok:
+            self.log_change(table='groups', identifier=member)
+        return ok
+
+    def __update_groups(self, group: ID, added: list, removed: list) -> bool:
+        ok = True
+        for item, joined in [(item, True) for item in added] + [(item, False) for item in removed]:
+            member = self.identifier(item)
+            # the cache may be stale when other processes changed the file,
+            # so read it again before rewriting, while other writers wait
+            with self.file_lock(path=self.__groups_lock_path(identifier=member)):
+                groups = self.__load_groups(identifier=member)
+                if joined:
+                    changed = groups.add(member=group)
+                else:
+                    changed = groups.remove(member=group)
+                if not changed:
+                    self.__groups.put(member, groups)
+                elif not self.save_groups(groups=groups.array, member=member):
+                    ok = False
+        return ok
+
+    def groups(self, member: ID) -> list:
+        """ Get all groups which the user is a member of """
+        return self.__group_set(member=member).array
 
     def founder(self, group: ID) -> ID:
         pass
@@ -26,35 +26,158 @@
 import json
 import os
 import time
+from threading import Lock
+from typing import Optional
 
 from dimp import ID
+from dimp import ContentType
 from dimp import ReliableMessage
 
 from .storage import Storage
 
 
+"""
+    Priority Lanes
+    ~~~~~~~~~~~~~~
+
+    Offline messages are stored in lanes by message type,
+    the lower lane number, the earlier to be delivered:
+
+        0 - commands & history commands
+        1 - text and others (old segment files without lane prefix)
+        2 - images & voice messages
+        3 - files & videos
+"""
+default_lane = 1
+
+message_lanes = {
+    ContentType.Command: 0,
+    ContentType.History: 0,
+    ContentType.Image: 2,
+    ContentType.Audio: 2,
+    ContentType.File: 3,
+    ContentType.Video: 3,
+}
+
+
+def message_lane(msg: ReliableMessage) -> int:
+    msg_type = msg.envelope.type
+    if msg_type is None:
+        return default_lane
+    return message_lanes.get(msg_type, default_lane)
+
+
+def lane_weight(lane: int, weights: list) -> int:
+    return weights[lane] if lane < len(weights) else 1
+
+
+def segment_lane(filename: str) -> int:
+    """ Get lane from segment filename: '{LANE}-{TIME}.msg' """
+    if len(filename) > 2 and filename[1] == '-' and filename[0].isdigit():
+        return int(filename[0])
+    return default_lane
+
+
+def segment_time(filename: str) -> str:
+    """ Sorting key of segments in the same lane """
+    if len(filename) > 2 and filename[1] == '-' and filename[0].isdigit():
+        return filename[2:]
+    return filename
+
+
+class Mailbox:
+    """
+        Pending messages of one receiver
+
+        segments: {filename: count}
+    """
+
+    def __init__(self, segments: dict=None):
+        super().__init__()
+        self.segments = {}
+        self.count = 0
+        # oldest segment of each lane: {lane: filename}
+        self.__oldest = {}
+        # weighted round-robin: current lane and segments served in it
+        self.__lane: Optional[int] = None
+        self.__served = 0
+        if segments is not None:
+            for filename, count in segments.items():
+                self.update(filename=filename, count=count)
+
+    def oldest(self, lane: int) -> Optional[str]:
+        return self.__oldest.get(lane)
+
+    def add(self, filename: str, count: int=1):
+        self.update(filename=filename, count=self.segments.get(filename, 0) + count)
+
+    def update(self, filename: str, count: int):
+        """ Set message count of the segment, remove it when empty """
+        old = self.segments.pop(filename, 0)
+        self.count -= old
+        lane = segment_lane(filename=filename)
+        oldest = self.__oldest.get(lane)
+        if count > 0:
+            self.segments[filename] = count
+            self.count += count
+            if oldest is None or segment_time(filename=filename) < segment_time(filename=oldest):
+                self.__oldest[lane] = filename
+        elif filename == oldest:
+            rest = [item for item in self.segments if segment_lane(filename=item) == lane]
+            if len(rest) > 0:
+                self.__oldest[lane] = min(rest, key=segment_time)
+            else:
+                self.__oldest.pop(lane)
+
+    def next_segment(self, weights: list) -> Optional[str]:
+        """ Choose a lane by weights, return its oldest segment """
+        lanes = sorted(self.__oldest.keys())
+        if len(lanes) == 0:
+            return None
+        lane = self.__lane
+        if lane not in self.__oldest or self.__served >= lane_weight(lane=lane, weights=weights):
+            # move to the next lane, back to the first one after the last
+            following = [item for item in lanes if lane is None or item > lane]
+            lane = following[0] if len(following) > 0 else lanes[0]
+            self.__lane = lane
+            self.__served = 0
+        self.__served += 1
+        return self.__oldest[lane]
+
+
 class MessageTable(Storage):
 
+    # delivering weights of lanes
+    lane_weights = [8, 4, 2, 1]
+
     def __init__(self):
         super().__init__()
-        # memory caches
-        # self.__caches: dict = {}
+        # pending messages: {str(ID): Mailbox}
+        self.__mailboxes = {}
+        # segments appended while scanning mailboxes: {str(ID): [filename]}
+        self.__scanning = {}
+        self.__lock = Lock()
 
     """
         Reliable message for Receivers
         ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
         file path: '.dim/dkd/{ADDRESS}/messages/*.msg'
-        file path: '.dim/public/{ADDRESS}/messages/*.msg'
+        file path: '.dim/public/{ADDRESS}/messages/{LANE}-*.msg'
     """
     def __directory(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'public', identifier.address, 'messages')
+        return os.path.join(self.directory('public', identifier.address), 'messages')
+
+    @staticmethod
+    def __lock_path(directory: str) -> str:
+        """ Lock for appending and rewriting message files in the directory """
+        return os.path.join(directory, '.lock')
 
     def __message_path(self, msg: ReliableMessage) -> str:
         # message filename
         timestamp = msg.envelope.time
         filename = time.strftime("%Y%m%d_%H%M%S", time.localtime(timestamp))
-        filename = filename + '.msg'
+        filename = '%d-%s.msg' % (message_lane(msg=msg), filename)
         # message directory
         receiver = self.identifier(msg.envelope.receiver)
         directory = self.__directory(receiver)
@@ -64,7 +187,7 @@ class MessageTable(Storage):
     def __load_messages(self, path: str) -> list:
         data = self.read_text(path=path)
         lines = data.splitlines()
-        self.info('read %d line(s) from %s' % (len(lines), path))
+        self.info('read %d line(s) from %s', len(lines), path)
         # messages = [ReliableMessage(json.loads(line)) for line in lines]
         messages = []
         for line in lines:
@@ -77,7 +200,7 @@ class MessageTable(Storage):
                 msg = ReliableMessage(msg)
                 messages.append(msg)
             except Exception as error:
-                self.info('message package error %s, %s' % (error, line))
+                self.info('message package error %s, %s', error, line)
         return messages
 
     def __message_exists(self, msg: ReliableMessage, path: str) -> bool:
@@ -96,37 +219,129 @@ class MessageTable(Storage):
 
     def store_message(self, msg: ReliableMessage) -> bool:
         path = self.__message_path(msg=msg)
-        if self.__message_exists(msg=msg, path=path):
-            self.error('message duplicated: %s' % msg)
-            return False
-        self.info('Appending message into: %s' % path)
-        # message data
-        data = json.dumps(msg) + '\n'
-        return self.append_text(text=data, path=path)
+        with self.file_lock(path=self.__lock_path(directory=os.path.dirname(path))):
+            if self.__message_exists(msg=msg, path=path):
+                self.error('message duplicated: %s', msg)
+                return False
+            self.info('Appending message into: %s', path)
+            # message data
+            data = json.dumps(msg) + '\n'
+            if not self.append_text(text=data, path=path):
+                return False
+        receiver = self.identifier(msg.envelope.receiver)
+        with self.__lock:
+            mailbox = self.__mailboxes.get(str(receiver))
+            if mailbox is not None:
+                mailbox.add(filename=os.path.basename(path))
+            elif str(receiver) in self.__scanning:
+                # the scanning may miss this new segment
+                self.__scanning[str(receiver)].append(os.path.basename(path))
+        return True
 
-    def load_message_batch(self, receiver: ID) -> dict:
-        # message directory
+    """
+        Pending Messages
+        ~~~~~~~~~~~~~~~~
+
+        Message count for each segment file of the receiver,
+        scanned from the messages directory when first used.
+    """
+    def __scan_mailbox(self, receiver: ID) -> Mailbox:
         directory = self.__directory(receiver)
-        # get all files in messages directory and sort by filename
+        segments = {}
         if self.exists(path=directory):
-            files = sorted(os.listdir(directory))
-        else:
-            files = []
-        for filename in files:
-            # read ONE .msg file for each receiver and remove the file immediately
-            if filename[-4:] == '.msg':
-                # load messages from file path
-                path = os.path.join(directory, filename)
-                messages = self.__load_messages(path=path)
-                self.info('got %d message(s) for %s' % (len(messages), receiver))
-                if len(messages) == 0:
-                    self.info('remove empty message file %s' % path)
-                    self.remove(path)
+            for filename in os.listdir(directory):
+                if filename[-4:] == '.msg':
+                    text = self.read_text(path=os.path.join(directory, filename))
+                    if text is not None:
+                        segments[filename] = len([line for line in text.splitlines() if len(line.strip()) > 0])
+        return Mailbox(segments=segments)
+
+    def __mailbox(self, receiver: ID) -> Mailbox:
+        """ Get mailbox of the receiver, the directory is scanned without the lock when first used """
+        key = str(receiver)
+        with self.__lock:
+            mailbox = self.__mailboxes.get(key)
+            if mailbox is not None:
+                return mailbox
+            self.__scanning.setdefault(key, [])
+        mailbox = self.__scan_mailbox(receiver=receiver)
+        with self.__lock:
+            current = self.__mailboxes.get(key)
+            if current is not None:
+                # scanned by another thread
+                return current
+            for filename in self.__scanning.pop(key, []):
+                if filename not in mailbox.segments:
+                    mailbox.add(filename=filename)
+            self.__mailboxes[key] = mailbox
+            return mailbox
+
+    def pending_messages(self, receiver: ID) -> int:
+        mailbox = self.__mailbox(receiver=receiver)
+        with self.__lock:
+            return mailbox.count
+
+    def __pending_path(self) -> str:
+        return os.path.join(self.root, 'pending.js')
+
+    def load_pending(self) -> int:
+        """
+        Load pending counters saved on last shutdown, the file will be removed
+        so that counters won't be trusted after a crash
+
+        :return: mailboxes count
+        """
+        path = self.__pending_path()
+        try:
+            container = self.read_json(path=path)
+        except ValueError as error:
+            self.error('pending counters error: %s', error)
+            container = None
+        self.remove(path)
+        if container is None:
+            return 0
+        with self.__lock:
+            for receiver, segments in container.items():
+                self.__mailboxes[receiver] = Mailbox(segments=segments)
+        self.info('Loaded %d mailbox(es) from: %s', len(container), path)
+        return len(container)
+
+    def save_pending(self) -> bool:
+        with self.__lock:
+            container = {receiver: mailbox.segments for receiver, mailbox in self.__mailboxes.items()}
+        path = self.__pending_path()
+        self.info('Saving %d mailbox(es) into: %s', len(container), path)
+        return self.write_json(container=container, path=path)
+
+    def load_message_batch(self, receiver: ID) -> Optional[dict]:
+        # message directory
+        directory = self.__directory(receiver)
+        while True:
+            # read ONE .msg file (the oldest one in the chosen lane) for each receiver
+            mailbox = self.__mailbox(receiver=receiver)
+            with self.__lock:
+                filename = mailbox.next_segment(weights=self.lane_weights)
+            if filename is None:
+                # no message
+                return None
+            # load messages from file path
+            path = os.path.join(directory, filename)
+            messages = self.__load_messages(path=path) if self.exists(path=path) else []
+            self.info('got %d message(s) for %s', len(messages), receiver)
+            with self.__lock:
+                # correct the counter with messages actually in the file
+                mailbox.update(filename=filename, count=len(messages))
+            if len(messages) > 0:
                 return {'ID': receiver, 'filename': filename, 'path': path, 'messages': messages}
+            with self.file_lock(path=self.__lock_path(directory=directory)):
+                # check again, new message may be appended just now
+                if self.exists(path=path) and len(self.__load_messages(path=path)) == 0:
+                    self.info('remove empty message file %s', path)
+                    self.remove(path)
 
     def remove_message_batch(self, batch: dict, removed_count: int) -> bool:
         if removed_count <= 0:
-            self.info('message count to removed error: %d' % removed_count)
+            self.info('message count to removed error: %d', removed_count)
             return False
         # 0. get message file path
         path = batch.get('path')
@@ -138,23 +353,37 @@ class MessageTable(Storage):
                 directory = self.__directory(receiver)
                 # message file path
                 path = os.path.join(directory, filename)
-        if not self.exists(path):
-            self.info('message file not exists: %s' % path)
-            return False
-        # 1. remove all message(s)
-        self.info('remove message file: %s' % path)
-        self.remove(path)
-        # 2. store the rest messages back
         messages = batch.get('messages')
-        if messages is None:
+        if path is None or messages is None:
             return False
-        total_count = len(messages)
-        if removed_count < total_count:
-            # remove message(s) partially
-            messages = messages[removed_count:]
-            for msg in messages:
-                # message data
-                data = json.dumps(msg) + '\n'
-                self.append_text(text=data, path=path)
-            self.info('the rest messages(%d) write back into file: %s' % path)
+        # signatures of the messages delivered
+        delivered = set([msg.get('signature') for msg in messages[:removed_count]])
+        with self.file_lock(path=self.__lock_path(directory=os.path.dirname(path))):
+            if not self.exists(path):
+                self.info('message file not exists: %s', path)
+                return False
+            # 1. read all messages again, including the ones appended after the batch loaded
+            lines = self.read_text(path=path).splitlines()
+            rest = []
+            for line in lines:
+                if len(line.strip()) == 0:
+                    continue
+                try:
+                    signature = json.loads(line).get('signature')
+                except (ValueError, AttributeError):
+                    signature = None
+                if signature is None or signature not in delivered:
+                    rest.append(line)
+            removed = len([line for line in lines if len(line.strip()) > 0]) - len(rest)
+            # 2. replace the file with the rest messages (or remove it)
+            if len(rest) == 0:
+                self.info('remove message file: %s', path)
+                self.remove(path)
+            else:
+                self.write_text(text='\n'.join(rest) + '\n', path=path)
+                self.info('the rest messages(%d) write back into file: %s', len(rest), path)
+        with self.__lock:
+            mailbox = self.__mailboxes.get(str(batch.get('ID')))
+            if mailbox is not None:
+                mailbox.add(filename=os.path.basename(path), count=-removed)
         return True
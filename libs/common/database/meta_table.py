@@ -24,12 +24,16 @@
 # ==============================================================================
 
 import os
-import random
+import threading
 from typing import Optional
 
 from dimp import ID, Meta
 
-from .storage import Storage
+from ..utils import LRUCache
+
+from .storage import Storage, is_shard_name
+from .search_index import SearchIndex
+from .name_index import NameIndex
 
 
 def save_freshman(identifier: ID) -> bool:
@@ -48,8 +52,20 @@ class MetaTable(Storage):
     def __init__(self):
         super().__init__()
         # memory caches
-        self.__caches: dict = {}
-        self.__empty_meta = {'desc': 'just to avoid loading non-exists file again'}
+        self.__caches = LRUCache(name='meta', max_entries=100000, max_bytes=128 * 1024 * 1024)
+        # search engine
+        self.__index = SearchIndex()
+        # index usable (loaded from snapshot or scanned)
+        self.__scanned = False
+        # all IDs scanned, or the snapshot loaded is up to date
+        self.__complete = False
+        # directory times in the snapshot loaded
+        self.__snapshot_times = {}
+        self.__scan_lock = threading.Lock()
+        # names from profiles, updated by the profile table
+        self.names: NameIndex = None
+        # more indexing for the scanned IDs: scanner(ids)
+        self.scanner = None
 
     """
         Meta file for Entities (User/Group)
@@ -59,11 +75,11 @@ class MetaTable(Storage):
         file path: '.dim/public/{ADDRESS}/meta.js'
     """
     def __path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'public', identifier.address, 'meta.js')
+        return os.path.join(self.directory('public', identifier.address), 'meta.js')
 
     def __cache_meta(self, meta: Meta, identifier: ID) -> bool:
         if meta.match_identifier(identifier):
-            self.__caches[identifier] = meta
+            self.__caches.put(identifier, meta)
             return True
 
     def __load_meta(self, identifier: ID) -> Meta:
@@ -85,23 +101,30 @@ class MetaTable(Storage):
             # raise ValueError('failed to cache meta for ID: %s, %s' % (identifier, meta))
             self.error('failed to cache meta for ID: %s, %s' % (identifier, meta))
             return False
-        return self.__save_meta(meta=meta, identifier=identifier)
+        if not self.__save_meta(meta=meta, identifier=identifier):
+            return False
+        self.log_change(table='meta', identifier=identifier)
+        self.__index_id(identifier=identifier)
+        return True
+
+    def evict(self, identifier: ID):
+        self.__caches.pop(identifier)
 
     def meta(self, identifier: ID) -> Optional[Meta]:
         # 1. get from cache
         info = self.__caches.get(identifier)
+        if info is LRUCache.MISSING:
+            # just to avoid loading non-exists file again
+            return None
         if info is not None:
-            if info is self.__empty_meta:
-                self.info('empty meta: %s, %s' % (identifier, info))
-                info = None
             return info
         # 2. load from storage
         info = self.__load_meta(identifier=identifier)
         if info is None:
-            self.__caches[identifier] = self.__empty_meta
+            self.__caches.put_missing(identifier)
             return None
         # 3. update memory cache
-        self.__caches[identifier] = info
+        self.__caches.put(identifier, info)
         return info
 
     """
@@ -111,44 +134,79 @@ class MetaTable(Storage):
         Search accounts by the 'Search Number'
     """
 
-    def search(self, keywords: list) -> dict:
+    def __index_id(self, identifier: ID) -> bool:
+        network = identifier.type
+        if network.is_person() or network.is_robot():
+            return self.__index.add(identifier=identifier)
+
+    def search(self, keywords: list, start: int=0, max_count: int=20) -> dict:
+        self.__scan_once()
         results = {}
-        max_count = 20
-        array = self.scan_ids()
-        array = random.sample(array, len(array))
-        for identifier in array:
-            network = identifier.type
-            if not network.is_person() and not network.is_robot():
-                # ignore
-                continue
-            string = identifier.lower()
-            number = '%010d' % identifier.number
-            match = True
-            for kw in keywords:
-                if string.find(kw.lower()) < 0 and number.find(kw) < 0:
-                    # not match
-                    match = False
-                    break
-            if not match:
-                continue
-            # got it
+        array = self.__index.search(keywords=keywords, start=start, limit=max_count)
+        for string in array:
+            identifier = self.identifier(string)
             meta = self.meta(identifier)
             if meta:
                 results[identifier] = meta
-                # force to stop
-                max_count = max_count - 1
-                if max_count <= 0:
-                    break
         self.info('Got %d account(s) matched %s' % (len(results), keywords))
         return results
 
+    def search_ids(self, keywords: list, cursor: str=None, max_count: int=20) -> (list, Optional[str]):
+        """
+        Search one page of IDs, return them with the cursor for next page
+
+            1. accounts with matched names, ranked by relevance, cursor: '{score}:{ID}';
+            2. accounts with matched ID or search number, cursor: '{keyword index} {term} {ID}'.
+        """
+        self.__scan_once()
+        names = self.names
+        array = []
+        if cursor is None or cursor.find(' ') < 0:
+            # 1. matched names, after the cursor (score desc, ID asc)
+            position = None
+            if cursor is not None:
+                try:
+                    score, string = cursor.split(':', 1)
+                    position = (float(score), string)
+                except ValueError:
+                    return [], None
+            page = [] if names is None else names.search(keywords=keywords, after=position, limit=max_count)
+            array = [item[1] for item in page]
+            if len(array) >= max_count:
+                last = page[-1]
+                return [self.identifier(string) for string in array], '%.6f:%s' % last
+            cursor = None
+        # 2. matched IDs, skip the ones found by names
+        matched = set() if names is None else names.candidates(keywords=keywords)
+        while len(array) < max_count:
+            page, cursor = self.__index.page(keywords=keywords, cursor=cursor, limit=max_count - len(array))
+            array.extend([string for string in page if string not in matched])
+            if cursor is None:
+                break
+        ids = [self.identifier(string) for string in array]
+        self.info('Got %d account(s) matched %s, next: %s' % (len(ids), keywords, cursor))
+        return ids, cursor
+
+    def __scan_once(self):
+        """ Build the index if not built yet, wait for the scanning one if running """
+        if self.__scanned:
+            return
+        with self.__scan_lock:
+            if not self.__scanned:
+                self.__scan()
+
     def scan_ids(self) -> list:
+        with self.__scan_lock:
+            return self.__scan()
+
+    def __scan(self) -> list:
+        """ Scan all meta files for the index, call with the scan lock acquired """
         ids = []
         directory = os.path.join(self.root, 'public')
-        # get all files in messages directory and sort by filename
-        files = os.listdir(directory)
-        for filename in files:
-            path = os.path.join(directory, filename, 'meta.js')
+        # get all entity directories (flat or sharded)
+        entries = self.scan_directories(category='public')
+        for filename, path in entries:
+            path = os.path.join(path, 'meta.js')
             if not os.path.exists(path):
                 # self.info('meta file not exists: %s' % path)
                 continue
@@ -169,4 +227,91 @@ class MetaTable(Storage):
                     self.__cache_meta(meta=meta, identifier=identifier)
                 ids.append(identifier)
         self.info('Scanned %d ID(s) from %s' % (len(ids), directory))
+        # build search index
+        rows = [[str(item), item.number] for item in ids if item.type.is_person() or item.type.is_robot()]
+        count = self.__index.update(rows=rows)
+        self.info('Indexed %d new account(s), total %d' % (count, len(self.__index)))
+        if self.scanner is not None:
+            self.scanner(ids)
+        self.__scanned = True
+        self.__complete = True
         return ids
+
+    """
+        Accounts Snapshot
+        ~~~~~~~~~~~~~~~~~
+
+        file path: '.dim/accounts.js'
+
+        Search index rows and names with the modification times of the entity directories,
+        so the station needn't scan all meta (and profile) files before serving.
+    """
+    def __snapshot_path(self) -> str:
+        return os.path.join(self.root, 'accounts.js')
+
+    def __directory_times(self) -> dict:
+        """ Modification times of 'public' and its shard directories """
+        base = os.path.join(self.root, 'public')
+        times = {}
+        if not os.path.exists(base):
+            return times
+        times['.'] = os.stat(base).st_mtime
+        for name in os.listdir(base):
+            if not is_shard_name(name=name):
+                continue
+            path = os.path.join(base, name)
+            for sub in os.listdir(path):
+                if is_shard_name(name=sub):
+                    times[name + '/' + sub] = os.stat(os.path.join(path, sub)).st_mtime
+        return times
+
+    def load_snapshot(self) -> bool:
+        """
+        Load search index from the snapshot
+
+        :return: False when the snapshot is missing or outdated, need to scan again
+        """
+        path = self.__snapshot_path()
+        self.info('Loading accounts snapshot from: %s' % path)
+        try:
+            snapshot = self.read_json(path=path)
+        except ValueError as error:
+            self.error('accounts snapshot error: %s' % error)
+            snapshot = None
+        if snapshot is None:
+            return False
+        rows = snapshot.get('rows', [])
+        count = self.__index.update(rows=rows)
+        self.info('Loaded %d account(s) from snapshot' % count)
+        names = snapshot.get('names')
+        if names is not None and self.names is not None:
+            count = self.names.load(names=names)
+            self.info('Loaded %d name(s) from snapshot' % count)
+        # the index is usable now, even if it's a little outdated
+        self.__scanned = True
+        times = snapshot.get('times', {})
+        self.__snapshot_times = times
+        if times == self.__directory_times():
+            self.__complete = True
+        return self.__complete
+
+    def save_snapshot(self) -> bool:
+        if self.__complete:
+            times = self.__directory_times()
+        else:
+            # not scanned all yet, keep the old times, so it will be scanned again next time
+            self.info('accounts not scanned completely, keep directory times in snapshot')
+            times = self.__snapshot_times
+        snapshot = {
+            'times': times,
+            'rows': self.__index.rows(),
+        }
+        if self.names is not None:
+            snapshot['names'] = self.names.rows()
+        path = self.__snapshot_path()
+        self.info('Saving accounts snapshot(%d) into: %s' % (len(snapshot['rows']), path))
+        return self.write_json(container=snapshot, path=path)
+
+    def rebuild_snapshot(self) -> bool:
+        self.scan_ids()
+        return self.save_snapshot()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Name Index
+    ~~~~~~~~~~
+
+    Memory full-text index for searching accounts by the names in their profiles
+"""
+
+import bisect
+import heapq
+import math
+import threading
+import unicodedata
+from typing import Optional
+
+from dimp import ID
+
+
+def is_cjk(char: str) -> bool:
+    """ CJK ideographs, kana and hangul have no spaces between words """
+    code = ord(char)
+    return 0x2E80 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7AF \
+        or 0xF900 <= code <= 0xFAFF or 0x20000 <= code <= 0x2FFFF
+
+
+def normalize_name(name: str) -> str:
+    """ Full width to half width, and lower case """
+    return unicodedata.normalize('NFKC', name).lower().strip()
+
+
+def name_tokens(name: str) -> list:
+    """
+    Split name into tokens: words for alphabets and digits, bigrams for CJK
+
+        'Albert Moky' => ['albert', 'moky']
+        '张三丰'       => ['张三', '三丰', '丰']
+
+    The last CJK char is a token too, so any single char can be found as prefix of a token.
+    """
+    tokens = []
+    word = ''
+    run = ''
+    for char in normalize_name(name) + ' ':
+        if is_cjk(char):
+            if len(word) > 0:
+                tokens.append(word)
+                word = ''
+            run += char
+            continue
+        if len(run) > 0:
+            tokens.extend([run[i:i+2] for i in range(len(run) - 1)])
+            tokens.append(run[-1])
+            run = ''
+        if char.isalnum():
+            word += char
+        elif len(word) > 0:
+            tokens.append(word)
+            word = ''
+    # unique tokens in order
+    return list(dict.fromkeys(tokens))
+
+
+class NameIndex:
+    """
+        Inverted index of name tokens: {token: {ID string}},
+        with the sorted vocabulary, so every query token matches tokens as prefix
+        by binary search, and no profile file is touched while searching.
+    """
+
+    # bonus for the whole query matching the name
+    exact_bonus = 10.0
+    prefix_bonus = 5.0
+    contain_bonus = 2.0
+
+    def __init__(self):
+        super().__init__()
+        self.__lock = threading.Lock()
+        self.__names = {}       # ID string => name
+        self.__tokens = {}      # ID string => tokens
+        self.__postings = {}    # token => {ID string}
+        self.__vocabulary = []  # sorted tokens
+
+    def __len__(self) -> int:
+        return len(self.__names)
+
+    def name(self, identifier: ID) -> Optional[str]:
+        return self.__names.get(str(identifier))
+
+    def __remove(self, string: str):
+        self.__names.pop(string, None)
+        for token in self.__tokens.pop(string, []):
+            posting = self.__postings.get(token)
+            posting.discard(string)
+            if len(posting) == 0:
+                self.__postings.pop(token)
+                pos = bisect.bisect_left(self.__vocabulary, token)
+                del self.__vocabulary[pos]
+
+    def __add(self, string: str, name: str):
+        tokens = name_tokens(name=name)
+        if len(tokens) == 0:
+            return
+        self.__names[string] = name
+        self.__tokens[string] = tokens
+        for token in tokens:
+            posting = self.__postings.get(token)
+            if posting is None:
+                self.__postings[token] = {string}
+                bisect.insort(self.__vocabulary, token)
+            else:
+                posting.add(string)
+
+    def update(self, identifier: ID, name: Optional[str]) -> bool:
+        """ Index the new name of the account, or remove it when name is empty """
+        string = str(identifier)
+        with self.__lock:
+            if self.__names.get(string) == name:
+                return False
+            self.__remove(string=string)
+            if name is not None:
+                self.__add(string=string, name=name)
+            return True
+
+    def load(self, names: dict) -> int:
+        """ Add {ID string: name} in bulk """
+        with self.__lock:
+            count = 0
+            for string, name in names.items():
+                if self.__names.get(string) == name:
+                    continue
+                self.__remove(string=string)
+                self.__add(string=string, name=name)
+                count = count + 1
+            return count
+
+    def rows(self) -> dict:
+        """ Get all names: {ID string: name} """
+        with self.__lock:
+            return dict(self.__names)
+
+    def __match(self, token: str) -> dict:
+        """
+        Find IDs with any token starts with this one
+
+        :return: {ID string: (credit, token matched)}, credit is the IDF of the matched token,
+                 lowered when the query token is only a prefix of it
+        """
+        vocabulary = self.__vocabulary
+        total = len(self.__names)
+        start = bisect.bisect_left(vocabulary, token)
+        end = bisect.bisect_left(vocabulary, token + '\uffff', start)
+        matched = {}
+        for pos in range(start, end):
+            word = vocabulary[pos]
+            posting = self.__postings[word]
+            credit = math.log(1 + total / len(posting)) * len(token) / len(word)
+            for string in posting:
+                best = matched.get(string)
+                if best is None or credit > best[0]:
+                    matched[string] = (credit, word)
+        return matched
+
+    @staticmethod
+    def __query(keywords: list) -> list:
+        query = []
+        for keyword in keywords:
+            query.extend(name_tokens(name=keyword))
+        return list(dict.fromkeys(query))
+
+    def __intersect(self, query: list) -> list:
+        """ Match every query token, return matched results, the last one first """
+        results = []
+        for token in query:
+            matched = self.__match(token=token)
+            if len(results) > 0:
+                # every query token must be matched
+                matched = {key: value for key, value in matched.items() if key in results[0]}
+            if len(matched) == 0:
+                return []
+            results.insert(0, matched)
+        return results
+
+    def candidates(self, keywords: list) -> set:
+        """ Get all IDs whose names contain every keyword, not ranked """
+        query = self.__query(keywords=keywords)
+        if len(query) == 0:
+            return set()
+        with self.__lock:
+            results = self.__intersect(query=query)
+            if len(results) == 0:
+                return set()
+            return set(results[0].keys())
+
+    def search(self, keywords: list, after: Optional[tuple]=None, limit: int=None) -> list:
+        """
+        Search IDs whose names contain every keyword, ranked by relevance score:
+
+            1. sum of IDF of the name tokens matched (partially for prefix),
+               multiplied by the coverage of the name (tokens matched / all tokens);
+            2. bonus when the whole name equals to (or starts with, or contains) the keywords.
+
+        :param keywords: keyword list
+        :param after:    (score, ID string) of the last result in previous page
+        :param limit:    max count of results, None for all
+        :return: [(score, ID string)], ordered by score desc and ID asc
+        """
+        query = self.__query(keywords=keywords)
+        if len(query) == 0:
+            return []
+        phrase = ' '.join([normalize_name(name=kw) for kw in keywords if len(kw.strip()) > 0])
+        with self.__lock:
+            results = self.__intersect(query=query)
+            if len(results) == 0:
+                return []
+            ranks = []
+            for string in results[0]:
+                credits = [item[string] for item in results]
+                words = set([item[1] for item in credits])
+                coverage = len(words) / len(self.__tokens[string])
+                score = sum([item[0] for item in credits]) * coverage
+                name = normalize_name(name=self.__names[string])
+                if name == phrase:
+                    score += self.exact_bonus
+                elif name.startswith(phrase):
+                    score += self.prefix_bonus
+                elif phrase in name:
+                    score += self.contain_bonus
+                # rounded, so it can be compared with the one in a cursor
+                ranks.append((-round(score, 6), string))
+        if after is not None:
+            # seek to the results after the cursor
+            position = (-after[0], after[1])
+            ranks = [item for item in ranks if item > position]
+        if limit is None or limit >= len(ranks):
+            ranks.sort()
+        else:
+            ranks = heapq.nsmallest(limit, ranks)
+        return [(-item[0], item[1]) for item in ranks]
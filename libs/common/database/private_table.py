@@ -27,6 +27,8 @@ import os
 
 from dimp import ID, PrivateKey
 
+from ..utils import LRUCache
+
 from .storage import Storage
 
 
@@ -35,7 +37,7 @@ class PrivateKeyTable(Storage):
     def __init__(self):
         super().__init__()
         # memory caches
-        self.__caches: dict = {}
+        self.__caches = LRUCache(name='private_key', max_entries=100)
 
     """
         Private Key file for Local Users
@@ -44,11 +46,11 @@ class PrivateKeyTable(Storage):
         file path: '.dim/private/{ADDRESS}/secret.js'
     """
     def __path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'private', identifier.address, 'secret.js')
+        return os.path.join(self.directory('private', identifier.address), 'secret.js')
 
     def __cache_private_key(self, key: PrivateKey, identifier: ID) -> bool:
         assert key is not None and identifier.valid, 'private key error: %s, %s' % (identifier, key)
-        self.__caches[identifier] = key
+        self.__caches.put(identifier, key)
         return True
 
     def __load_private_key(self, identifier: ID) -> PrivateKey:
@@ -75,11 +77,15 @@ class PrivateKeyTable(Storage):
     def private_key(self, identifier: ID) -> PrivateKey:
         # 1. get from cache
         info = self.__caches.get(identifier)
+        if info is LRUCache.MISSING:
+            return None
         if info is not None:
             return info
         # 2. load from storage
         info = self.__load_private_key(identifier=identifier)
-        if info is not None:
-            # 3. update memory cache
-            self.__caches[identifier] = info
-            return info
+        if info is None:
+            self.__caches.put_missing(identifier)
+            return None
+        # 3. update memory cache
+        self.__caches.put(identifier, info)
+        return info
@@ -28,7 +28,10 @@ from typing import Optional
 
 from dimp import ID, Profile
 
+from ..utils import LRUCache
+
 from .storage import Storage
+from .name_index import NameIndex
 
 
 class ProfileTable(Storage):
@@ -36,7 +39,9 @@ class ProfileTable(Storage):
     def __init__(self):
         super().__init__()
         # memory caches
-        self.__caches: dict = {}
+        self.__caches = LRUCache(name='profile', max_entries=100000, max_bytes=128 * 1024 * 1024)
+        # search engine for names
+        self.names: NameIndex = None
 
     """
         Profile for Entities (User/Group)
@@ -46,13 +51,13 @@ class ProfileTable(Storage):
         file path: '.dim/public/{ADDRESS}/profile.js'
     """
     def __path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'public', identifier.address, 'profile.js')
+        return os.path.join(self.directory('public', identifier.address), 'profile.js')
 
     def __cache_profile(self, profile: Profile) -> bool:
         identifier = Storage.identifier(profile.identifier)
         assert identifier.valid, 'profile ID not valid: %s' % profile
         if profile.valid:
-            self.__caches[identifier] = profile
+            self.__caches.put(identifier, profile)
             return True
 
     def __load_profile(self, identifier: ID) -> Profile:
@@ -81,11 +86,24 @@ class ProfileTable(Storage):
             # raise ValueError('failed to cache profile: %s' % profile)
             self.error('failed to cache profile: %s' % profile)
             return False
-        return self.__save_profile(profile=profile)
+        if not self.__save_profile(profile=profile):
+            return False
+        identifier = Storage.identifier(profile.identifier)
+        self.log_change(table='profile', identifier=identifier)
+        self.__index_name(identifier=identifier, profile=profile)
+        return True
+
+    def evict(self, identifier: ID):
+        self.__caches.pop(identifier)
+        if self.names is not None and (identifier.type.is_person() or identifier.type.is_robot()):
+            # changed by other process, index the new name
+            self.__index_name(identifier=identifier, profile=self.__load_profile(identifier=identifier))
 
     def profile(self, identifier: ID) -> Optional[Profile]:
         # 1. get from cache
         info = self.__caches.get(identifier)
+        if info is LRUCache.MISSING:
+            return Profile.new(identifier=identifier)
         if info is not None:
             if 'data' not in info:
                 self.info('empty profile: %s' % info)
@@ -93,18 +111,54 @@ class ProfileTable(Storage):
         # 2. load from storage
         info = self.__load_profile(identifier=identifier)
         if info is None:
-            info = Profile.new(identifier=identifier)
+            # remember it for a while, the profile may be uploaded later
+            self.__caches.put_missing(identifier)
+            return Profile.new(identifier=identifier)
         # 3. update memory cache
-        self.__caches[identifier] = info
+        self.__caches.put(identifier, info)
         return info
 
+    """
+        Search Engine
+        ~~~~~~~~~~~~~
+
+        Search accounts by the names in profiles
+    """
+
+    def __index_name(self, identifier: ID, profile: Optional[Profile]) -> bool:
+        if self.names is None:
+            return False
+        network = identifier.type
+        if not (network.is_person() or network.is_robot()):
+            return False
+        name = None
+        if profile is not None:
+            name = profile.name
+            if name is not None and len(name.strip()) == 0:
+                name = None
+        return self.names.update(identifier=identifier, name=name)
+
+    def scan_names(self, ids: list) -> int:
+        """ Index names of the accounts from their profile files (without caching) """
+        if self.names is None:
+            return 0
+        count = 0
+        for identifier in ids:
+            if not (identifier.type.is_person() or identifier.type.is_robot()):
+                continue
+            profile = self.__load_profile(identifier=identifier)
+            if profile is not None and self.__index_name(identifier=identifier, profile=profile):
+                count = count + 1
+        self.info('Indexed %d new name(s), total %d' % (count, len(self.names)))
+        return count
+
 
 class DeviceTable(Storage):
 
     def __init__(self):
         super().__init__()
         # memory caches
-        self.__caches: dict = {}
+        self.__caches = LRUCache(name='device', max_entries=100000, max_bytes=32 * 1024 * 1024)
 
     """
         Device Tokens for APNS
@@ -113,11 +167,11 @@ class DeviceTable(Storage):
         file path: '.dim/protected/{ADDRESS}/device.js'
     """
     def __path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'protected', identifier.address, 'device.js')
+        return os.path.join(self.directory('protected', identifier.address), 'device.js')
 
     def __cache_device(self, device: dict, identifier: ID) -> bool:
         assert identifier.valid, 'ID not valid: %s' % identifier
-        self.__caches[identifier] = device
+        self.__caches.put(identifier, device)
         return True
 
     def __load_device(self, identifier: ID) -> dict:
@@ -159,11 +213,15 @@ class DeviceTable(Storage):
     def device_tokens(self, identifier: ID) -> list:
         # 1. get from cache
         device = self.__caches.get(identifier)
+        if device is LRUCache.MISSING:
+            return None
         if device is not None:
             return device.get('tokens')
         # 2. load from storage
         device = self.__load_device(identifier=identifier)
-        if device is not None:
-            # 3. update memory cache
-            self.__cache_device(device=device, identifier=identifier)
-            return device.get('tokens')
+        if device is None:
+            self.__caches.put_missing(identifier)
+            return None
+        # 3. update memory cache
+        self.__cache_device(device=device, identifier=identifier)
+        return device.get('tokens')
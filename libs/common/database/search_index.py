@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Search Index
+    ~~~~~~~~~~~~
+
+    Memory index for searching accounts by ID name, address and search number
+"""
+
+import bisect
+import threading
+from typing import Optional
+
+from dimp import ID
+
+
+def search_terms(string: str, number: int) -> list:
+    """ Get prefix terms of the ID: name, address and 10-digit search number """
+    pos = string.find('@')
+    if pos < 0:
+        terms = [string.lower()]
+    else:
+        terms = [string[:pos].lower(), string[pos+1:].lower()]
+    terms.append('%010d' % number)
+    return terms
+
+
+def search_keyword(keyword: str) -> Optional[str]:
+    """ Normalize keyword: lower case, and '123-456-7890' => '1234567890' """
+    keyword = keyword.strip().lower()
+    if len(keyword) == 0:
+        return None
+    digits = keyword.replace('-', '')
+    if digits.isdigit():
+        return digits
+    return keyword
+
+
+class SearchIndex:
+    """
+        Sorted list of (term, ID) pairs, so any prefix of the ID name, address
+        or search number is a continuous range found by binary search, and the
+        results come out in the same order every time.
+
+        IDs are kept as strings with their search numbers, so the index can be
+        restored from a snapshot without parsing every ID.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__lock = threading.Lock()
+        self.__terms = []    # sorted [(term, ID string)]
+        self.__numbers = {}  # ID string => search number
+
+    def __len__(self) -> int:
+        return len(self.__numbers)
+
+    def __contains__(self, identifier: ID) -> bool:
+        return str(identifier) in self.__numbers
+
+    def add(self, identifier: ID) -> bool:
+        string = str(identifier)
+        number = identifier.number
+        with self.__lock:
+            if string in self.__numbers:
+                return False
+            self.__numbers[string] = number
+            for term in search_terms(string=string, number=number):
+                bisect.insort(self.__terms, (term, string))
+            return True
+
+    def update(self, rows: list) -> int:
+        """ Add (ID string, search number) rows in bulk, sort only once """
+        with self.__lock:
+            count = 0
+            terms = self.__terms
+            for string, number in rows:
+                if string in self.__numbers:
+                    continue
+                self.__numbers[string] = number
+                for term in search_terms(string=string, number=number):
+                    terms.append((term, string))
+                count = count + 1
+            if count > 0:
+                terms.sort()
+            return count
+
+    def rows(self) -> list:
+        """ Get all (ID string, search number) rows """
+        with self.__lock:
+            return [[string, number] for string, number in self.__numbers.items()]
+
+    def remove(self, identifier: ID) -> bool:
+        string = str(identifier)
+        with self.__lock:
+            number = self.__numbers.pop(string, None)
+            if number is None:
+                return False
+            for term in search_terms(string=string, number=number):
+                item = (term, string)
+                pos = bisect.bisect_left(self.__terms, item)
+                if pos < len(self.__terms) and self.__terms[pos] == item:
+                    del self.__terms[pos]
+            return True
+
+    def __range(self, keyword: str) -> (int, int):
+        start = bisect.bisect_left(self.__terms, (keyword,))
+        end = bisect.bisect_left(self.__terms, (keyword + '\uffff',))
+        return start, end
+
+    def __walk(self, keywords: list, cursor: Optional[tuple]=None):
+        """
+        Yield (keyword index, term, ID string) matched every keyword, each ID once, in stable order
+
+        :param keywords: normalized keywords
+        :param cursor:   (keyword index, term, ID string) of the last result in previous page
+        """
+        ranges = [self.__range(keyword=kw) for kw in keywords]
+        if cursor is None:
+            # walk through the narrowest range, check other keywords for each ID
+            index = min(range(len(ranges)), key=lambda i: ranges[i][1] - ranges[i][0])
+        else:
+            # continue in the range which the cursor came from
+            index = cursor[0]
+            if index < 0 or index >= len(keywords) or not cursor[1].startswith(keywords[index]):
+                return
+        keyword = keywords[index]
+        others = keywords[:index] + keywords[index+1:]
+        first, last = ranges[index]
+        if cursor is not None:
+            first = max(first, bisect.bisect_right(self.__terms, cursor[1:], first, last))
+        for pos in range(first, last):
+            term, string = self.__terms[pos]
+            terms = search_terms(string=string, number=self.__numbers[string])
+            # the ID may have more terms in this range, take the first one only
+            if min(t for t in terms if t.startswith(keyword)) != term:
+                continue
+            if len(others) > 0:
+                if not all(any(t.startswith(kw) for t in terms) for kw in others):
+                    continue
+            yield index, term, string
+
+    def search(self, keywords: list, start: int=0, limit: int=20) -> list:
+        """
+        Search IDs which have every keyword as prefix of name, address or number
+
+        :param keywords: keyword list
+        :param start:    offset of the first result
+        :param limit:    max count of results
+        :return: ID string list, in stable order
+        """
+        keywords = [search_keyword(keyword=kw) for kw in keywords]
+        keywords = [kw for kw in keywords if kw is not None]
+        if len(keywords) == 0:
+            return []
+        with self.__lock:
+            results = []
+            skipped = 0
+            for _, _, string in self.__walk(keywords=keywords):
+                if skipped < start:
+                    skipped = skipped + 1
+                    continue
+                results.append(string)
+                if len(results) >= limit:
+                    break
+            return results
+
+    def page(self, keywords: list, cursor: Optional[str]=None, limit: int=20) -> (list, Optional[str]):
+        """
+        Search IDs page by page, seeking to the cursor instead of skipping results
+
+        :param keywords: keyword list
+        :param cursor:   cursor from the previous page, None for the first page
+        :param limit:    max count of results
+        :return: ID string list, and cursor for the next page (None when no more results)
+        """
+        keywords = [search_keyword(keyword=kw) for kw in keywords]
+        keywords = [kw for kw in keywords if kw is not None]
+        if len(keywords) == 0:
+            return [], None
+        limit = max(1, limit)
+        if cursor is not None:
+            # cursor: '{keyword index} {term} {ID}', so the next page walks in the same range
+            triple = cursor.split(' ', 2)
+            if len(triple) != 3 or not triple[0].isdigit():
+                return [], None
+            cursor = (int(triple[0]), triple[1], triple[2])
+        with self.__lock:
+            results = []
+            last = None
+            for index, term, string in self.__walk(keywords=keywords, cursor=cursor):
+                if len(results) >= limit:
+                    # more results for the next page
+                    return results, '%d %s %s' % last
+                results.append(string)
+                last = (index, term, string)
+            return results, None
@@ -23,23 +23,174 @@
 # SOFTWARE.
 # ==============================================================================
 
+import hashlib
 import json
 import os
+import threading
 import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # not POSIX, lock between threads only
+    fcntl = None
 
 from dimp import ID
 from dimp import Barrack
 
+from ..utils import Log, Metrics
+
+
+storage_latency = Metrics.histogram(name='dim_storage_seconds', documentation='Time cost of file operations',
+                                    labels=('operation',))
+
+
+def fsync_directory(directory: str):
+    """ Make sure the renamed entries in this directory are durable """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # directory removed, or the platform doesn't support it
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
-def current_time() -> str:
-    time_array = time.localtime()
-    return time.strftime('%Y-%m-%d %H:%M:%S', time_array)
+
+def is_shard_name(name: str) -> bool:
+    """ Shard directories are named with 2 hex chars """
+    return len(name) == 2 and all(ch in '0123456789abcdef' for ch in name)
+
+
+def merge_directory(src: str, dst: str):
+    """ Move all files from src into dst, keeping the newer one if both have the same file """
+    if not os.path.exists(dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.rename(src, dst)
+            return
+        except OSError:
+            # dst created by other writer just now
+            pass
+    for name in os.listdir(src):
+        src_path = os.path.join(src, name)
+        dst_path = os.path.join(dst, name)
+        if os.path.isdir(src_path):
+            merge_directory(src=src_path, dst=dst_path)
+        elif not os.path.exists(dst_path):
+            os.rename(src_path, dst_path)
+        elif name.endswith('.msg'):
+            # both have messages in this time slot, keep them all
+            with open(src_path, 'r') as file:
+                text = file.read()
+            with open(dst_path, 'a') as file:
+                file.write(text)
+            os.remove(src_path)
+        elif os.stat(src_path).st_mtime > os.stat(dst_path).st_mtime:
+            # updated in the old place while migrating
+            Storage.info('merging conflict, keep the newer one: %s -> %s', src_path, dst_path)
+            os.replace(src_path, dst_path)
+        else:
+            Storage.info('merging conflict, keep the newer one: %s', dst_path)
+            os.remove(src_path)
+    try:
+        os.rmdir(src)
+    except OSError:
+        # new file written here while merging, it will be moved next time
+        pass
 
 
 class Storage:
 
     root = '/tmp/.dim'
 
+    # seconds between two batched directory syncs
+    sync_interval = 1.0
+
+    __sync_lock = threading.Lock()
+    __sync_dirs = set()
+    __sync_time = 0
+    __sync_timer = None
+
+    # thread locks for platforms without 'fcntl': {path: Lock}
+    __file_locks = {}
+
+    """
+        Directory Layout
+        ~~~~~~~~~~~~~~~~
+
+        'flat'    - '.dim/{category}/{ADDRESS}'
+        'sharded' - '.dim/{category}/ab/cd/{ADDRESS}'
+
+        category: 'public', 'protected' or 'private'
+    """
+    layout = 'flat'
+
+    @classmethod
+    def shard(cls, address: str) -> str:
+        """ Get sub path for address: 'ab/cd' """
+        digest = hashlib.md5(str(address).encode('utf-8')).hexdigest()
+        return os.path.join(digest[:2], digest[2:4])
+
+    @classmethod
+    def directory(cls, category: str, address: str) -> str:
+        """ Get directory for entity with address """
+        flat = os.path.join(cls.root, category, address)
+        if cls.layout != 'sharded':
+            return flat
+        sharded = os.path.join(cls.root, category, cls.shard(address=address), address)
+        if os.path.exists(sharded):
+            return sharded
+        if os.path.exists(flat):
+            # not migrated yet
+            return flat
+        return sharded
+
+    @classmethod
+    def scan_directories(cls, category: str) -> list:
+        """ Get all (address, directory) pairs in the category """
+        array = []
+        base = os.path.join(cls.root, category)
+        if not os.path.exists(base):
+            return array
+        for name in os.listdir(base):
+            path = os.path.join(base, name)
+            if is_shard_name(name=name):
+                for sub in os.listdir(path):
+                    sub_path = os.path.join(path, sub)
+                    if is_shard_name(name=sub):
+                        for address in os.listdir(sub_path):
+                            array.append((address, os.path.join(sub_path, address)))
+            else:
+                array.append((name, path))
+        return array
+
+    @classmethod
+    def migrate(cls, categories: list=None) -> int:
+        """ Move flat entity directories into shards, it's safe to run while
+            the station is running, because the readers look up both places """
+        if categories is None:
+            categories = ['public', 'protected', 'private']
+        count = 0
+        for category in categories:
+            base = os.path.join(cls.root, category)
+            if not os.path.exists(base):
+                continue
+            for name in os.listdir(base):
+                path = os.path.join(base, name)
+                if is_shard_name(name=name) or not os.path.isdir(path):
+                    continue
+                target = os.path.join(base, cls.shard(address=name), name)
+                cls.info('migrating %s -> %s' % (path, target))
+                merge_directory(src=path, dst=target)
+                count = count + 1
+        cls.info('Migrated %d directories' % count)
+        return count
+
     @classmethod
     def exists(cls, path: str) -> bool:
         return os.path.exists(path)
@@ -48,8 +199,9 @@ class Storage:
     def read_text(cls, path: str) -> str:
         if cls.exists(path):
             # reading
-            with open(path, 'r') as file:
-                return file.read()
+            with storage_latency.time(operation='read'):
+                with open(path, 'r') as file:
+                    return file.read()
 
     @classmethod
     def read_json(cls, path: str) -> dict:
@@ -59,14 +211,64 @@ class Storage:
 
     @classmethod
     def write_text(cls, text: str, path: str) -> bool:
+        """ Write text into a temporary file and then replace the target with it,
+            so readers will only see the old file or the whole new one """
         directory = os.path.dirname(path)
         # make sure the dirs exists
         if not cls.exists(directory):
-            os.makedirs(directory)
+            os.makedirs(directory, exist_ok=True)
         # writing
-        with open(path, 'w') as file:
-            wrote = file.write(text)
-            return wrote == len(text)
+        tmp = '%s.%d-%d.tmp' % (path, os.getpid(), threading.get_ident())
+        try:
+            with storage_latency.time(operation='write'):
+                with open(tmp, 'w') as file:
+                    wrote = file.write(text)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp, path)
+        except IOError:
+            if cls.exists(tmp):
+                os.remove(tmp)
+            raise
+        cls.__sync_directory(directory=directory)
+        return wrote == len(text)
+
+    @classmethod
+    def __sync_directory(cls, directory: str):
+        """ Mark the directory entry changed, sync all marked directories
+            when the interval passed, or by a timer if no more writes """
+        with Storage.__sync_lock:
+            Storage.__sync_dirs.add(directory)
+            now = time.time()
+            delay = Storage.__sync_time + cls.sync_interval - now
+            if delay > 0:
+                if Storage.__sync_timer is None:
+                    timer = threading.Timer(interval=delay, function=cls.__sync_later)
+                    timer.daemon = True
+                    Storage.__sync_timer = timer
+                    timer.start()
+                return
+            Storage.__sync_time = now
+            dirs = Storage.__sync_dirs
+            Storage.__sync_dirs = set()
+        for item in dirs:
+            fsync_directory(directory=item)
+
+    @classmethod
+    def __sync_later(cls):
+        with Storage.__sync_lock:
+            Storage.__sync_timer = None
+        cls.flush()
+
+    @classmethod
+    def flush(cls):
+        """ Sync all marked directories immediately (before shutdown) """
+        with Storage.__sync_lock:
+            Storage.__sync_time = time.time()
+            dirs = Storage.__sync_dirs
+            Storage.__sync_dirs = set()
+        for item in dirs:
+            fsync_directory(directory=item)
 
     @classmethod
     def write_json(cls, container: dict, path: str) -> bool:
@@ -79,9 +281,69 @@ class Storage:
             # new file
             return cls.write_text(text=text, path=path)
         # appending
-        with open(path, 'a') as file:
-            wrote = file.write(text)
-            return wrote == len(text)
+        with storage_latency.time(operation='append'):
+            with open(path, 'a') as file:
+                wrote = file.write(text)
+                return wrote == len(text)
+
+    """
+        Changes Log
+        ~~~~~~~~~~~
+
+        file path: '.dim/changes.log'
+
+        Tell other processes which cache entries are outdated (see ChangeWatcher)
+    """
+    log_changes = False
+
+    # rotate the changes log when it's too big ('changes.log' -> 'changes.log.1')
+    changes_limit = 1024 * 1024
+
+    @classmethod
+    def changes_path(cls) -> str:
+        return os.path.join(cls.root, 'changes.log')
+
+    @classmethod
+    def log_change(cls, table: str, identifier: ID):
+        if not cls.log_changes:
+            return
+        line = '%d\t%s\t%s\n' % (os.getpid(), table, identifier)
+        path = cls.changes_path()
+        # rotating and appending in all processes are serialized,
+        # so no line is written into the old log after it's rotated
+        with cls.file_lock(path=os.path.join(cls.root, 'changes.lock')):
+            try:
+                if os.stat(path).st_size > cls.changes_limit:
+                    # watchers keep the old file opened, they will read the rest lines in it
+                    os.replace(path, path + '.1')
+            except FileNotFoundError:
+                pass
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+
+    @classmethod
+    @contextmanager
+    def file_lock(cls, path: str):
+        """ Exclusive lock between threads and processes, held on the lock file """
+        if fcntl is None:
+            with Storage.__sync_lock:
+                lock = Storage.__file_locks.setdefault(path, threading.Lock())
+            with lock:
+                yield
+            return
+        directory = os.path.dirname(path)
+        if not cls.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # closing the file releases the lock
+            os.close(fd)
 
     @classmethod
     def remove(cls, path: str) -> bool:
@@ -104,9 +366,15 @@ class Storage:
     #  Log
     #
     @classmethod
-    def info(cls, msg: str):
-        print('[%s] Storage > %s' % (current_time(), msg))
+    def info(cls, msg: str, *args):
+        if len(args) == 0:
+            Log.info('Storage > %s', msg)
+        else:
+            Log.info('Storage > ' + msg, *args)
 
     @classmethod
-    def error(cls, msg: str):
-        print('[%s] ERROR - Storage > %s' % (current_time(), msg))
+    def error(cls, msg: str, *args):
+        if len(args) == 0:
+            Log.error('Storage > %s', msg)
+        else:
+            Log.error('Storage > ' + msg, *args)
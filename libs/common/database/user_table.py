@@ -27,6 +27,8 @@ import os
 
 from dimp import ID, Command
 
+from ..utils import LRUCache
+
 from .storage import Storage
 
 
@@ -35,11 +37,11 @@ class UserTable(Storage):
     def __init__(self):
         super().__init__()
         # caches
-        self.__contacts = {}
+        self.__contacts = LRUCache(name='contacts', max_entries=10000, max_bytes=32 * 1024 * 1024)
         # stored commands
-        self.__contacts_commands = {}
-        self.__block_commands = {}
-        self.__mute_commands = {}
+        self.__contacts_commands = LRUCache(name='contacts_command', max_entries=10000, max_bytes=32 * 1024 * 1024)
+        self.__block_commands = LRUCache(name='block_command', max_entries=10000, max_bytes=16 * 1024 * 1024)
+        self.__mute_commands = LRUCache(name='mute_command', max_entries=10000, max_bytes=16 * 1024 * 1024)
 
     """
         User contacts
@@ -48,13 +50,13 @@ class UserTable(Storage):
         file path: '.dim/protected/{ADDRESS}/contacts.txt'
     """
     def __contacts_path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'protected', identifier.address, 'contacts.txt')
+        return os.path.join(self.directory('protected', identifier.address), 'contacts.txt')
 
     def __cache_contacts(self, contacts: list, identifier: ID) -> bool:
         assert identifier.type.is_user(), 'user ID error: %s' % identifier
         if contacts is None:
             return False
-        self.__contacts[identifier] = contacts
+        self.__contacts.put(identifier, contacts)
         return True
 
     def __load_contacts(self, identifier: ID) -> list:
@@ -72,11 +74,14 @@ class UserTable(Storage):
 
     def contacts(self, user: ID) -> list:
         array = self.__contacts.get(user)
+        if array is LRUCache.MISSING:
+            return None
         if array is not None:
             return array
         array = self.__load_contacts(identifier=user)
         if self.__cache_contacts(contacts=array, identifier=user):
             return array
+        self.__contacts.put_missing(user)
 
     def save_contacts(self, contacts: list, user: ID) -> bool:
         if self.__cache_contacts(contacts=contacts, identifier=user):
@@ -89,22 +94,26 @@ class UserTable(Storage):
         file path: '.dim/protected/{ADDRESS}/contacts_stored.js'
     """
     def __contacts_command_path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'protected', identifier.address, 'contacts_stored.js')
+        return os.path.join(self.directory('protected', identifier.address), 'contacts_stored.js')
 
     def contacts_command(self, identifier: ID) -> Command:
         cmd = self.__contacts_commands.get(identifier)
+        if cmd is LRUCache.MISSING:
+            return None
         if cmd is None:
             path = self.__contacts_command_path(identifier=identifier)
             self.info('Loading stored contacts command from: %s' % path)
             dictionary = self.read_json(path=path)
-            if dictionary is not None:
-                cmd = Command(dictionary)
-                self.__contacts_commands[identifier] = cmd
+            if dictionary is None:
+                self.__contacts_commands.put_missing(identifier)
+                return None
+            cmd = Command(dictionary)
+            self.__contacts_commands.put(identifier, cmd)
         return cmd
 
     def save_contacts_command(self, cmd: Command, sender: ID) -> bool:
         assert cmd is not None, 'contacts command cannot be empty'
-        self.__contacts_commands[sender] = cmd
+        self.__contacts_commands.put(sender, cmd)
         path = self.__contacts_command_path(identifier=sender)
         self.info('Saving contacts command into: %s' % path)
         return self.write_json(container=cmd, path=path)
@@ -116,22 +125,26 @@ class UserTable(Storage):
         file path: '.dim/protected/{ADDRESS}/block_stored.js'
     """
     def __block_command_path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'protected', identifier.address, 'block_stored.js')
+        return os.path.join(self.directory('protected', identifier.address), 'block_stored.js')
 
     def block_command(self, identifier: ID) -> Command:
         cmd = self.__block_commands.get(identifier)
+        if cmd is LRUCache.MISSING:
+            return None
         if cmd is None:
             path = self.__block_command_path(identifier=identifier)
             self.info('Loading stored block command from: %s' % path)
             dictionary = self.read_json(path=path)
-            if dictionary is not None:
-                cmd = Command(dictionary)
-                self.__block_commands[identifier] = cmd
+            if dictionary is None:
+                self.__block_commands.put_missing(identifier)
+                return None
+            cmd = Command(dictionary)
+            self.__block_commands.put(identifier, cmd)
         return cmd
 
     def save_block_command(self, cmd: Command, sender: ID) -> bool:
         assert cmd is not None, 'block command cannot be empty'
-        self.__block_commands[sender] = cmd
+        self.__block_commands.put(sender, cmd)
         path = self.__block_command_path(identifier=sender)
         self.info('Saving block command into: %s' % path)
         return self.write_json(container=cmd, path=path)
@@ -143,22 +156,26 @@ class UserTable(Storage):
         file path: '.dim/protected/{ADDRESS}/mute_stored.js'
     """
     def __mute_command_path(self, identifier: ID) -> str:
-        return os.path.join(self.root, 'protected', identifier.address, 'mute_stored.js')
+        return os.path.join(self.directory('protected', identifier.address), 'mute_stored.js')
 
     def mute_command(self, identifier: ID) -> Command:
         cmd = self.__mute_commands.get(identifier)
+        if cmd is LRUCache.MISSING:
+            return None
         if cmd is None:
             path = self.__mute_command_path(identifier=identifier)
             self.info('Loading stored mute command from: %s' % path)
             dictionary = self.read_json(path=path)
-            if dictionary is not None:
-                cmd = Command(dictionary)
-                self.__mute_commands[identifier] = cmd
+            if dictionary is None:
+                self.__mute_commands.put_missing(identifier)
+                return None
+            cmd = Command(dictionary)
+            self.__mute_commands.put(identifier, cmd)
         return cmd
 
     def save_mute_command(self, cmd: Command, sender: ID) -> bool:
         assert cmd is not None, 'mute command cannot be empty'
-        self.__mute_commands[sender] = cmd
+        self.__mute_commands.put(sender, cmd)
         path = self.__mute_command_path(identifier=sender)
         self.info('Saving mute command into: %s' % path)
         return self.write_json(container=cmd, path=path)
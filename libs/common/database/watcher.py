@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Change Watcher
+    ~~~~~~~~~~~~~~
+
+    Evict memory caches when other processes change the same data files
+
+    file path: '.dim/changes.log'
+
+    Each process appends a line "{pid}\t{table}\t{ID}" after saving meta,
+    profile, members or groups; watchers in other processes read the new lines and
+    drop those entries from their caches. It's woken by inotify on Linux,
+    or polls the file on other platforms.
+
+    The log is rotated by renaming, a watcher keeps the old file opened
+    and reads the rest lines in it before switching to the new one.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+import time
+from typing import Callable
+
+from ..utils import Log
+
+
+class Inotify:
+    """ Minimal inotify binding, watching one directory """
+
+    IN_MODIFY = 0x00000002
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+
+    def __init__(self, directory: str):
+        super().__init__()
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        wd = libc.inotify_add_watch(fd, directory.encode('utf-8'), self.IN_MODIFY | self.IN_CREATE)
+        if wd < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed: %s' % directory)
+        self.fd = fd
+
+    def wait(self, timeout: float) -> bool:
+        """ Wait for events in the directory, drain them all """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if len(readable) == 0:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ChangeWatcher(threading.Thread):
+
+    def __init__(self, path: str, callback: Callable[[str, str], None], interval: float=1.0):
+        """
+        Create watcher for the changes log
+
+        :param path:     changes log path
+        :param callback: function(table, identifier) to evict cache entry
+        :param interval: polling interval (seconds)
+        """
+        super().__init__(name='ChangeWatcher', daemon=True)
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.running = False
+        # skip the changes before started
+        self.__file = self.__open(at_end=True)
+        self.__pending = b''
+
+    def info(self, msg: str):
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
+
+    def error(self, msg: str):
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
+
+    def __open(self, at_end: bool=False):
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        if at_end:
+            file.seek(0, os.SEEK_END)
+        return file
+
+    def __rotated(self) -> bool:
+        """ Check whether the log file opened has been renamed by the writer """
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.__file.fileno()).st_ino
+        except FileNotFoundError:
+            # renamed, the new one not created yet
+            return False
+
+    def __read_changes(self):
+        if self.__file is None:
+            self.__file = self.__open()
+            if self.__file is None:
+                return
+        self.__process(data=self.__file.read())
+        if self.__rotated():
+            # nobody writes into the old file after it's renamed, drain it and switch to the new one
+            self.__process(data=self.__file.read())
+            self.__file.close()
+            self.__pending = b''
+            self.__file = self.__open()
+            if self.__file is not None:
+                self.__process(data=self.__file.read())
+
+    def __process(self, data: bytes):
+        if len(data) == 0:
+            return
+        lines = (self.__pending + data).split(b'\n')
+        # keep the incomplete line for next time
+        self.__pending = lines.pop()
+        pid = str(os.getpid())
+        for line in lines:
+            fields = line.decode('utf-8', 'replace').split('\t')
+            if len(fields) != 3:
+                self.error('changes log error: %s' % line)
+                continue
+            if fields[0] == pid:
+                # changed by myself
+                continue
+            try:
+                self.callback(fields[1], fields[2])
+            except Exception as error:
+                self.error('failed to evict %s %s: %s' % (fields[1], fields[2], error))
+
+    def run(self):
+        self.running = True
+        directory = os.path.dirname(self.path)
+        try:
+            inotify = Inotify(directory=directory)
+        except (OSError, AttributeError) as error:
+            self.info('inotify not available (%s), polling %s' % (error, self.path))
+            inotify = None
+        try:
+            while self.running:
+                if inotify is None:
+                    time.sleep(self.interval)
+                else:
+                    inotify.wait(timeout=self.interval)
+                try:
+                    self.__read_changes()
+                except IOError as error:
+                    self.error('failed to read changes: %s' % error)
+        finally:
+            if inotify is not None:
+                inotify.close()
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+    def stop(self):
+        self.running = False
@@ -143,6 +143,12 @@ class Facebook(Barrack):
     def load_members(self, identifier: ID) -> Optional[list]:
         return self.database.members(group=identifier)
 
+    def exists_member(self, member: ID, group: ID) -> bool:
+        if self.database.exists_member(member=member, group=group):
+            return True
+        owner = self.owner(identifier=group)
+        return owner is not None and owner == member
+
     def save_assistants(self, assistants: list, identifier: ID) -> bool:
         pass
 
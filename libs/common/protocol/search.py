@@ -30,6 +30,8 @@
     Search users with keywords
 """
 
+from typing import Optional
+
 from dimp import Command
 
 
@@ -47,6 +49,11 @@ class SearchCommand(Command):
             keywords : "keywords",      // keyword string
             users    : ["ID",],         // user ID list
             results  : {"ID": {meta}, } // user's meta map
+
+            cursor   : "...",           // request: continue after this cursor
+                                        // response: cursor for next page, absent at the end
+            limit    : 20,              // max users in one page
+            ids_only : false            // respond IDs without metas, fetch metas lazily
         }
     """
 
@@ -104,11 +111,48 @@ class SearchCommand(Command):
         else:
             self['results'] = value
 
+    #
+    #   Pagination
+    #
+    @property
+    def cursor(self) -> Optional[str]:
+        return self.get('cursor')
+
+    @cursor.setter
+    def cursor(self, value: str):
+        if value is None:
+            self.pop('cursor', None)
+        else:
+            self['cursor'] = value
+
+    @property
+    def limit(self) -> int:
+        return self.get('limit', 20)
+
+    @limit.setter
+    def limit(self, value: int):
+        if value is None:
+            self.pop('limit', None)
+        else:
+            self['limit'] = value
+
+    @property
+    def ids_only(self) -> bool:
+        return self.get('ids_only', False)
+
+    @ids_only.setter
+    def ids_only(self, value: bool):
+        if value:
+            self['ids_only'] = True
+        else:
+            self.pop('ids_only', None)
+
     #
     #   Factories
     #
     @classmethod
-    def new(cls, content: dict=None, keywords: str=None, users: list=None, results: dict=None):
+    def new(cls, content: dict=None, keywords: str=None, users: list=None, results: dict=None,
+            cursor: str=None, limit: int=None, ids_only: bool=False):
         """
         Create search command
 
@@ -116,6 +160,9 @@ class SearchCommand(Command):
         :param keywords: search number, ID, or 'users'
         :param users: user ID list
         :param results: user meta map
+        :param cursor: cursor of the page
+        :param limit: max users in one page
+        :param ids_only: respond IDs without metas
         :return: SearchCommand object
         """
         if content is None:
@@ -133,6 +180,12 @@ class SearchCommand(Command):
             content['users'] = users
         if results is not None:
             content['results'] = results
+        if cursor is not None:
+            content['cursor'] = cursor
+        if limit is not None:
+            content['limit'] = limit
+        if ids_only:
+            content['ids_only'] = True
         return super().new(content=content, command=command)
 
 
@@ -36,6 +36,10 @@
 from dimsdk.crypto import base64_decode, base64_encode, hex_encode, hex_decode, sha1
 
 from .log import Log
+from .cache import LRUCache
+from .lock import ReadWriteLock
+from .metrics import Metrics, MetricsServer
+from .trace import MessageTrace
 
 
 __all__ = [
@@ -44,4 +48,8 @@ __all__ = [
     'hex_encode', 'hex_decode',
     'sha1',
     'Log',
+    'LRUCache',
+    'ReadWriteLock',
+    'Metrics', 'MetricsServer',
+    'MessageTrace',
 ]
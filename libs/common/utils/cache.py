@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Cache Pool
+    ~~~~~~~~~~
+
+    Thread-safe LRU cache with capacity limits and optional TTL
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from weakref import WeakValueDictionary
+
+
+def approximate_size(value, depth: int=3) -> int:
+    """ Rough memory cost of a JSON-like value """
+    if isinstance(value, (str, bytes)):
+        return 48 + len(value)
+    if depth <= 0:
+        return 64
+    if isinstance(value, dict):
+        size = 240
+        for k, v in value.items():
+            size += approximate_size(k, depth - 1) + approximate_size(v, depth - 1)
+        return size
+    if isinstance(value, (list, tuple, set)):
+        size = 64 + 8 * len(value)
+        for item in value:
+            size += approximate_size(item, depth - 1)
+        return size
+    return 32
+
+
+class LRUCache:
+    """
+        Least Recently Used Cache
+        ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+        Entries are evicted when the count or the approximate bytes exceed
+        the capacity, or when they are older than the TTL (if set).
+
+        A key known to be absent in the storage can be marked as MISSING for
+        'missing_ttl' seconds, so the caller needn't probe the disk again;
+        putting the real value replaces the mark.
+    """
+
+    MISSING = ('MISSING',)
+
+    # seconds to remember the missing keys
+    missing_ttl = 300
+
+    # all named caches, for configuring and dumping
+    __caches = WeakValueDictionary()
+
+    def __init__(self, name: str, max_entries: int=10000, max_bytes: int=None, ttl: float=None):
+        super().__init__()
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()  # key => (value, size, expired)
+        self.__bytes = 0
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.avoided = 0
+        LRUCache.__caches[name] = self
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key) -> bool:
+        value = self.get(key)
+        return value is not None and value is not self.MISSING
+
+    @property
+    def bytes(self) -> int:
+        return self.__bytes
+
+    def get(self, key, default=None):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] is not None and entry[2] < time.time():
+                self.__remove(key=key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            if entry[0] is self.MISSING:
+                self.avoided += 1
+            return entry[0]
+
+    def put(self, key, value, ttl: float=None):
+        if ttl is None:
+            ttl = self.ttl
+        expired = None if ttl is None else time.time() + ttl
+        size = approximate_size(value)
+        with self.__lock:
+            self.__remove(key=key)
+            self.__entries[key] = (value, size, expired)
+            self.__bytes += size
+            self.__purge()
+
+    def put_missing(self, key, ttl: float=None):
+        """ Remember that the key doesn't exist in storage """
+        if ttl is None:
+            ttl = self.missing_ttl
+        self.put(key, self.MISSING, ttl=ttl)
+
+    def pop(self, key, default=None):
+        with self.__lock:
+            entry = self.__remove(key=key)
+            if entry is None:
+                return default
+            return entry[0]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def resize(self, max_entries: int=None, max_bytes: int=None):
+        with self.__lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self.__purge()
+
+    def __remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[1]
+        return entry
+
+    def __overflow(self) -> bool:
+        if len(self.__entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.__bytes > self.max_bytes
+
+    def __purge(self):
+        entries = self.__entries
+        while len(entries) > 0 and self.__overflow():
+            _, entry = entries.popitem(last=False)
+            self.__bytes -= entry[1]
+            self.evictions += 1
+
+    #
+    #   Statistics
+    #
+    def statistics(self) -> dict:
+        return {
+            'name': self.name,
+            'entries': len(self.__entries),
+            'bytes': self.__bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'avoided': self.avoided,
+        }
+
+    @classmethod
+    def cache(cls, name: str):
+        return cls.__caches.get(name)
+
+    @classmethod
+    def all_statistics(cls) -> list:
+        caches = list(cls.__caches.values())
+        return [item.statistics() for item in sorted(caches, key=lambda c: c.name)]
+
+    @classmethod
+    def dump(cls) -> str:
+        lines = ['%-16s %10s %12s %10s %10s %10s %10s' % ('cache', 'entries', 'bytes', 'hits', 'misses',
+                                                          'evictions', 'avoided')]
+        for info in cls.all_statistics():
+            lines.append('%-16s %10d %12d %10d %10d %10d %10d' % (info['name'], info['entries'], info['bytes'],
+                                                                  info['hits'], info['misses'], info['evictions'],
+                                                                  info['avoided']))
+        return '\n'.join(lines)
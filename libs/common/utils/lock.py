@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Read-Write Lock
+    ~~~~~~~~~~~~~~~
+
+    Many readers or one writer at a time, writers are not starved by readers
+"""
+
+import threading
+
+
+class ReadWriteLock:
+
+    def __init__(self):
+        super().__init__()
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writing = False
+        self.__waiting_writers = 0
+
+    def acquire_read(self):
+        with self.__condition:
+            while self.__writing or self.__waiting_writers > 0:
+                self.__condition.wait()
+            self.__readers += 1
+
+    def release_read(self):
+        with self.__condition:
+            self.__readers -= 1
+            if self.__readers == 0:
+                self.__condition.notify_all()
+
+    def acquire_write(self):
+        with self.__condition:
+            self.__waiting_writers += 1
+            while self.__writing or self.__readers > 0:
+                self.__condition.wait()
+            self.__waiting_writers -= 1
+            self.__writing = True
+
+    def release_write(self):
+        with self.__condition:
+            self.__writing = False
+            self.__condition.notify_all()
+
+    @property
+    def reading(self):
+        return _Guard(acquire=self.acquire_read, release=self.release_read)
+
+    @property
+    def writing(self):
+        return _Guard(acquire=self.acquire_write, release=self.release_write)
+
+
+class _Guard:
+
+    def __init__(self, acquire, release):
+        super().__init__()
+        self.__acquire = acquire
+        self.__release = release
+
+    def __enter__(self):
+        self.__acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__release()
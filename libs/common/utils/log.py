@@ -27,25 +27,223 @@
 """
     Log Util
     ~~~~~~~~
+
+    Records are put into a ring buffer and written by a background thread,
+    message arguments are formatted only when the level is enabled, in the writer;
+    except mutable arguments (dict, list, objects), which are formatted when queued.
 """
+import atexit
+import os
+import sys
+import threading
 import time
+from collections import deque
 
 
 class Log:
 
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+
+    level = INFO
+
+    prefixes = {
+        DEBUG: 'DEBUG - ',
+        INFO: '',
+        WARNING: 'WARNING - ',
+        ERROR: 'ERROR - ',
+    }
+
+    # ring buffer, the oldest records will be dropped when it's full
+    capacity = 65536
+
+    # output file, rotated by size ('None' means stdout)
+    path: str = None
+    max_bytes = 64 * 1024 * 1024
+    backups = 5
+
+    __condition = threading.Condition()
+    __records = deque()
+    __dropped = 0
+    __writer: threading.Thread = None
+    __writing = False
+
+    # arguments which cannot change before the writer formats them
+    immutable_types = (str, bytes, int, float, bool, type(None))
+
+    # cached timestamp string for current second
+    __time_second = None
+    __time_string = ''
+
+    @classmethod
+    def configure(cls, level: str=None, path: str=None, max_bytes: int=None, backups: int=None,
+                  capacity: int=None):
+        if level is not None:
+            Log.level = getattr(Log, level.upper())
+        if path is not None:
+            Log.path = path
+        if max_bytes is not None:
+            Log.max_bytes = max_bytes
+        if backups is not None:
+            Log.backups = backups
+        if capacity is not None:
+            Log.capacity = capacity
+
     @staticmethod
     def time_string(timestamp: int) -> str:
-        time_array = time.localtime(timestamp)
-        return time.strftime('%Y-%m-%d %H:%M:%S', time_array)
+        if timestamp != Log.__time_second:
+            time_array = time.localtime(timestamp)
+            Log.__time_string = time.strftime('%Y-%m-%d %H:%M:%S', time_array)
+            Log.__time_second = timestamp
+        return Log.__time_string
+
+    @classmethod
+    def log(cls, level: int, msg: str, *args):
+        if level < Log.level:
+            return
+        if len(args) > 0 and not all([isinstance(item, Log.immutable_types) for item in args]):
+            # the arguments may be changed after queued
+            msg = Log.__interpolate(msg=msg, args=args)
+            args = ()
+        record = (int(time.time()), level, msg, args)
+        with Log.__condition:
+            if len(Log.__records) >= Log.capacity:
+                Log.__records.popleft()
+                Log.__dropped += 1
+            Log.__records.append(record)
+            if Log.__writer is None:
+                Log.__start()
+            Log.__condition.notify()
+
+    @staticmethod
+    def debug(msg: str, *args):
+        Log.log(Log.DEBUG, msg, *args)
+
+    @staticmethod
+    def info(msg: str, *args):
+        Log.log(Log.INFO, msg, *args)
 
     @staticmethod
-    def info(msg: str):
-        timestamp = int(time.time())
-        time_string = Log.time_string(timestamp)
-        print('[%s] %s' % (time_string, msg))
+    def warning(msg: str, *args):
+        Log.log(Log.WARNING, msg, *args)
 
     @staticmethod
-    def error(msg: str):
-        timestamp = int(time.time())
-        time_string = Log.time_string(timestamp)
-        print('[%s] ERROR - %s' % (time_string, msg))
+    def error(msg: str, *args):
+        Log.log(Log.ERROR, msg, *args)
+
+    @classmethod
+    def flush(cls, timeout: float=5.0):
+        """ Wait until all records written """
+        expired = time.time() + timeout
+        with Log.__condition:
+            while len(Log.__records) > 0 or Log.__writing:
+                if Log.__writer is None or time.time() > expired:
+                    break
+                Log.__condition.notify()
+                Log.__condition.wait(timeout=0.1)
+
+    #
+    #   Writer
+    #
+    @classmethod
+    def __start(cls):
+        """ Start the writer thread, call with the condition acquired """
+        writer = threading.Thread(target=Log.__run, name='LogWriter', daemon=True)
+        Log.__writer = writer
+        writer.start()
+        atexit.register(Log.flush)
+
+    @staticmethod
+    def __interpolate(msg: str, args: tuple) -> str:
+        try:
+            return str(msg) % args
+        except Exception as error:
+            # never let a bad argument break the logging
+            return '%s <%d argument(s) not formatted: %s>' % (msg, len(args), type(error).__name__)
+
+    @staticmethod
+    def __format(record: tuple) -> str:
+        timestamp, level, msg, args = record
+        if len(args) > 0:
+            msg = Log.__interpolate(msg=msg, args=args)
+        return '[%s] %s%s\n' % (Log.time_string(timestamp), Log.prefixes.get(level, ''), msg)
+
+    @staticmethod
+    def __run():
+        output = LogOutput()
+        while True:
+            with Log.__condition:
+                Log.__writing = False
+                Log.__condition.notify_all()
+                while len(Log.__records) == 0:
+                    Log.__condition.wait(timeout=1.0)
+                records = Log.__records
+                Log.__records = deque()
+                dropped = Log.__dropped
+                Log.__dropped = 0
+                Log.__writing = True
+            lines = []
+            if dropped > 0:
+                lines.append(Log.__format(record=(int(time.time()), Log.WARNING,
+                                                  '%d log record(s) dropped', (dropped,))))
+            for item in records:
+                try:
+                    lines.append(Log.__format(record=item))
+                except Exception as error:
+                    lines.append('[%s] ERROR - failed to format log record: %s\n'
+                                 % (Log.time_string(item[0]), type(error).__name__))
+            try:
+                output.write(text=''.join(lines))
+            except Exception as error:
+                sys.stderr.write('failed to write log: %s\n' % error)
+
+
+class LogOutput:
+    """ Write into stdout or a file rotated by size """
+
+    def __init__(self):
+        super().__init__()
+        self.__path = None
+        self.__file = None
+        self.__size = 0
+
+    def write(self, text: str):
+        path = Log.path
+        if path is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        if path != self.__path or self.__file is None:
+            self.__open(path=path)
+        elif self.__size + len(text) > Log.max_bytes:
+            self.__rotate()
+        self.__file.write(text)
+        self.__file.flush()
+        self.__size += len(text)
+
+    def __open(self, path: str):
+        if self.__file is not None:
+            self.__file.close()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.__path = path
+        self.__file = open(path, 'a')
+        self.__size = self.__file.tell()
+
+    def __rotate(self):
+        """ log -> log.1 -> log.2 ... -> log.{backups} """
+        self.__file.close()
+        self.__file = None
+        path = self.__path
+        for index in range(Log.backups - 1, 0, -1):
+            src = '%s.%d' % (path, index)
+            if os.path.exists(src):
+                os.replace(src, '%s.%d' % (path, index + 1))
+        if Log.backups > 0:
+            os.replace(path, '%s.1' % path)
+        else:
+            os.remove(path)
+        self.__open(path=path)
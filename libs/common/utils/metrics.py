@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Metrics
+    ~~~~~~~
+
+    Counters, gauges and histograms, exposed in Prometheus text format
+"""
+
+import math
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from typing import Optional
+
+
+def label_string(names: tuple, values: tuple, extra: str=None) -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+             for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ''
+    return '{%s}' % ','.join(pairs)
+
+
+def number_string(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return '%d' % value
+    return repr(value)
+
+
+class Counter:
+    """ Monotonically increasing value for each set of labels """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.__lock = Lock()
+        self.__values = {}  # label values => float
+
+    def inc(self, amount: float=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.__lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, '') for name in self.labels)
+        return self.__values.get(key, 0)
+
+    def samples(self) -> list:
+        with self.__lock:
+            return [(self.name + label_string(self.labels, key), value) for key, value in self.__values.items()]
+
+
+class Gauge:
+    """ Value that can go up and down for each set of labels """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: tuple=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.__lock = Lock()
+        self.__values = {}  # label values => float
+        self.__function = None
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.__lock:
+            self.__values[key] = value
+
+    def inc(self, amount: float=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.__lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def dec(self, amount: float=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """ Get value from function (without labels) when collecting """
+        self.__function = function
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, '') for name in self.labels)
+        return self.__values.get(key, 0)
+
+    def samples(self) -> list:
+        function = self.__function
+        if function is not None:
+            return [(self.name, function())]
+        with self.__lock:
+            return [(self.name + label_string(self.labels, key), value) for key, value in self.__values.items()]
+
+
+class Histogram:
+    """ Count of observations in buckets for each set of labels """
+
+    kind = 'histogram'
+
+    # seconds
+    default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name: str, documentation: str, labels: tuple=(), buckets: tuple=None):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        if buckets is None:
+            buckets = self.default_buckets
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.__lock = Lock()
+        self.__values = {}  # label values => [bucket counts..., sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.__lock:
+            counts = self.__values.get(key)
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+                self.__values[key] = counts
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-1] += value
+
+    def time(self, **labels):
+        """ Observe the time cost of a 'with' block """
+        return HistogramTimer(histogram=self, labels=labels)
+
+    def samples(self) -> list:
+        with self.__lock:
+            items = [(key, list(counts)) for key, counts in self.__values.items()]
+        samples = []
+        for key, counts in items:
+            total = 0
+            for index, bound in enumerate(self.buckets):
+                total += counts[index]
+                extra = 'le="%s"' % number_string(bound)
+                samples.append((self.name + '_bucket' + label_string(self.labels, key, extra=extra), total))
+            samples.append((self.name + '_sum' + label_string(self.labels, key), counts[-1]))
+            samples.append((self.name + '_count' + label_string(self.labels, key), total))
+        return samples
+
+
+class HistogramTimer:
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        super().__init__()
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.monotonic() - self.start, **self.labels)
+
+
+class Metrics:
+    """ Registry of all metrics """
+
+    __lock = Lock()
+    __metrics = {}  # name => metric
+
+    @classmethod
+    def __register(cls, metric_class, name: str, documentation: str, **kwargs):
+        with Metrics.__lock:
+            metric = Metrics.__metrics.get(name)
+            if metric is None:
+                metric = metric_class(name=name, documentation=documentation, **kwargs)
+                Metrics.__metrics[name] = metric
+            assert isinstance(metric, metric_class), 'metric type error: %s' % name
+            return metric
+
+    @classmethod
+    def counter(cls, name: str, documentation: str, labels: tuple=()) -> Counter:
+        return cls.__register(Counter, name=name, documentation=documentation, labels=labels)
+
+    @classmethod
+    def gauge(cls, name: str, documentation: str, labels: tuple=()) -> Gauge:
+        return cls.__register(Gauge, name=name, documentation=documentation, labels=labels)
+
+    @classmethod
+    def histogram(cls, name: str, documentation: str, labels: tuple=(), buckets: tuple=None) -> Histogram:
+        return cls.__register(Histogram, name=name, documentation=documentation, labels=labels, buckets=buckets)
+
+    @classmethod
+    def metric(cls, name: str):
+        return Metrics.__metrics.get(name)
+
+    @classmethod
+    def exposition(cls) -> str:
+        """ All metrics in Prometheus text format """
+        with Metrics.__lock:
+            metrics = sorted(Metrics.__metrics.values(), key=lambda item: item.name)
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for name, value in metric.samples():
+                lines.append('%s %s' % (name, number_string(value)))
+        return '\n'.join(lines) + '\n'
+
+
+"""
+    Metrics Server
+    ~~~~~~~~~~~~~~
+
+    GET http://127.0.0.1:{port}/metrics
+"""
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ['/', '/metrics']:
+            self.send_error(404)
+            return
+        body = Metrics.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_string: str, *args):
+        # too noisy
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer(Thread):
+
+    def __init__(self, port: int, host: str='127.0.0.1'):
+        super().__init__(name='MetricsServer', daemon=True)
+        self.host = host
+        self.port = port
+        self.__server: Optional[HTTPServer] = None
+
+    def run(self):
+        self.__server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        self.__server.serve_forever()
+
+    def stop(self):
+        if self.__server is not None:
+            self.__server.shutdown()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Message Trace
+    ~~~~~~~~~~~~~
+
+    Stamp each stage of processing a message (in the same thread),
+    log the slow ones with stage breakdown and collect percentiles for stages.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from .log import Log
+from .metrics import Metrics
+
+
+stage_latency = Metrics.histogram(name='dim_message_stage_seconds', documentation='Time cost of message stages',
+                                  labels=('stage',))
+
+
+class MessageTrace:
+
+    # log messages cost more than this (seconds)
+    threshold = 1.0
+
+    # durations kept for percentiles of each stage
+    samples = 1000
+
+    __local = threading.local()
+    __lock = threading.Lock()
+    __durations = {}  # stage => deque
+
+    def __init__(self, title: str):
+        super().__init__()
+        self.title = title
+        self.start = time.monotonic()
+        self.last = self.start
+        self.stages = []  # [(stage, duration)]
+
+    @classmethod
+    def current(cls):  # -> Optional[MessageTrace]
+        return getattr(MessageTrace.__local, 'trace', None)
+
+    @classmethod
+    def begin(cls, title: str):
+        MessageTrace.__local.trace = cls(title=title)
+
+    @classmethod
+    def describe(cls, title: str):
+        trace = cls.current()
+        if trace is not None:
+            trace.title = title
+
+    @classmethod
+    def stage(cls, name: str):
+        """ Stamp the end of a stage, the duration counts from the previous stamp """
+        trace = cls.current()
+        if trace is None:
+            return
+        now = time.monotonic()
+        trace.stages.append((name, now - trace.last))
+        trace.last = now
+
+    @classmethod
+    def end(cls) -> Optional[float]:
+        """
+        Finish tracing current message
+
+        :return: total seconds
+        """
+        trace = cls.current()
+        if trace is None:
+            return None
+        MessageTrace.__local.trace = None
+        total = time.monotonic() - trace.start
+        with MessageTrace.__lock:
+            for name, duration in trace.stages:
+                durations = MessageTrace.__durations.get(name)
+                if durations is None:
+                    durations = deque(maxlen=cls.samples)
+                    MessageTrace.__durations[name] = durations
+                durations.append(duration)
+        for name, duration in trace.stages:
+            stage_latency.observe(duration, stage=name)
+        if total >= cls.threshold:
+            breakdown = ', '.join(['%s=%.3f' % (name, duration) for name, duration in trace.stages])
+            Log.info('MessageTrace >\tslow message (%.3fs) %s: %s' % (total, trace.title, breakdown))
+        return total
+
+    @classmethod
+    def percentiles(cls, points: tuple=(50, 90, 99)) -> dict:
+        """ Get percentiles of durations for each stage: {stage: {'count': n, 'p50': seconds, ...}} """
+        with MessageTrace.__lock:
+            items = [(name, sorted(durations)) for name, durations in MessageTrace.__durations.items()]
+        results = {}
+        for name, durations in items:
+            info = {'count': len(durations)}
+            for point in points:
+                index = min(len(durations) - 1, int(len(durations) * point / 100))
+                info['p%d' % point] = durations[index]
+            results[name] = info
+        return results
@@ -38,6 +38,8 @@ from libs.common.network.server import Server
 from .messenger import ServerMessenger
 from .dispatcher import Dispatcher
 from .filter import Filter
+from .apns import PushNotificationService
+from .snapshot import OnlineUsersSnapshot
 
 
 __all__ = [
@@ -50,4 +52,6 @@ __all__ = [
     'Server',
     'ServerMessenger',
     'Dispatcher', 'Filter',
+    'PushNotificationService',
+    'OnlineUsersSnapshot',
 ]
@@ -33,12 +33,16 @@
 from .handshake import HandshakeCommandProcessor, HandshakeDelegate
 from .report import ReportCommandProcessor
 from .login import LoginCommandProcessor
+from .receipt import ReceiptCommandProcessor
 from .search import SearchCommandProcessor, UsersCommandProcessor
+from .profiling import ProfilingCommandProcessor
 
 __all__ = [
     'HandshakeCommandProcessor', 'HandshakeDelegate',
     'ReportCommandProcessor',
     'LoginCommandProcessor',
+    'ReceiptCommandProcessor',
     'SearchCommandProcessor',
     'UsersCommandProcessor',
+    'ProfilingCommandProcessor',
 ]
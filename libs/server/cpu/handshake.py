@@ -61,6 +61,7 @@ class HandshakeCommandProcessor(CommandProcessor):
             # session verified success
             session.valid = True
             session.active = True
+            self.messenger.session_server.update_session(session=session)
             response = self.delegate.handshake_accepted(session=session)
             if response is None:
                 response = HandshakeCommand.success()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Command Processor for 'profiling'
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Profiling protocol (for administrators only)
+
+        {
+            command : "profiling",
+            action  : "start",     // or "stop"
+            mode    : "sampling",  // or "tracemalloc"
+            duration: 30,          // seconds
+            top     : 20,          // hot functions in reply
+            interval: 20           // milliseconds between samples
+        }
+"""
+
+import math
+import os
+from typing import Optional
+
+from dimp import ID
+from dimp import InstantMessage
+from dimp import Content, TextContent
+from dimp import Command
+from dimsdk import ReceiptCommand
+from dimsdk import CommandProcessor
+
+from ...common import Database
+from ..profiler import Profiler
+
+
+class ProfilingCommandProcessor(CommandProcessor):
+
+    @property
+    def database(self) -> Database:
+        return self.get_context('database')
+
+    @property
+    def administrators(self) -> list:
+        return self.get_context('administrators')
+
+    @property
+    def monitor(self):
+        return self.get_context('monitor')
+
+    def __report(self, receiver: ID):
+        monitor = self.monitor
+
+        def callback(text: str):
+            if monitor is not None:
+                monitor.send_report(text=text, receiver=receiver)
+        return callback
+
+    #
+    #   main
+    #
+    def process(self, content: Content, sender: ID, msg: InstantMessage) -> Optional[Content]:
+        assert isinstance(content, Command), 'command error: %s' % content
+        admins = self.administrators
+        if admins is None or sender not in admins:
+            return TextContent.new(text='Permission denied')
+        action = content.get('action', 'start')
+        if action == 'stop':
+            profiler = Profiler.current()
+            if profiler is None:
+                return TextContent.new(text='Profiling not started')
+            profiler.stop()
+            return ReceiptCommand.new(message='Profiling stopping')
+        mode = content.get('mode', 'sampling')
+        if mode not in Profiler.modes:
+            return TextContent.new(text='Profiling mode not support: %s' % mode)
+        duration = 30
+        try:
+            duration = float(content.get('duration', duration))
+        except (TypeError, ValueError):
+            pass
+        if not math.isfinite(duration):
+            duration = 30
+        duration = min(max(1.0, duration), Profiler.max_duration)
+        top = 20
+        try:
+            top = int(content.get('top', top))
+        except (TypeError, ValueError, OverflowError):
+            pass
+        top = min(max(1, top), Profiler.max_top)
+        interval = None
+        try:
+            interval = float(content.get('interval')) / 1000
+        except (TypeError, ValueError):
+            pass
+        if interval is not None and not math.isfinite(interval):
+            interval = None
+        directory = os.path.join(self.database.base_dir, 'profiles')
+        profiler = Profiler.launch(mode=mode, duration=duration, directory=directory, top=top, interval=interval,
+                                   callback=self.__report(receiver=sender))
+        if profiler is None:
+            return TextContent.new(text='Profiling in progress, try again later')
+        return ReceiptCommand.new(message='Profiling started (%s, %d seconds)' % (mode, profiler.duration))
+
+
+# register
+CommandProcessor.register(command='profiling', processor_class=ProfilingCommandProcessor)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Command Processor for 'receipt'
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Receipts for messages pushed by the station
+"""
+
+from typing import Optional
+
+from dimp import ID
+from dimp import InstantMessage
+from dimp import Content
+from dimp import Command
+from dimsdk import ReceiptCommand
+from dimsdk import CommandProcessor
+
+from ...common.cpu import ReceiptCommandProcessor as BaseReceiptCommandProcessor
+
+
+class ReceiptCommandProcessor(BaseReceiptCommandProcessor):
+
+    @property
+    def receptionist(self):
+        return self.get_context('receptionist')
+
+    #
+    #   main
+    #
+    def process(self, content: Content, sender: ID, msg: InstantMessage) -> Optional[Content]:
+        assert isinstance(content, ReceiptCommand), 'receipt command error: %s' % content
+        signature = content.get('signature')
+        receptionist = self.receptionist
+        if signature is not None and receptionist is not None:
+            # the client got the message pushed by the station, remove it from the queue
+            receptionist.acknowledge(identifier=sender, signature=signature)
+        return super().process(content=content, sender=sender, msg=msg)
+
+
+# register
+CommandProcessor.register(command=Command.RECEIPT, processor_class=ReceiptCommandProcessor)
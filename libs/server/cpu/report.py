@@ -66,6 +66,7 @@ class ReportCommandProcessor(CommandProcessor):
                 session.active = True
             else:
                 session.active = True
+            self.messenger.session_server.update_session(session=session)
             return ReceiptCommand.new(message='Client state received')
 
     #
@@ -112,6 +113,7 @@ class OnlineCommandProcessor(ReportCommandProcessor):
         session = self.messenger.current_session(identifier=sender)
         if isinstance(session, Session):
             session.active = True
+            self.messenger.session_server.update_session(session=session)
         return ReceiptCommand.new(message='Client online received')
 
 
@@ -126,6 +128,7 @@ class OfflineCommandProcessor(ReportCommandProcessor):
         session = self.messenger.current_session(identifier=sender)
         if isinstance(session, Session):
             session.active = False
+            self.messenger.session_server.update_session(session=session)
         return ReceiptCommand.new(message='Client offline received')
 
 
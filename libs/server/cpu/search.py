@@ -42,10 +42,16 @@ from dimsdk import CommandProcessor
 from ...common import SearchCommand
 from ...common import Database
 from ..session import SessionServer
+from ..snapshot import OnlineUsersSnapshot
 
 
 class SearchCommandProcessor(CommandProcessor):
 
+    # max users in one page with metas
+    max_metas = 20
+    # max users in one page without metas
+    max_ids = 200
+
     @property
     def database(self) -> Database:
         return self.get_context('database')
@@ -55,15 +61,32 @@ class SearchCommandProcessor(CommandProcessor):
     #
     def process(self, content: Content, sender: ID, msg: InstantMessage) -> Optional[Content]:
         assert isinstance(content, Command), 'command error: %s' % content
+        content = SearchCommand(content)
         # keywords
         keywords = content.get('keywords')
         if keywords is None:
             return TextContent.new(text='Search command error')
         keywords = keywords.split(' ')
-        # search in database
-        results = self.database.search(keywords=keywords)
+        # page size
+        ids_only = content.ids_only
+        limit = self.max_ids if ids_only else self.max_metas
+        try:
+            limit = min(max(1, int(content.limit)), limit)
+        except (TypeError, ValueError):
+            pass
+        # search one page in database (seek to the cursor, no re-scanning)
+        users, cursor = self.database.search_ids(keywords=keywords, cursor=content.cursor, max_count=limit)
+        if ids_only:
+            # client fetches metas lazily with 'meta' command
+            return SearchCommand.new(users=users, cursor=cursor, ids_only=True)
+        facebook = self.facebook
+        results = {}
+        for item in users:
+            meta = facebook.meta(identifier=item)
+            if meta is not None:
+                results[item] = meta
         users = list(results.keys())
-        return SearchCommand.new(users=users, results=results)
+        return SearchCommand.new(users=users, results=results, cursor=cursor)
 
 
 class UsersCommandProcessor(CommandProcessor):
@@ -72,11 +95,23 @@ class UsersCommandProcessor(CommandProcessor):
     def session_server(self) -> SessionServer:
         return self.get_context('session_server')
 
+    @property
+    def snapshot(self) -> Optional[OnlineUsersSnapshot]:
+        return self.get_context('users_snapshot')
+
     #
     #   main
     #
     def process(self, content: Content, sender: ID, msg: InstantMessage) -> Optional[Content]:
         assert isinstance(content, Command), 'command error: %s' % content
+        # serve from the shared snapshot
+        snapshot = self.snapshot
+        if snapshot is not None:
+            res = snapshot.sample()
+            if res is not None:
+                users, results = res
+                return SearchCommand.new(users=users, results=results)
+        # snapshot not ready, build it now
         facebook = self.facebook
         users = self.session_server.random_users()
         results = {}
@@ -39,10 +39,16 @@ from dimsdk import ReceiptCommand
 from dimsdk import ApplePushNotificationService
 
 from ..common import Database, Facebook
-from ..common import Log
+from ..common import Log, Metrics, MessageTrace
 from .session import SessionServer
 
 
+deliveries = Metrics.counter(name='dim_dispatcher_messages_total', documentation='Messages delivered by way',
+                             labels=('outcome',))
+notifications = Metrics.counter(name='dim_apns_notifications_total', documentation='Push notifications by result',
+                                labels=('result',))
+
+
 class Dispatcher:
 
     def __init__(self):
@@ -53,11 +59,17 @@ class Dispatcher:
         self.apns: ApplePushNotificationService = None
         self.neighbors: list = []
 
-    def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+    def info(self, msg: str, *args):
+        if len(args) == 0:
+            Log.info('%s >\t%s', self.__class__.__name__, msg)
+        else:
+            Log.info('%s >\t' + msg, self.__class__.__name__, *args)
 
-    def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+    def error(self, msg: str, *args):
+        if len(args) == 0:
+            Log.error('%s >\t%s', self.__class__.__name__, msg)
+        else:
+            Log.error('%s >\t' + msg, self.__class__.__name__, *args)
 
     @staticmethod
     def __receipt(message: str, msg: ReliableMessage) -> Content:
@@ -71,17 +83,19 @@ class Dispatcher:
     def __transmit(self, msg: ReliableMessage) -> bool:
         # TODO: broadcast to neighbor stations
         receiver = msg.envelope.receiver
-        self.info('transmitting to neighbors %s, receiver: %s' % (self.neighbors, receiver))
+        self.info('transmitting to neighbors %s, receiver: %s', self.neighbors, receiver)
         return False
 
     def __broadcast(self, msg: ReliableMessage) -> Optional[Content]:
         # TODO: split for all users
-        self.info('broadcasting message %s' % msg)
+        self.info('broadcasting message %s', msg)
+        deliveries.inc(outcome='broadcast')
         return self.__receipt(message='Message broadcasting', msg=msg)
 
     def __split_group_message(self, msg: ReliableMessage) -> Optional[Content]:
         receiver = self.facebook.identifier(msg.envelope.receiver)
         assert receiver.type.is_group(), 'receiver not a group: %s' % receiver
+        deliveries.inc(outcome='group')
         members = self.facebook.members(identifier=receiver)
         if members is not None:
             messages = msg.split(members=members)
@@ -116,37 +130,43 @@ class Dispatcher:
         # try for online user
         sessions = self.session_server.all(identifier=receiver)
         if sessions and len(sessions) > 0:
-            self.info('%s is online(%d), try to push message: %s' % (receiver, len(sessions), msg.envelope))
+            self.info('%s is online(%d), try to push message: %s', receiver, len(sessions), msg.envelope)
             success = 0
             for sess in sessions:
                 if sess.valid is False or sess.active is False:
-                    # self.info('session invalid %s' % sess)
+                    # self.info('session invalid %s', sess)
                     continue
                 request_handler = self.session_server.get_handler(client_address=sess.client_address)
                 if request_handler is None:
-                    self.error('handler lost: %s' % sess)
+                    self.error('handler lost: %s', sess)
                     continue
                 if request_handler.push_message(msg):
                     success = success + 1
                 else:
-                    self.error('failed to push message via connection (%s, %s)' % sess.client_address)
+                    self.error('failed to push message via connection (%s, %s)', *sess.client_address)
             if success > 0:
-                self.info('message pushed to activated session(%d) of user: %s' % (success, receiver))
+                self.info('message pushed to activated session(%d) of user: %s', success, receiver)
+                deliveries.inc(outcome='online')
+                MessageTrace.stage('push')
                 return self.__receipt(message='Message sent', msg=msg)
+        MessageTrace.stage('push')
         # store in local cache file
-        self.info('%s is offline, store message from: %s' % (receiver, sender))
+        self.info('%s is offline, store message from: %s', receiver, sender)
         self.database.store_message(msg)
+        deliveries.inc(outcome='offline')
+        MessageTrace.stage('store')
         # transmit to neighbor stations
         self.__transmit(msg=msg)
         # check mute-list
         if self.database.is_muted(sender=sender, receiver=receiver, group=group):
-            self.info('this sender/group is muted: %s' % msg)
+            self.info('this sender/group is muted: %s', msg)
         else:
             # push notification
             msg_type = msg.envelope.type
             if msg_type is None:
                 msg_type = 0
             self.__push_msg(sender=sender, receiver=receiver, group=group, msg_type=msg_type)
+            MessageTrace.stage('apns')
         # response
         return self.__receipt(message='Message delivering', msg=msg)
 
@@ -164,7 +184,8 @@ class Dispatcher:
         elif msg_type == ContentType.Video:
             something = 'a video'
         else:
-            self.info('ignore msg type: %d' % msg_type)
+            self.info('ignore msg type: %d', msg_type)
+            notifications.inc(result='ignored')
             return False
         from_name = self.facebook.nickname(identifier=sender)
         to_name = self.facebook.nickname(identifier=receiver)
@@ -174,5 +195,9 @@ class Dispatcher:
             # group message
             text += ' in group [%s]' % self.facebook.group_name(identifier=group)
         # push it
-        self.info('APNs message: %s' % text)
-        return self.apns.push(identifier=receiver, message=text)
+        self.info('APNs message: %s', text)
+        if self.apns.push(identifier=receiver, message=text):
+            notifications.inc(result='success')
+            return True
+        notifications.inc(result='failure')
+        return False
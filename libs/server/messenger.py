@@ -38,11 +38,16 @@ from dimp import Message, InstantMessage, ReliableMessage
 from dimsdk import ReceiptCommand
 from dimsdk import Session, Messenger
 
+from ..common import Metrics, MessageTrace
+
 from .session import SessionServer
 from .dispatcher import Dispatcher
 from .filter import Filter
 
 
+verify_latency = Metrics.histogram(name='dim_messenger_verify_seconds', documentation='Time cost of verifying messages')
+
+
 class ServerMessenger(Messenger):
 
     def __init__(self):
@@ -90,6 +95,11 @@ class ServerMessenger(Messenger):
         self.__session = session
         return session
 
+    @property
+    def session(self) -> Optional[Session]:
+        """ Current session, maybe not valid (handshake not accepted yet) """
+        return self.__session
+
     #
     #   Remote user
     #
@@ -112,7 +122,11 @@ class ServerMessenger(Messenger):
     # Override
     def process_message(self, msg: Message) -> Optional[Content]:
         if isinstance(msg, ReliableMessage):
-            s_msg = self.verify_message(msg=msg)
+            MessageTrace.stage('parse')
+            MessageTrace.describe('%s -> %s' % (msg.envelope.sender, msg.envelope.receiver))
+            with verify_latency.time():
+                s_msg = self.verify_message(msg=msg)
+            MessageTrace.stage('verify')
             if s_msg is None:
                 # waiting for sender's meta if not exists
                 return None
@@ -161,6 +175,7 @@ class ServerMessenger(Messenger):
     def deliver_message(self, msg: ReliableMessage) -> Optional[Content]:
         """ Deliver message to the receiver, or broadcast to neighbours """
         res = self.filter.check_deliver(msg=msg)
+        MessageTrace.stage('filter')
         if res is not None:
             # deliver is not allowed
             return res
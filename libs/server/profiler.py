@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Profiler
+    ~~~~~~~~
+
+    Profile the running station for a while in background:
+
+        'sampling'    - sample stacks of busy threads via sys._current_frames(),
+                        threads whose CPU time didn't advance are skipped
+        'tracemalloc' - compare memory snapshots at the beginning and the end
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Optional
+
+from ..common import Log
+
+
+def thread_cpu_time(ident: int) -> Optional[float]:
+    """ CPU time of the thread, None when the platform cannot tell """
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+class Profiler(threading.Thread):
+
+    modes = ['sampling', 'tracemalloc']
+
+    # seconds between samples
+    interval = 0.02
+    min_interval = 0.005
+    max_interval = 1.0
+
+    max_duration = 600
+    max_top = 100
+
+    # functions only waiting for others, the top frame of idle threads
+    # when the CPU time of threads is not available
+    idle_functions = {'wait', 'join', '_wait_for_tstate_lock', 'select', 'poll'}
+
+    __lock = threading.Lock()
+    __current = None
+
+    def __init__(self, mode: str, duration: float, directory: str, top: int=20, interval: float=None,
+                 callback=None):
+        super().__init__(name='Profiler', daemon=True)
+        self.mode = mode
+        self.duration = min(max(1.0, duration), self.max_duration)
+        if interval is not None:
+            self.interval = min(max(self.min_interval, interval), self.max_interval)
+        self.directory = directory
+        self.top = min(max(1, top), self.max_top)
+        # callback(text) with the top hot functions when finished
+        self.callback = callback
+        self.__stopped = threading.Event()
+
+    def info(self, msg: str):
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
+
+    def error(self, msg: str):
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
+
+    @classmethod
+    def current(cls):  # -> Optional[Profiler]
+        return Profiler.__current
+
+    @classmethod
+    def launch(cls, mode: str, duration: float, directory: str, top: int=20, interval: float=None,
+               callback=None):  # -> Optional[Profiler]
+        """ Start a profiling session, return None when another one is running """
+        assert mode in cls.modes, 'profiling mode error: %s' % mode
+        with Profiler.__lock:
+            if Profiler.__current is not None:
+                return None
+            profiler = cls(mode=mode, duration=duration, directory=directory, top=top, interval=interval,
+                           callback=callback)
+            Profiler.__current = profiler
+        profiler.start()
+        return profiler
+
+    def stop(self):
+        """ Finish the session before time """
+        self.__stopped.set()
+
+    def run(self):
+        self.info('%s profiling for %d second(s)' % (self.mode, self.duration))
+        try:
+            if self.mode == 'tracemalloc':
+                summary, details = self.__trace_memory()
+            else:
+                summary, details = self.__sample()
+            path = self.__save(text=summary + '\n\n' + details)
+            text = '%s\nstats saved: %s' % (summary, path)
+        except Exception as error:
+            self.error('profiling failed: %s' % error)
+            text = 'Profiling failed: %s' % error
+        finally:
+            with Profiler.__lock:
+                Profiler.__current = None
+        if self.callback is not None:
+            self.callback(text)
+
+    def __save(self, text: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        filename = '%s-%s.txt' % (time.strftime('%Y%m%d_%H%M%S'), self.mode)
+        path = os.path.join(self.directory, filename)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    #
+    #   Sampling
+    #
+    def __sample(self) -> (str, str):
+        own = threading.get_ident()
+        inclusive = {}  # function => samples
+        exclusive = {}  # function => samples
+        stacks = {}     # 'outer;...;inner' => samples
+        cpu_times = {}  # thread => CPU time at last sample
+        count = 0
+        idle = 0
+        expired = time.monotonic() + self.duration
+        while time.monotonic() < expired and not self.__stopped.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                # skip threads blocking in recv(), Condition.wait()...
+                cpu_time = thread_cpu_time(ident)
+                if cpu_time is None:
+                    busy = frame.f_code.co_name not in self.idle_functions
+                else:
+                    busy = ident in cpu_times and cpu_time > cpu_times[ident]
+                    cpu_times[ident] = cpu_time
+                if not busy:
+                    idle += 1
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append('%s (%s:%d)' % (code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if len(names) == 0:
+                    continue
+                count += 1
+                exclusive[names[0]] = exclusive.get(names[0], 0) + 1
+                for name in set(names):
+                    inclusive[name] = inclusive.get(name, 0) + 1
+                key = ';'.join(reversed(names))
+                stacks[key] = stacks.get(key, 0) + 1
+            time.sleep(self.interval)
+        if count == 0:
+            return 'No busy samples (%d idle)' % idle, ''
+        hot = sorted(exclusive.items(), key=lambda item: item[1], reverse=True)[:self.top]
+        lines = ['Sampling %d busy stack(s) (%d idle), top %d functions (self%%, total%%):'
+                 % (count, idle, len(hot))]
+        for name, samples in hot:
+            lines.append('%5.1f%% %5.1f%%  %s' % (100.0 * samples / count, 100.0 * inclusive[name] / count, name))
+        # collapsed stacks for flame graph tools
+        collapsed = ['%s %d' % (key, samples) for key, samples in sorted(stacks.items())]
+        return '\n'.join(lines), '\n'.join(collapsed)
+
+    #
+    #   Memory
+    #
+    def __trace_memory(self) -> (str, str):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            first = tracemalloc.take_snapshot()
+            self.__stopped.wait(timeout=self.duration)
+            second = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+        differences = second.compare_to(first, 'lineno')
+        hot = differences[:self.top]
+        lines = ['Memory growth in %d second(s), top %d lines:' % (self.duration, len(hot))]
+        for item in hot:
+            lines.append(str(item))
+        details = [str(item) for item in second.statistics('lineno')[:1000]]
+        return '\n'.join(lines), '\n'.join(details)
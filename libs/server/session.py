@@ -31,32 +31,187 @@
 """
 
 import random
+from threading import Lock
+from typing import Optional
 from weakref import WeakValueDictionary
 
+from dimp import ID
+from dimsdk import Session
 from dimsdk import SessionServer as Server
 
 
-class SessionServer(Server):
+class OnlineUsers:
+    """
+        Array with index for O(1) adding, removing and random sampling
+
+        array: [ID]
+        index: {ID: position in array}
+    """
 
     def __init__(self):
+        super().__init__()
+        self.__lock = Lock()
+        self.__array = []
+        self.__index = {}
+        self.__changes = 0
+
+    @property
+    def changes(self) -> int:
+        """ Total count of adding and removing """
+        return self.__changes
+
+    def __len__(self) -> int:
+        return len(self.__array)
+
+    def __contains__(self, identifier: ID) -> bool:
+        return identifier in self.__index
+
+    def add(self, identifier: ID) -> bool:
+        with self.__lock:
+            if identifier in self.__index:
+                return False
+            self.__index[identifier] = len(self.__array)
+            self.__array.append(identifier)
+            self.__changes += 1
+            return True
+
+    def remove(self, identifier: ID) -> bool:
+        with self.__lock:
+            pos = self.__index.pop(identifier, None)
+            if pos is None:
+                return False
+            # move the last one into the hole
+            last = self.__array.pop()
+            if pos < len(self.__array):
+                self.__array[pos] = last
+                self.__index[last] = pos
+            self.__changes += 1
+            return True
+
+    def all(self) -> list:
+        with self.__lock:
+            return list(self.__array)
+
+    def sample(self, count: int) -> list:
+        with self.__lock:
+            array = self.__array
+            if count >= len(array):
+                return list(array)
+            return [array[pos] for pos in random.sample(range(len(array)), count)]
+
+
+class SessionShard:
+    """ Sessions of some users: {ID: [Session]} """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = Lock()
+        self.pool = {}
+
+
+class SessionServer(Server):
+
+    def __init__(self, shards: int=16):
         super().__init__()
         self.__handlers: dict = WeakValueDictionary()
+        self.__handlers_lock = Lock()
+        self.__shards = [SessionShard() for _ in range(max(1, shards))]
+        self.__online = OnlineUsers()
 
+    def __shard(self, identifier: ID) -> SessionShard:
+        return self.__shards[hash(identifier) % len(self.__shards)]
+
+    #
+    #   Request handlers
+    #
     def set_handler(self, client_address, request_handler):
-        self.__handlers[client_address] = request_handler
+        with self.__handlers_lock:
+            self.__handlers[client_address] = request_handler
 
     def get_handler(self, client_address):
-        return self.__handlers.get(client_address)
+        with self.__handlers_lock:
+            return self.__handlers.get(client_address)
 
     def clear_handler(self, client_address):
-        self.__handlers.pop(client_address, None)
+        with self.__handlers_lock:
+            self.__handlers.pop(client_address, None)
+
+    #
+    #   Sessions
+    #
+    def get(self, identifier: ID, client_address) -> Optional[Session]:
+        shard = self.__shard(identifier=identifier)
+        with shard.lock:
+            sessions = shard.pool.get(identifier)
+            if sessions is not None:
+                for item in sessions:
+                    if item.client_address == client_address:
+                        return item
+
+    def new(self, identifier: ID, client_address) -> Session:
+        shard = self.__shard(identifier=identifier)
+        with shard.lock:
+            sessions = shard.pool.get(identifier)
+            if sessions is None:
+                sessions = []
+                shard.pool[identifier] = sessions
+            else:
+                for item in sessions:
+                    if item.client_address == client_address:
+                        return item
+            session = Session(identifier=identifier, client_address=client_address)
+            sessions.append(session)
+            # not online until the handshake accepted
+            return session
+
+    def all(self, identifier: ID) -> Optional[list]:
+        shard = self.__shard(identifier=identifier)
+        with shard.lock:
+            sessions = shard.pool.get(identifier)
+            if sessions is not None:
+                return list(sessions)
+
+    def remove(self, session: Session) -> bool:
+        identifier = session.identifier
+        shard = self.__shard(identifier=identifier)
+        with shard.lock:
+            sessions = shard.pool.get(identifier)
+            if sessions is None or session not in sessions:
+                return False
+            sessions.remove(session)
+            if len(sessions) == 0:
+                shard.pool.pop(identifier)
+            self.__update_online(identifier=identifier, sessions=sessions)
+            return True
+
+    def update_session(self, session: Session) -> bool:
+        """ Call after the session's 'valid' or 'active' changed """
+        identifier = session.identifier
+        shard = self.__shard(identifier=identifier)
+        with shard.lock:
+            sessions = shard.pool.get(identifier)
+            if sessions is None or session not in sessions:
+                return False
+            return self.__update_online(identifier=identifier, sessions=sessions)
+
+    def __update_online(self, identifier: ID, sessions: list) -> bool:
+        """ The user is online when any session is valid (handshake accepted) and active (foreground) """
+        for item in sessions:
+            if item.valid and item.active:
+                self.__online.add(identifier=identifier)
+                return True
+        self.__online.remove(identifier=identifier)
+        return False
+
+    def online_users(self) -> list:
+        return self.__online.all()
+
+    def online_count(self) -> int:
+        return len(self.__online)
+
+    def online_changes(self) -> int:
+        """ Count of users came online or went offline since started """
+        return self.__online.changes
 
     def random_users(self, max_count=20) -> list:
-        array = self.online_users()
-        count = len(array)
-        # limit the response
-        if count < 2:
-            return array
-        elif count > max_count:
-            count = max_count
-        return random.sample(array, count)
+        return self.__online.sample(count=max_count)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Online Users Snapshot
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    A pool of online users with their metas, rebuilt by one background thread
+    and shared by all 'users' requests.
+"""
+
+import random
+import time
+from threading import Thread, Condition
+from typing import Optional
+
+from ..common import Facebook
+from ..common import Log, Metrics
+from .session import SessionServer
+
+
+rebuilds = Metrics.counter(name='dim_users_snapshot_rebuilds_total', documentation='Online users snapshot rebuilds',
+                           labels=('reason',))
+
+
+class OnlineUsersSnapshot(Thread):
+
+    def __init__(self, interval: float=10, pool_size: int=100, churn: float=0.2):
+        super().__init__(name='OnlineUsersSnapshot', daemon=True)
+        self.session_server: SessionServer = None
+        self.facebook: Facebook = None
+        # seconds between rebuilding
+        self.interval = interval
+        # snapshot older than this will not be served (the builder is stuck?)
+        self.max_age = interval * 3
+        # online users in the snapshot, each response samples from them
+        self.pool_size = pool_size
+        # rebuild early when this ratio of online users came or went
+        self.churn = churn
+        # (built time, users, metas, session changes), replaced as a whole and never modified
+        self.__snapshot = None
+        self.__condition = Condition()
+        self.__running = False
+
+    def info(self, msg: str):
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
+
+    def error(self, msg: str):
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
+
+    def sample(self, count: int=20) -> Optional[tuple]:
+        """
+        Get online users with metas from current snapshot
+
+        :param count: max users
+        :return: (users, results), or None when the snapshot is not ready or too old
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            return None
+        built, users, results, _ = snapshot
+        if time.monotonic() - built > self.max_age:
+            return None
+        if count < len(users):
+            users = random.sample(users, count)
+            results = {item: results[item] for item in users if item in results}
+        return users, results
+
+    def __reason(self) -> Optional[str]:
+        """ Check whether the snapshot needs to be rebuilt """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            return 'initial'
+        built, users, _, changes = snapshot
+        if time.monotonic() - built >= self.interval:
+            return 'expired'
+        server = self.session_server
+        threshold = max(1, int(server.online_count() * self.churn))
+        if server.online_changes() - changes >= threshold:
+            return 'churn'
+
+    def rebuild(self):
+        server = self.session_server
+        facebook = self.facebook
+        changes = server.online_changes()
+        users = server.random_users(max_count=self.pool_size)
+        results = {}
+        for item in users:
+            meta = facebook.meta(identifier=item)
+            if meta is not None:
+                results[item] = meta
+        self.__snapshot = (time.monotonic(), users, results, changes)
+
+    def start(self):
+        self.__running = True
+        super().start()
+
+    def stop(self):
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+
+    def run(self):
+        self.info('starting...')
+        while self.__running:
+            reason = self.__reason()
+            if reason is not None:
+                try:
+                    self.rebuild()
+                    rebuilds.inc(reason=reason)
+                except Exception as error:
+                    self.error('failed to rebuild snapshot: %s' % error)
+            # check churn every second
+            with self.__condition:
+                if self.__running:
+                    self.__condition.wait(timeout=1.0)
+        self.info('exit!')
@@ -136,10 +136,10 @@ class ChatRoom:
         return self.messenger.facebook
 
     def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
 
     def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
 
     def refresh(self):
         now = time.time()
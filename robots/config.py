@@ -47,7 +47,8 @@ from libs.client import Terminal, ClientMessenger, ClientFacebook
 #
 #  Configurations
 #
-from etc.cfg_db import base_dir, ans_reserved_records
+from etc.cfg_db import base_dir, db_layout, ans_reserved_records
+from etc.cfg_db import cache_capacities, cache_missing_ttl, cache_watching
 from etc.cfg_gsp import station_id, all_stations
 from etc.cfg_bots import group_naruto
 from etc.cfg_bots import tuling_keys, tuling_ignores, xiaoi_keys, xiaoi_ignores
@@ -72,6 +73,11 @@ g_keystore = KeyStore()
 """
 g_database = Database()
 g_database.base_dir = base_dir
+g_database.layout = db_layout
+g_database.resize_caches(capacities=cache_capacities)
+g_database.missing_ttl = cache_missing_ttl
+if cache_watching:
+    g_database.start_watching()
 Log.info("database directory: %s" % g_database.base_dir)
 
 
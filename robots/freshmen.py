@@ -55,10 +55,10 @@ class FreshmenScanner(threading.Thread):
         self.__group: Group = g_facebook.group(gid)
 
     def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
 
     def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
 
     def __send_content(self, content: Content, receiver: ID) -> bool:
         return self.messenger.send_content(content=content, receiver=receiver)
@@ -93,10 +93,10 @@ class FreshmenScanner(threading.Thread):
         self.info('got %d member(s) in group: %s' % (len(members), self.__group))
         return members
 
-    def __save_members(self, members: list) -> bool:
+    def __add_member(self, member: ID) -> bool:
         gid = self.__group.identifier
         # TODO: check permission (whether myself in this group)
-        return g_facebook.save_members(members=members, identifier=gid)
+        return g_facebook.database.add_member(member=member, group=gid)
 
     def __response_meta(self) -> MetaCommand:
         gid = self.__group.identifier
@@ -150,11 +150,10 @@ class FreshmenScanner(threading.Thread):
         #  3. update group members
         #
         for item in freshmen:
-            # add freshmen to members
-            if item not in members:
-                members.append(item)
-        if self.__save_members(members=members):
-            self.info('group members updated: %s' % members)
+            # add freshmen to members, without rewriting the whole list
+            if self.__add_member(member=item):
+                self.info('group member added: %s' % item)
+        members = self.__members()
         #
         #  4.1. send group meta to all freshmen
         #
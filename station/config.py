@@ -30,37 +30,82 @@
     Configuration for DIM network server node
 """
 
+import time
+from threading import Thread
 from typing import Optional
 
 from dimp import ID
 from dimsdk import KeyStore
 
-from dimsdk import ApplePushNotificationService
 from dimsdk import ChatBot, Tuling, XiaoI
 from dimsdk.ans import keywords as ans_keywords
 
 #
 #  Common Libs
 #
-from libs.common import Log
+from libs.common import Log, MessageTrace
 from libs.common import Database, Facebook, AddressNameServer
 from libs.server import SessionServer, Server
 from libs.server import Dispatcher
+from libs.server import PushNotificationService
+from libs.server import OnlineUsersSnapshot
 
 #
 #  Configurations
 #
 from etc.cfg_apns import apns_credentials, apns_use_sandbox, apns_topic
-from etc.cfg_db import base_dir, ans_reserved_records
+from etc.cfg_db import base_dir, db_layout, ans_reserved_records
+from etc.cfg_db import cache_capacities, cache_missing_ttl, cache_watching
+from etc.cfg_db import msg_lane_weights
 from etc.cfg_admins import administrators
+from etc.cfg_admins import report_interval, report_limit, report_details
 from etc.cfg_gsp import all_stations, local_servers
 from etc.cfg_gsp import station_id, station_host, station_port, station_name
+from etc.cfg_gsp import station_receptionists, station_metrics_port, station_slow_message
+from etc.cfg_gsp import station_log_level, station_log_file, station_log_max_bytes, station_log_backups
+from etc.cfg_gsp import station_idle_timeout, station_heartbeat_timeout, station_users_refresh
 from etc.cfg_bots import tuling_keys, tuling_ignores, xiaoi_keys, xiaoi_ignores
 
 from etc.cfg_loader import load_station
 
 from .receptionist import Receptionist
 from .monitor import Monitor
+from .reaper import Reaper
+
+
+"""
+    Log
+    ~~~
+
+    Written by a background thread into stdout or rotated files
+"""
+Log.configure(level=station_log_level, path=station_log_file,
+              max_bytes=station_log_max_bytes, backups=station_log_backups)
+
+
+"""
+    Startup Timer
+    ~~~~~~~~~~~~~
+
+    Report time cost for each phase while starting up
+"""
+g_phase_time = time.time()
+
+
+def phase_finished(title: str):
+    global g_phase_time
+    now = time.time()
+    Log.info('-------- %s in %.3f second(s)' % (title, now - g_phase_time))
+    g_phase_time = now
+
+
+"""
+    Message Trace
+    ~~~~~~~~~~~~~
+
+    Log slow messages with time cost of each stage
+"""
+MessageTrace.threshold = station_slow_message
 
 
 """
@@ -80,6 +125,12 @@ g_keystore = KeyStore()
 """
 g_database = Database()
 g_database.base_dir = base_dir
+g_database.layout = db_layout
+g_database.resize_caches(capacities=cache_capacities)
+g_database.missing_ttl = cache_missing_ttl
+g_database.lane_weights = msg_lane_weights
+if cache_watching:
+    g_database.start_watching()
 Log.info("database directory: %s" % g_database.base_dir)
 
 
@@ -111,6 +162,11 @@ g_facebook.ans = g_ans
 """
 g_session_server = SessionServer()
 
+# online users with metas for 'users' command, rebuilt in background
+g_users_snapshot = OnlineUsersSnapshot(interval=station_users_refresh)
+g_users_snapshot.session_server = g_session_server
+g_users_snapshot.facebook = g_facebook
+
 
 """
     Apple Push Notification service (APNs)
@@ -118,7 +174,7 @@ g_session_server = SessionServer()
 
     A service for pushing notification to offline device
 """
-g_apns = ApplePushNotificationService(apns_credentials, use_sandbox=apns_use_sandbox)
+g_apns = PushNotificationService(apns_credentials, use_sandbox=apns_use_sandbox)
 g_apns.topic = apns_topic
 g_apns.delegate = g_database
 Log.info('APNs credentials: %s' % apns_credentials)
@@ -149,6 +205,9 @@ g_monitor.facebook = g_facebook
 g_monitor.keystore = g_keystore
 g_monitor.session_server = g_session_server
 g_monitor.apns = g_apns
+g_monitor.interval = report_interval
+g_monitor.limit = report_limit
+g_monitor.max_details = report_details
 
 
 """
@@ -157,12 +216,21 @@ g_monitor.apns = g_apns
 
     A message scanner for new guests who have just come in.
 """
-g_receptionist = Receptionist()
+g_receptionist = Receptionist(workers=station_receptionists)
 g_receptionist.session_server = g_session_server
 g_receptionist.database = g_database
 g_receptionist.apns = g_apns
 
 
+"""
+    Idle Connections Reaper
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Close connections which have been silent for too long.
+"""
+g_reaper = Reaper(idle_timeout=station_idle_timeout, heartbeat_timeout=station_heartbeat_timeout)
+
+
 """
     Chat Bots
     ~~~~~~~~~
@@ -252,6 +320,8 @@ def create_server(identifier: str, host: str, port: int=9394) -> Server:
     ~~~~~~~~~~~~
 """
 
+phase_finished(title='services created')
+
 # load ANS reserved records
 Log.info('-------- loading ANS reserved records')
 for key, value in ans_reserved_records.items():
@@ -269,13 +339,23 @@ for key, value in ans_reserved_records.items():
         g_ans.save(key, value)
 
 
-# scan accounts
-Log.info('-------- scanning accounts')
-g_database.scan_ids()
+phase_finished(title='ANS records loaded')
+
+# load accounts from snapshot, scan them again in background if outdated
+Log.info('-------- loading accounts')
+if not g_database.load_snapshot():
+    Log.info('accounts snapshot outdated, rebuilding in background')
+    Thread(target=g_database.rebuild_snapshot, name='AccountScanner', daemon=True).start()
+phase_finished(title='accounts loaded')
+
+# pending messages counters saved on last shutdown
+g_database.load_pending()
+phase_finished(title='pending messages loaded')
 
 # convert ID to Station
 Log.info('-------- loading stations: %d' % len(all_stations))
 all_stations = [load_station(identifier=item, facebook=g_facebook) for item in all_stations]
+phase_finished(title='stations loaded')
 
 # convert string to ID
 Log.info('-------- loading administrators: %d' % len(administrators))
@@ -284,6 +364,7 @@ administrators = [g_facebook.identifier(item) for item in administrators]
 # convert ID to Server
 Log.info('-------- creating servers: %d' % len(local_servers))
 local_servers = [create_server(identifier=item, host=station_host, port=station_port) for item in local_servers]
+phase_finished(title='servers created')
 
 # current station
 current_station = None
@@ -319,5 +400,6 @@ administrators = [g_facebook.identifier(item) for item in administrators]
 for admin in administrators:
     Log.info('add admin: %s' % admin)
     g_monitor.admins.add(admin)
+phase_finished(title='neighbors & administrators loaded')
 
 Log.info('======== configuration OK!')
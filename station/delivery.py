@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Delivery Window
+    ~~~~~~~~~~~~~~~
+
+    Sliding window for pushing one batch of offline messages,
+    messages are removed only after the client responded receipts for them.
+"""
+
+from typing import Optional
+
+from dimp import ID
+from dimp import ReliableMessage
+
+
+class DeliveryWindow:
+
+    # window size (messages waiting for receipts)
+    initial_window = 4
+    min_window = 1
+    max_window = 32
+
+    # retransmission timeout (seconds)
+    initial_timeout = 3.0
+    min_timeout = 1.0
+    max_timeout = 30.0
+    max_retries = 3
+
+    def __init__(self, identifier: ID, batch: dict, estimation: tuple=None):
+        super().__init__()
+        self.identifier = identifier
+        self.batch = batch
+        self.messages: list = batch.get('messages')
+        # window size & round-trip time estimated from previous batch
+        if estimation is None:
+            self.window = self.initial_window
+            self.__srtt = None
+            self.__rttvar = None
+            self.__min_rtt = None
+        else:
+            self.window, self.__srtt, self.__rttvar, self.__min_rtt = estimation
+        # sending status
+        self.__next = 0
+        self.__sending = {}    # signature => index (sent, not acknowledged)
+        self.__sent_time = {}  # index => time (in flight)
+        self.__retries = {}    # index => count
+        self.__lost = []       # indexes timeout, waiting for room in the window
+        self.__acked = set()
+        self.retransmits = 0
+        self.expired = False
+
+    @property
+    def estimation(self) -> tuple:
+        return self.window, self.__srtt, self.__rttvar, self.__min_rtt
+
+    @property
+    def timeout(self) -> float:
+        if self.__srtt is None:
+            return self.initial_timeout
+        rto = self.__srtt + 4 * self.__rttvar
+        return min(self.max_timeout, max(self.min_timeout, rto))
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """ Time to retransmit the earliest message not acknowledged """
+        if len(self.__sent_time) == 0:
+            return None
+        return min(self.__sent_time.values()) + self.timeout
+
+    @property
+    def finished(self) -> bool:
+        return len(self.__acked) == len(self.messages)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.__sent_time)
+
+    def outgoing(self, now: float) -> list:
+        """
+        Get messages to be sent: timeout ones first, then new ones in the window
+
+        :param now: current time
+        :return: messages
+        """
+        messages = []
+        # 1. take timeout messages out of flight
+        timeout = self.timeout
+        lost = [index for index, sent_time in self.__sent_time.items() if now - sent_time >= timeout]
+        if len(lost) > 0:
+            for index in lost:
+                if self.__retries.get(index, 0) >= self.max_retries:
+                    # no receipts from this client
+                    self.expired = True
+                    return []
+                self.__sent_time.pop(index)
+            self.__lost = sorted(self.__lost + lost)
+            # congested, halve the window once for each round
+            self.window = max(self.min_window, self.window // 2)
+        # 2. retransmit lost messages while the window is not full
+        while len(self.__sent_time) < self.window and len(self.__lost) > 0:
+            index = self.__lost.pop(0)
+            self.__retries[index] = self.__retries.get(index, 0) + 1
+            self.__sent_time[index] = now
+            self.retransmits += 1
+            messages.append(self.messages[index])
+        # 3. send new messages while the window is not full
+        while len(self.__sent_time) < self.window and self.__next < len(self.messages):
+            index = self.__next
+            msg: ReliableMessage = self.messages[index]
+            self.__sending[msg.get('signature')] = index
+            self.__sent_time[index] = now
+            messages.append(msg)
+            self.__next = index + 1
+        return messages
+
+    def acknowledge(self, signature: str, now: float) -> bool:
+        """
+        Receipt received for the message with signature
+
+        :param signature: message signature
+        :param now:       current time
+        :return: False on message not in this window
+        """
+        index = self.__sending.pop(signature, None)
+        if index is None:
+            return False
+        self.__acked.add(index)
+        sent_time = self.__sent_time.pop(index, None)
+        if sent_time is None:
+            # receipt for a lost message, no need to retransmit it now
+            self.__lost.remove(index)
+        elif self.__retries.get(index, 0) == 0:
+            # only sample RTT for messages not retransmitted
+            self.__update(rtt=now - sent_time)
+        return True
+
+    def __update(self, rtt: float):
+        if self.__srtt is None:
+            self.__srtt = rtt
+            self.__rttvar = rtt / 2
+            self.__min_rtt = rtt
+        else:
+            self.__rttvar = 0.75 * self.__rttvar + 0.25 * abs(self.__srtt - rtt)
+            self.__srtt = 0.875 * self.__srtt + 0.125 * rtt
+            self.__min_rtt = min(self.__min_rtt, rtt)
+        # grow the window while RTT stays close to the best one,
+        # shrink it when messages start queueing up in the client's connection
+        if rtt > 2 * self.__min_rtt:
+            self.window = max(self.min_window, self.window - 1)
+        else:
+            self.window = min(self.max_window, self.window + 1)
+
+    def split(self) -> (list, list):
+        """ Split messages into (acknowledged, rest) """
+        acked = []
+        rest = []
+        for index, msg in enumerate(self.messages):
+            if index in self.__acked:
+                acked.append(msg)
+            else:
+                rest.append(msg)
+        return acked, rest
@@ -33,6 +33,7 @@
 import hashlib
 import json
 import struct
+import time
 from socketserver import BaseRequestHandler
 from typing import Optional
 
@@ -41,14 +42,21 @@ from dimp import InstantMessage, ReliableMessage
 from dimsdk import NetMsgHead, NetMsg, CompletionHandler
 from dimsdk import MessengerDelegate
 
-from libs.common import Log, base64_encode
+from libs.common import Log, Metrics, MessageTrace, base64_encode
 from libs.server import Session
 from libs.server import ServerMessenger
 from libs.server import HandshakeDelegate
 
 from .config import g_database, g_facebook, g_keystore, g_session_server
-from .config import g_dispatcher, g_receptionist, g_monitor
-from .config import current_station, station_name, chat_bot
+from .config import g_dispatcher, g_receptionist, g_monitor, g_reaper, g_users_snapshot
+from .config import current_station, station_name, chat_bot, administrators
+
+
+connections = Metrics.gauge(name='dim_connections', documentation='Current client connections')
+traffic = Metrics.counter(name='dim_connection_bytes_total', documentation='Bytes received and sent',
+                          labels=('direction',))
+frames = Metrics.counter(name='dim_connection_frames_total', documentation='Message packages received by protocol',
+                         labels=('protocol',))
 
 
 class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
@@ -60,12 +68,22 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
         # handlers with Protocol
         self.process_package = None
         self.push_data = None
+        self.protocol: str = None
+        # idle tracking
+        self.last_active = time.monotonic()
+        self.heartbeats = False
+
+    def info(self, msg: str, *args):
+        if len(args) == 0:
+            Log.info('%s >\t%s', self.__class__.__name__, msg)
+        else:
+            Log.info('%s >\t' + msg, self.__class__.__name__, *args)
 
-    def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
-
-    def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+    def error(self, msg: str, *args):
+        if len(args) == 0:
+            Log.error('%s >\t%s', self.__class__.__name__, msg)
+        else:
+            Log.error('%s >\t' + msg, self.__class__.__name__, *args)
 
     @property
     def chat_bots(self) -> list:
@@ -91,7 +109,10 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
             # set context
             m.context['database'] = g_database
             m.context['session_server'] = g_session_server
+            m.context['users_snapshot'] = g_users_snapshot
             m.context['receptionist'] = g_receptionist
+            m.context['monitor'] = g_monitor
+            m.context['administrators'] = administrators
             m.context['bots'] = self.chat_bots
             m.context['handshake_delegate'] = self
             m.context['remote_address'] = self.client_address
@@ -110,28 +131,39 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
         self.__messenger: ServerMessenger = None
         self.process_package = None
         self.push_data = None
+        self.protocol = None
+        self.last_active = time.monotonic()
+        self.heartbeats = False
         address = self.client_address
         self.info('set up with %s [%s]' % (address, station_name))
+        connections.inc()
+        g_reaper.watch(handler=self)
         g_session_server.set_handler(client_address=address, request_handler=self)
-        g_monitor.report(message='Client connected %s [%s]' % (address, station_name))
+        g_monitor.report(message='Client connected %s [%s]' % (address, station_name), event='connect')
 
     def finish(self):
         address = self.client_address
         user = self.remote_user
         if user is None:
-            g_monitor.report(message='Client disconnected %s [%s]' % (address, station_name))
+            g_monitor.report(message='Client disconnected %s [%s]' % (address, station_name), event='disconnect')
         else:
             nickname = g_facebook.nickname(identifier=user.identifier)
             session = g_session_server.get(identifier=user.identifier, client_address=address)
             if session is None:
                 self.error('user %s not login yet %s %s' % (user, address, station_name))
             else:
-                g_monitor.report(message='User %s logged out %s [%s]' % (nickname, address, station_name))
+                g_monitor.report(message='User %s logged out %s [%s]' % (nickname, address, station_name),
+                                 event='logout')
                 # clear current session
                 g_session_server.remove(session=session)
+        # clear the session which has not finished handshake
+        if self.__messenger is not None and self.__messenger.session is not None:
+            g_session_server.remove(session=self.__messenger.session)
         # remove request handler fro session handler
         g_session_server.clear_handler(client_address=address)
+        g_reaper.forget(handler=self)
         self.__messenger = None
+        connections.dec()
         self.info('finish with %s %s' % (address, user))
 
     """
@@ -142,19 +174,26 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
         self.info('client connected (%s, %s)' % self.client_address)
         data = b''
         while current_station.running:
-            # receive all data
-            incomplete_length = len(data)
-            data = self.receive()
-            if len(data) == incomplete_length:
-                self.info('no more data, exit (%d, %s)' % (incomplete_length, self.client_address))
+            # receive all data, append to the incomplete package
+            received = self.receive()
+            if len(received) == 0:
+                self.info('no more data, exit (%d, %s)' % (len(data), self.client_address))
                 break
+            data += received
 
             # check protocol
             while self.process_package is None:
+                # heartbeat before any message, respond it without detecting protocol
+                if len(data.strip()) == 0:
+                    self.process_heartbeat()
+                    data = b''
+                    break
+
                 # (Protocol A) Web socket?
                 if data.find(b'Sec-WebSocket-Key') > 0:
                     self.process_package = self.process_ws_handshake
                     self.push_data = self.push_ws_data
+                    self.protocol = 'ws'
                     break
 
                 # (Protocol B) Tencent mars?
@@ -164,15 +203,17 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
                         # OK, it seems be a mars package!
                         self.process_package = self.process_mars_package
                         self.push_data = self.push_mars_data
+                        self.protocol = 'mars'
                         break
                 except ValueError:
                     # self.error('not mars message pack: %s' % error)
                     pass
 
                 # (Protocol C) raw data (JSON in line)?
-                if data.startswith(b'{"') and data.find(b'\0') < 0:
+                if data.lstrip().startswith(b'{"') and data.find(b'\0') < 0:
                     self.process_package = self.process_raw_package
                     self.push_data = self.push_raw_data
+                    self.protocol = 'raw'
                     break
 
                 # unknown protocol
@@ -265,8 +306,8 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
             body = self.received_package(mars.body)
             res = NetMsg(cmd=head.cmd, seq=head.seq, body=body)
         elif head.cmd == 6:
-            # TODO: handle NOOP request
-            self.info('receive NOOP package, cmd=%d, seq=%d, package: %s' % (head.cmd, head.seq, pack))
+            # NOOP: heartbeat package
+            self.heartbeats = True
             res = pack
         else:
             # TODO: handle Unknown request
@@ -286,15 +327,9 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
     #   Protocol: raw data (JSON string)
     #
     def process_raw_package(self, pack: bytes):
-        pack_len = len(pack)
-        pos = 0
-        # skip leading empty packages
-        while pack[pos] == b'\n' or pack[pos] == b' ':
-            pos += 1
-        if pos == pack_len:
+        if len(pack.strip()) == 0:
             # NOOP: heartbeat package
-            self.info('respond <heartbeats>: %s' % pack)
-            self.send(b'\n')
+            self.process_heartbeat()
             return b''
         # check whether contain incomplete message
         pos = pack.rfind(b'\n')
@@ -306,6 +341,11 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
         # return the remaining incomplete package
         return pack[pos+1:]
 
+    def process_heartbeat(self):
+        """ Respond heartbeat directly, without touching the messenger """
+        self.heartbeats = True
+        self.send(b'\n')
+
     def push_raw_data(self, body: bytes) -> bool:
         data = body + b'\n'
         return self.send(data=data)
@@ -326,6 +366,8 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
             if len(line) == 0:
                 self.info('ignore empty message')
                 continue
+            frames.inc(protocol=self.protocol)
+            MessageTrace.begin(title='from (%s, %s)' % self.client_address)
             try:
                 res = self.messenger.received_package(data=line)
                 if res is None:
@@ -333,11 +375,13 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
                     res = b''
                 else:
                     res = res + b'\n'
+                MessageTrace.stage('respond')
             except Exception as error:
-                self.error('parse message failed: %s' % error)
+                self.error('parse message failed: %s', error)
                 # from dimsdk import TextContent
                 # return TextContent.new(text='parse message failed: %s' % error)
                 res = b''
+            MessageTrace.end()
             body = body + res
         # all responses in one package
         return body
@@ -358,11 +402,15 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
             data += part
             if len(part) < 1024:
                 break
+        if len(data) > 0:
+            self.last_active = time.monotonic()
+        traffic.inc(len(data), direction='in')
         return data
 
     def send(self, data: bytes) -> bool:
         try:
             self.request.sendall(data)
+            traffic.inc(len(data), direction='out')
             return True
         except IOError as error:
             self.error('failed to send data %s' % error)
@@ -400,7 +448,7 @@ class RequestHandler(BaseRequestHandler, MessengerDelegate, HandshakeDelegate):
         user = g_facebook.user(identifier=sender)
         self.messenger.remote_user = user
         self.info('handshake accepted %s %s %s, %s' % (user.name, client_address, sender, session_key))
-        g_monitor.report(message='User %s logged in %s %s' % (user.name, client_address, sender))
+        g_monitor.report(message='User %s logged in %s %s' % (user.name, client_address, sender), event='login')
         # add the new guest for checking offline messages
         g_receptionist.add_guest(identifier=sender)
 
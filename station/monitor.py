@@ -27,10 +27,12 @@
     DIM Network Monitor
     ~~~~~~~~~~~~~~~~~~~
 
-    A dispatcher for sending reports to administrator(s)
+    A dispatcher for sending reports to administrator(s),
+    events are aggregated into periodic digests by a background thread.
 """
 
 import time
+from threading import Thread, Condition, current_thread
 
 from dimp import ID
 from dimp import TextContent
@@ -44,10 +46,10 @@ from libs.server import ServerMessenger
 from libs.server import SessionServer
 
 
-class Monitor:
+class Monitor(Thread):
 
     def __init__(self):
-        super().__init__()
+        super().__init__(name='Monitor', daemon=True)
         self.apns: ApplePushNotificationService = None
         self.session_server: SessionServer = None
         self.database: Database = None
@@ -57,12 +59,24 @@ class Monitor:
         self.sender: ID = None
         self.admins: set = set()
         self.__messenger: ServerMessenger = None
+        # digest settings
+        self.interval = 60     # seconds between digests
+        self.limit = 30        # max digests per hour
+        self.max_details = 10  # max event lines in a digest
+        # events waiting for next digest
+        self.__condition = Condition()
+        self.__counts = {}     # event => count
+        self.__details = []
+        self.__dropped = 0
+        self.__since = time.time()
+        self.__sent_times = []
+        self.__running = False
 
     def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
 
     def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
 
     @property
     def messenger(self) -> ServerMessenger:
@@ -73,11 +87,85 @@ class Monitor:
             self.__messenger = m
         return self.__messenger
 
-    def report(self, message: str) -> int:
+    def report(self, message: str, event: str='event') -> int:
+        """
+        Add an event into the next digest, the connection threads needn't wait for sending
+
+        :param message: event detail
+        :param event:   event name, e.g. 'connect', 'login'
+        :return: events count waiting in the digest
+        """
+        with self.__condition:
+            self.__counts[event] = self.__counts.get(event, 0) + 1
+            if len(self.__details) < self.max_details:
+                self.__details.append(message)
+            else:
+                self.__dropped += 1
+            return sum(self.__counts.values())
+
+    def start(self):
+        self.__running = True
+        super().start()
+
+    def stop(self, timeout: float=5):
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        if self.is_alive() and current_thread() is not self:
+            self.join(timeout=timeout)
+        # flush the pending events, even if the digest thread is stuck
+        self.__flush(force=True)
+
+    def run(self):
+        self.info('starting...')
+        while self.__running:
+            with self.__condition:
+                self.__condition.wait(timeout=self.interval)
+            self.__flush()
+        # last digest before shutdown
+        self.__flush()
+        self.info('exit!')
+
+    def __allowed(self, now: float) -> bool:
+        """ Check the rate cap of digests """
+        if self.limit <= 0:
+            return True
+        self.__sent_times = [t for t in self.__sent_times if now - t < 3600]
+        return len(self.__sent_times) < self.limit
+
+    def __flush(self, force: bool=False):
+        now = time.time()
+        with self.__condition:
+            if len(self.__counts) == 0:
+                self.__since = now
+                return
+            if not force and not self.__allowed(now=now):
+                # keep aggregating until allowed
+                return
+            counts = self.__counts
+            details = self.__details
+            dropped = self.__dropped
+            since = self.__since
+            self.__counts = {}
+            self.__details = []
+            self.__dropped = 0
+            self.__since = now
+            self.__sent_times.append(now)
+        summary = ', '.join(['%d %s(s)' % (counts[event], event) for event in sorted(counts)])
+        lines = ['%s in the last %d second(s)' % (summary, now - since)] + details
+        if dropped > 0:
+            lines.append('... and %d more' % dropped)
+        self.send(message='\n'.join(lines))
+
+    def send(self, message: str) -> int:
+        """ Send report to all administrators immediately """
         success = 0
         for receiver in self.admins:
-            if self.send_report(text=message, receiver=receiver):
-                success = success + 1
+            try:
+                if self.send_report(text=message, receiver=receiver):
+                    success = success + 1
+            except Exception as error:
+                self.error('failed to send report to %s: %s' % (receiver, error))
         return success
 
     def send_report(self, text: str, receiver: ID) -> bool:
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ==============================================================================
+
+"""
+    Idle Connections Reaper
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Close connections which have been silent for too long,
+    half-open sockets from mobile networks would hold their threads until the OS times them out.
+"""
+
+import math
+import socket
+import time
+from threading import Thread, Condition
+
+from libs.common import Log, Metrics
+
+
+reaped = Metrics.counter(name='dim_reaper_closed_total', documentation='Idle connections closed by the reaper',
+                         labels=('reason',))
+
+
+class TimerWheel:
+    """
+        Hashed timing wheel: one slot for each tick,
+        a key lives in exactly one slot, so schedule/cancel/advance are O(1) for each key
+    """
+
+    def __init__(self, slots: int=64):
+        self.__slots = [{} for _ in range(slots)]  # key => remaining rounds
+        self.__index = {}                          # key => slot
+        self.__cursor = 0
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__index
+
+    def schedule(self, key, ticks: int):
+        """ Expire the key after ticks (at least 1) """
+        self.cancel(key)
+        ticks = max(1, ticks)
+        count = len(self.__slots)
+        slot = (self.__cursor + ticks) % count
+        self.__slots[slot][key] = (ticks - 1) // count
+        self.__index[key] = slot
+
+    def cancel(self, key):
+        slot = self.__index.pop(key, None)
+        if slot is not None:
+            self.__slots[slot].pop(key, None)
+
+    def advance(self) -> list:
+        """ Move to next tick, return keys expired in it """
+        self.__cursor = (self.__cursor + 1) % len(self.__slots)
+        bucket = self.__slots[self.__cursor]
+        expired = []
+        for key, rounds in list(bucket.items()):
+            if rounds > 0:
+                bucket[key] = rounds - 1
+            else:
+                bucket.pop(key)
+                self.__index.pop(key)
+                expired.append(key)
+        return expired
+
+
+class Reaper(Thread):
+    """
+        Idle connections tracker
+
+        Each request handler updates its 'last_active' on receiving (no lock),
+        the wheel only re-checks it when the timer expires, and re-arms the timer
+        with the remaining time if the connection was active meanwhile.
+    """
+
+    def __init__(self, idle_timeout: float=600, heartbeat_timeout: float=180, tick: float=1.0):
+        super().__init__(name='Reaper', daemon=True)
+        # seconds without any data before closing the connection
+        self.idle_timeout = idle_timeout
+        # seconds without any data before closing the connection which has sent heartbeats
+        self.heartbeat_timeout = heartbeat_timeout
+        self.tick = tick
+        # one lap covers the longest timeout, so an active connection is visited once for each timeout
+        slots = math.ceil(max(idle_timeout, heartbeat_timeout) / tick) + 1
+        self.__wheel = TimerWheel(slots=slots)
+        self.__condition = Condition()
+        self.__running = False
+
+    def info(self, msg: str):
+        Log.info('%s >\t%s', self.__class__.__name__, msg)
+
+    def error(self, msg: str):
+        Log.error('%s >\t%s', self.__class__.__name__, msg)
+
+    def __len__(self) -> int:
+        with self.__condition:
+            return len(self.__wheel)
+
+    def timeout(self, handler) -> float:
+        if handler.heartbeats:
+            return self.heartbeat_timeout
+        else:
+            return self.idle_timeout
+
+    def __ticks(self, seconds: float) -> int:
+        return math.ceil(seconds / self.tick)
+
+    def watch(self, handler):
+        """ Start tracking a connection (with 'last_active' and 'heartbeats') """
+        with self.__condition:
+            self.__wheel.schedule(key=handler, ticks=self.__ticks(self.timeout(handler)))
+
+    def forget(self, handler):
+        with self.__condition:
+            self.__wheel.cancel(key=handler)
+
+    def start(self):
+        self.__running = True
+        super().start()
+
+    def stop(self):
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+
+    def run(self):
+        self.info('starting...')
+        next_tick = time.monotonic()
+        while self.__running:
+            next_tick += self.tick
+            with self.__condition:
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    self.__condition.wait(timeout=delay)
+                if not self.__running:
+                    break
+                idle = self.__expire(now=time.monotonic())
+            for handler in idle:
+                self.__close(handler=handler)
+        self.info('exit!')
+
+    def __expire(self, now: float) -> list:
+        """ Re-arm timers of active connections, return the idle ones """
+        idle = []
+        for handler in self.__wheel.advance():
+            remaining = handler.last_active + self.timeout(handler) - now
+            if remaining > 0:
+                self.__wheel.schedule(key=handler, ticks=self.__ticks(remaining))
+            else:
+                idle.append(handler)
+        return idle
+
+    def __close(self, handler):
+        reason = 'heartbeat' if handler.heartbeats else 'idle'
+        self.info('closing %s connection %s, silent for %d seconds'
+                  % (reason, handler.client_address, time.monotonic() - handler.last_active))
+        reaped.inc(reason=reason)
+        try:
+            # wake up the blocking 'recv()' in the handler thread, it will finish the session
+            handler.request.shutdown(socket.SHUT_RDWR)
+        except OSError as error:
+            self.error('failed to shutdown %s: %s' % (handler.client_address, error))
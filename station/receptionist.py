@@ -31,103 +31,351 @@
 """
 
 import time
+import zlib
 from json import JSONDecodeError
-from threading import Thread
+from threading import Thread, Condition
+from typing import Optional
 
 from dimp import ID
+from dimp import ReliableMessage
 from dimsdk import ApplePushNotificationService
 
 from libs.common import Database
-from libs.common import Log
+from libs.common import Log, Metrics
 from libs.server import Server, SessionServer
 
+from .delivery import DeliveryWindow
 
-class Receptionist(Thread):
 
-    def __init__(self):
-        super().__init__()
-        self.session_server: SessionServer = None
-        self.apns: ApplePushNotificationService = None
-        self.database: Database = None
-        # current station and guests
-        self.station: Server = None
-        self.guests = []
+backlogs = Metrics.gauge(name='dim_receptionist_backlog', documentation='Guests waiting in each shard',
+                         labels=('shard',))
+windows = Metrics.gauge(name='dim_receptionist_windows', documentation='Batches waiting for receipts in each shard',
+                        labels=('shard',))
+
+
+class ReceptionistWorker(Thread):
+    """
+        Offline messages pusher for one shard of guests,
+        each guest is served by one worker only
+    """
+
+    def __init__(self, receptionist, shard: int):
+        super().__init__(name='Receptionist-%d' % shard)
+        self.receptionist = receptionist
+        self.shard = shard
+        self.__condition = Condition()
+        # waiting guests
+        self.__guests = []
+        self.__waiting = set()
+        # receipts waiting to be processed: [(ID, signature)]
+        self.__receipts = []
+        # guests responding receipts: {ID: estimation of last window}
+        self.__reliable = {}
+        # delivering batches: {ID: DeliveryWindow}
+        self.__windows = {}
+        # guest in flight
+        self.__serving: ID = None
+        # statistics
+        self.__max_backlog = 0
+        self.__batches = 0
+        self.__messages = 0
+        self.__retransmits = 0
 
     def info(self, msg: str):
-        Log.info('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.info('%s >\t%s', self.name, msg)
 
     def error(self, msg: str):
-        Log.error('%s >\t%s' % (self.__class__.__name__, msg))
+        Log.error('%s >\t%s', self.name, msg)
+
+    @property
+    def session_server(self) -> SessionServer:
+        return self.receptionist.session_server
+
+    @property
+    def database(self) -> Database:
+        return self.receptionist.database
+
+    @property
+    def apns(self) -> ApplePushNotificationService:
+        return self.receptionist.apns
+
+    @property
+    def running(self) -> bool:
+        return self.receptionist.station.running
 
     def add_guest(self, identifier: ID):
-        self.guests.append(identifier)
+        """ Wake up the worker to check messages for this guest """
+        with self.__condition:
+            if identifier not in self.__waiting:
+                self.__waiting.add(identifier)
+                self.__guests.append(identifier)
+                if len(self.__guests) > self.__max_backlog:
+                    self.__max_backlog = len(self.__guests)
+                backlogs.set(len(self.__guests), shard=self.shard)
+            self.__condition.notify()
+
+    def acknowledge(self, identifier: ID, signature: str):
+        """ Receipt responded by the guest for the message with signature """
+        with self.__condition:
+            self.__receipts.append((identifier, signature))
+            self.__condition.notify()
+
+    def stop(self):
+        with self.__condition:
+            self.__condition.notify_all()
+
+    def statistics(self) -> dict:
+        with self.__condition:
+            return {
+                'shard': self.shard,
+                'backlog': len(self.__guests),
+                'max_backlog': self.__max_backlog,
+                'serving': None if self.__serving is None else str(self.__serving),
+                'windows': len(self.__windows),
+                'batches': self.__batches,
+                'messages': self.__messages,
+                'retransmits': self.__retransmits,
+            }
+
+    def __next_event(self) -> (ID, list):
+        """ Block until there is a guest or receipt, or some messages timeout """
+        deadline = None
+        for window in self.__windows.values():
+            expired = window.deadline
+            if expired is not None and (deadline is None or expired < deadline):
+                deadline = expired
+        with self.__condition:
+            self.__serving = None
+            while len(self.__guests) == 0 and len(self.__receipts) == 0:
+                if not self.running:
+                    return None, None
+                if deadline is None:
+                    # check station status every second
+                    self.__condition.wait(timeout=1.0)
+                    continue
+                delay = deadline - time.time()
+                if delay <= 0:
+                    return None, []
+                self.__condition.wait(timeout=min(delay, 1.0))
+            receipts = self.__receipts
+            self.__receipts = []
+            if len(self.__guests) == 0:
+                return None, receipts
+            identifier = self.__guests.pop(0)
+            self.__waiting.discard(identifier)
+            self.__serving = identifier
+            backlogs.set(len(self.__guests), shard=self.shard)
+            return identifier, receipts
+
+    def __push(self, sessions: list, msg: ReliableMessage) -> bool:
+        """ Push message to all active sessions of the guest """
+        success = 0
+        for sess in sessions:
+            if sess.valid is False or sess.active is False:
+                # self.info('session invalid %s' % sess)
+                continue
+            request_handler = self.session_server.get_handler(client_address=sess.client_address)
+            if request_handler is None:
+                self.error('handler lost: %s' % sess)
+                continue
+            if request_handler.push_message(msg):
+                success = success + 1
+            else:
+                self.error('failed to push message (%s, %s)' % sess.client_address)
+        return success > 0
+
+    def __load_batch(self, identifier: ID) -> Optional[dict]:
+        # 1. get all sessions of the receiver
+        self.info('checking session for new guest %s' % identifier)
+        sessions = self.session_server.all(identifier=identifier)
+        if sessions is None or len(sessions) == 0:
+            self.info('guest not connect, remove it: %s' % identifier)
+            return None
+        # 2. this guest is connected, scan new messages for it
+        self.info('%s is connected, scanning messages for it' % identifier)
+        batch = self.database.load_message_batch(identifier)
+        if batch is None:
+            self.info('no message for this guest, remove it: %s' % identifier)
+            self.apns.clear_badge(identifier=identifier)
+            return None
+        batch['sessions'] = sessions
+        return batch
+
+    def __receive(self, identifier: ID) -> bool:
+        """
+        Push a batch of offline messages to the guest,
+        regard them as delivered once written into the socket (for clients not responding receipts)
+
+        :return: True if more messages are waiting for this guest
+        """
+        batch = self.__load_batch(identifier=identifier)
+        if batch is None:
+            return False
+        sessions = batch.pop('sessions')
+        messages = batch.get('messages')
+        if messages is None or len(messages) == 0:
+            self.error('message batch error: %s' % batch)
+            # raise AssertionError('message batch error: %s' % batch)
+            return True
+        # 3. send new messages to each session
+        self.info('got %d message(s) for %s' % (len(messages), identifier))
+        count = 0
+        for msg in messages:
+            # try to push message
+            if self.__push(sessions=sessions, msg=msg):
+                # push message success (at least one)
+                count = count + 1
+            else:
+                # push message failed, remove session here?
+                break
+        # 4. remove messages after success, or remove the guest on failed
+        total_count = len(messages)
+        self.info('a batch message(%d/%d) pushed to %s' % (count, total_count, identifier))
+        self.database.remove_message_batch(batch, removed_count=count)
+        self.__batches += 1
+        self.__messages += count
+        if count < total_count:
+            self.error('pushing message failed, remove the guest: %s' % identifier)
+            return False
+        return True
+
+    def __open_window(self, identifier: ID) -> bool:
+        """
+        Start pushing a batch of offline messages to the guest with a sliding window
+
+        :return: False on no message for this guest
+        """
+        batch = self.__load_batch(identifier=identifier)
+        if batch is None:
+            return False
+        batch.pop('sessions')
+        messages = batch.get('messages')
+        if messages is None or len(messages) == 0:
+            self.error('message batch error: %s' % batch)
+            return True
+        estimation = self.__reliable.get(identifier)
+        window = DeliveryWindow(identifier=identifier, batch=batch, estimation=estimation)
+        self.info('got %d message(s) for %s, window: %d' % (len(messages), identifier, window.window))
+        self.__windows[identifier] = window
+        return True
+
+    def __close_window(self, window: DeliveryWindow, more: bool):
+        """ Remove acknowledged messages, write the rest back """
+        identifier = window.identifier
+        self.__windows.pop(identifier, None)
+        self.__retransmits += window.retransmits
+        acked, rest = window.split()
+        self.info('a batch message(%d/%d) acknowledged by %s' % (len(acked), len(window.messages), identifier))
+        if len(acked) > 0:
+            batch = window.batch
+            batch['messages'] = acked + rest
+            self.database.remove_message_batch(batch, removed_count=len(acked))
+            self.__batches += 1
+            self.__messages += len(acked)
+        if window.expired:
+            # no receipts for too long, push as old client next time
+            self.error('receipts timeout, fall back to pushing without receipts: %s' % identifier)
+            self.__reliable.pop(identifier, None)
+            more = True
+        else:
+            self.__reliable[identifier] = window.estimation
+        if more:
+            self.add_guest(identifier=identifier)
+
+    def __acknowledge(self, identifier: ID, signature: str):
+        if identifier not in self.__reliable:
+            self.info('guest responds receipts, push with window from now on: %s' % identifier)
+            self.__reliable[identifier] = None
+        window = self.__windows.get(identifier)
+        if window is not None:
+            window.acknowledge(signature=signature, now=time.time())
+
+    def __slide_windows(self):
+        now = time.time()
+        for identifier, window in list(self.__windows.items()):
+            sessions = self.session_server.all(identifier=identifier)
+            if sessions is None or len(sessions) == 0:
+                self.info('guest not connect, remove it: %s' % identifier)
+                self.__close_window(window=window, more=False)
+                continue
+            messages = window.outgoing(now=now)
+            if window.expired or window.finished:
+                self.__close_window(window=window, more=True)
+                continue
+            for msg in messages:
+                # failed messages will be retransmitted after timeout
+                self.__push(sessions=sessions, msg=msg)
+        windows.set(len(self.__windows), shard=self.shard)
+
+    def __serve(self, identifier: ID):
+        if identifier in self.__windows:
+            # delivering
+            return
+        if identifier in self.__reliable:
+            self.__open_window(identifier=identifier)
+        elif self.__receive(identifier=identifier):
+            # more messages, check again after other guests
+            self.add_guest(identifier=identifier)
+
+    def __process(self, identifier: Optional[ID], receipts: list):
+        try:
+            for item in receipts:
+                self.__acknowledge(identifier=item[0], signature=item[1])
+            if identifier is not None:
+                self.__serve(identifier=identifier)
+            self.__slide_windows()
+        except IOError as error:
+            self.error('IO error %s' % error)
+        except JSONDecodeError as error:
+            self.error('JSON decode error %s' % error)
+        except TypeError as error:
+            self.error('type error %s' % error)
+        except ValueError as error:
+            self.error('value error %s' % error)
 
     def run(self):
         self.info('starting...')
-        while self.station.running:
-            try:
-                guests = self.guests.copy()
-                for identifier in guests:
-                    # 1. get all sessions of the receiver
-                    self.info('checking session for new guest %s' % identifier)
-                    sessions = self.session_server.all(identifier=identifier)
-                    if sessions is None or len(sessions) == 0:
-                        self.info('guest not connect, remove it: %s' % identifier)
-                        self.guests.remove(identifier)
-                        continue
-                    # 2. this guest is connected, scan new messages for it
-                    self.info('%s is connected, scanning messages for it' % identifier)
-                    batch = self.database.load_message_batch(identifier)
-                    if batch is None:
-                        self.info('no message for this guest, remove it: %s' % identifier)
-                        self.guests.remove(identifier)
-                        self.apns.clear_badge(identifier=identifier)
-                        continue
-                    messages = batch.get('messages')
-                    if messages is None or len(messages) == 0:
-                        self.error('message batch error: %s' % batch)
-                        # raise AssertionError('message batch error: %s' % batch)
-                        continue
-                    # 3. send new messages to each session
-                    self.info('got %d message(s) for %s' % (len(messages), identifier))
-                    count = 0
-                    for msg in messages:
-                        # try to push message
-                        success = 0
-                        for sess in sessions:
-                            if sess.valid is False or sess.active is False:
-                                # self.info('session invalid %s' % sess)
-                                continue
-                            request_handler = self.session_server.get_handler(client_address=sess.client_address)
-                            if request_handler is None:
-                                self.error('handler lost: %s' % sess)
-                                continue
-                            if request_handler.push_message(msg):
-                                success = success + 1
-                            else:
-                                self.error('failed to push message (%s, %s)' % sess.client_address)
-                        if success > 0:
-                            # push message success (at least one)
-                            count = count + 1
-                        else:
-                            # push message failed, remove session here?
-                            break
-                    # 4. remove messages after success, or remove the guest on failed
-                    total_count = len(messages)
-                    self.info('a batch message(%d/%d) pushed to %s' % (count, total_count, identifier))
-                    self.database.remove_message_batch(batch, removed_count=count)
-                    if count < total_count:
-                        self.error('pushing message failed, remove the guest: %s' % identifier)
-                        self.guests.remove(identifier)
-            except IOError as error:
-                self.error('IO error %s' % error)
-            except JSONDecodeError as error:
-                self.error('JSON decode error %s' % error)
-            except TypeError as error:
-                self.error('type error %s' % error)
-            except ValueError as error:
-                self.error('value error %s' % error)
-            finally:
-                # sleep for next loop
-                time.sleep(0.01)
+        while True:
+            identifier, receipts = self.__next_event()
+            if receipts is None:
+                break
+            self.__process(identifier=identifier, receipts=receipts)
         self.info('exit!')
+
+
+class Receptionist:
+    """
+        Dispatch guests to workers by identifier hash,
+        so one guest's messages are always pushed in order by the same worker
+    """
+
+    def __init__(self, workers: int=4):
+        super().__init__()
+        self.session_server: SessionServer = None
+        self.apns: ApplePushNotificationService = None
+        self.database: Database = None
+        # current station
+        self.station: Server = None
+        self.__workers = [ReceptionistWorker(receptionist=self, shard=index) for index in range(max(1, workers))]
+
+    def __worker(self, identifier: ID) -> ReceptionistWorker:
+        index = zlib.crc32(str(identifier).encode('utf-8')) % len(self.__workers)
+        return self.__workers[index]
+
+    def add_guest(self, identifier: ID):
+        self.__worker(identifier=identifier).add_guest(identifier=identifier)
+
+    def acknowledge(self, identifier: ID, signature: str):
+        self.__worker(identifier=identifier).acknowledge(identifier=identifier, signature=signature)
+
+    def start(self):
+        for worker in self.__workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.__workers:
+            worker.stop()
+
+    def statistics(self) -> list:
+        """ Backlog of each shard """
+        return [worker.statistics() for worker in self.__workers]
@@ -33,6 +33,7 @@
 
 from socketserver import TCPServer, ThreadingTCPServer
 
+import signal
 import sys
 import os
 
@@ -41,27 +42,60 @@ rootPath = os.path.split(curPath)[0]
 sys.path.append(rootPath)
 sys.path.append(os.path.join(rootPath, 'libs'))
 
-from libs.common import Log
+from libs.common import Log, MetricsServer, MessageTrace
 
 from station.handler import RequestHandler
 
-from station.config import g_receptionist, current_station
+from station.config import g_database, g_receptionist, g_monitor, g_reaper, g_users_snapshot
+from station.config import current_station
+from station.config import phase_finished, station_metrics_port
+
+
+def dump_status(signum, frame):
+    Log.info('memory caches:\n%s' % g_database.dump_caches())
+    for info in g_receptionist.statistics():
+        Log.info('receptionist shard %(shard)d: backlog=%(backlog)d (max %(max_backlog)d), serving=%(serving)s,'
+                 ' windows=%(windows)d, batches=%(batches)d, messages=%(messages)d,'
+                 ' retransmits=%(retransmits)d' % info)
+    for stage, info in MessageTrace.percentiles().items():
+        Log.info('message stage %s: count=%d, p50=%.3f, p90=%.3f, p99=%.3f'
+                 % (stage, info['count'], info['p50'], info['p90'], info['p99']))
+    Log.info('reaper watching %d connections' % len(g_reaper))
 
 
 if __name__ == '__main__':
 
+    # kill -USR1 {pid} to dump memory caches, receptionist backlogs, message stages and connections
+    signal.signal(signal.SIGUSR1, dump_status)
+
     current_station.running = True
     g_receptionist.start()
+    g_monitor.start()
+    g_reaper.start()
+    g_users_snapshot.start()
+
+    # GET http://127.0.0.1:{port}/metrics
+    if station_metrics_port > 0:
+        MetricsServer(port=station_metrics_port).start()
 
     # start TCP Server
     try:
         TCPServer.allow_reuse_address = True
         server = ThreadingTCPServer(server_address=(current_station.host, current_station.port),
                                     RequestHandlerClass=RequestHandler)
+        phase_finished(title='server bound')
         Log.info('server (%s:%s) is listening...' % (current_station.host, current_station.port))
         server.serve_forever()
     except KeyboardInterrupt as ex:
         Log.info('~~~~~~~~ %s' % ex)
     finally:
         current_station.running = False
+        g_receptionist.stop()
+        g_monitor.stop()
+        g_reaper.stop()
+        g_users_snapshot.stop()
+        g_database.save_snapshot()
+        g_database.save_pending()
+        g_database.flush()
         Log.info('======== station shutdown!')
+        Log.flush()
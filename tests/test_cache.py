@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Cache Test
+    ~~~~~~~~~~
+
+    LRU cache with missing marks and TTL
+"""
+
+import time
+import unittest
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+
+from libs.common.utils.cache import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_lru(self):
+        print('\n---------------- %s' % self)
+        cache = LRUCache(name='test_lru', max_entries=3)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        # 'a' is recently used now
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('d', 4)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.pop('c'), 3)
+        self.assertEqual(cache.get('c', 'default'), 'default')
+
+    def test_max_bytes(self):
+        print('\n---------------- %s' % self)
+        cache = LRUCache(name='test_max_bytes', max_bytes=1000)
+        for i in range(10):
+            cache.put('key%d' % i, 'x' * 200)
+        self.assertTrue(cache.bytes <= 1000)
+        self.assertTrue(len(cache) < 10)
+        self.assertIn('key9', cache)
+        # size is measured again when putting the changed value
+        cache = LRUCache(name='test_changed_value')
+        value = ['x' * 100]
+        cache.put('list', value)
+        size = cache.bytes
+        value.append('y' * 100)
+        cache.put('list', value)
+        self.assertTrue(cache.bytes > size)
+
+    def test_missing(self):
+        print('\n---------------- %s' % self)
+        cache = LRUCache(name='test_missing')
+        cache.put_missing('nobody')
+        self.assertIs(cache.get('nobody'), LRUCache.MISSING)
+        self.assertNotIn('nobody', cache)
+        self.assertEqual(cache.avoided, 2)
+        # real value replaces the mark
+        cache.put('nobody', {'name': 'somebody'})
+        self.assertEqual(cache.get('nobody'), {'name': 'somebody'})
+        self.assertIn('nobody', cache)
+
+    def test_ttl(self):
+        print('\n---------------- %s' % self)
+        cache = LRUCache(name='test_ttl', ttl=0.05)
+        cache.put('short', 1)
+        cache.put('long', 2, ttl=60)
+        cache.put_missing('missing', ttl=0.05)
+        self.assertEqual(cache.get('short'), 1)
+        self.assertIs(cache.get('missing'), LRUCache.MISSING)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('long'), 2)
+        self.assertEqual(cache.expirations, 2)
+        self.assertEqual(len(cache), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Delivery Window Test
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Sliding window for offline messages
+"""
+
+import unittest
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+
+from station.delivery import DeliveryWindow
+
+
+def new_window(count: int, window: int=None) -> DeliveryWindow:
+    messages = [{'signature': 'sig%d' % i, 'data': 'msg%d' % i} for i in range(count)]
+    batch = {'messages': messages}
+    if window is None:
+        return DeliveryWindow(identifier='user@station', batch=batch)
+    return DeliveryWindow(identifier='user@station', batch=batch, estimation=(window, None, None, None))
+
+
+def signatures(messages: list) -> list:
+    return [msg['signature'] for msg in messages]
+
+
+class DeliveryWindowTestCase(unittest.TestCase):
+
+    def test_window(self):
+        print('\n---------------- %s' % self)
+        window = new_window(count=10)
+        self.assertEqual(signatures(window.outgoing(now=0)), ['sig0', 'sig1', 'sig2', 'sig3'])
+        self.assertEqual(window.in_flight, 4)
+        # window is full
+        self.assertEqual(window.outgoing(now=0.1), [])
+        self.assertTrue(window.acknowledge(signature='sig0', now=0.1))
+        self.assertFalse(window.acknowledge(signature='sig0', now=0.1))
+        self.assertFalse(window.acknowledge(signature='sig9', now=0.1))
+        # window grows after a fast receipt
+        self.assertEqual(window.window, 5)
+        self.assertEqual(signatures(window.outgoing(now=0.1)), ['sig4', 'sig5'])
+        self.assertEqual(window.in_flight, 5)
+        self.assertFalse(window.finished)
+
+    def test_finished(self):
+        print('\n---------------- %s' % self)
+        window = new_window(count=3)
+        now = 0
+        while not window.finished:
+            for msg in window.outgoing(now=now):
+                self.assertTrue(window.acknowledge(signature=msg['signature'], now=now + 0.1))
+            now += 0.1
+        acked, rest = window.split()
+        self.assertEqual(signatures(acked), ['sig0', 'sig1', 'sig2'])
+        self.assertEqual(rest, [])
+        self.assertEqual(window.retransmits, 0)
+
+    def test_retransmit_in_shrunk_window(self):
+        print('\n---------------- %s' % self)
+        window = new_window(count=10, window=6)
+        self.assertEqual(len(window.outgoing(now=0)), 6)
+        # all timeout, window shrinks to 3, only 3 of them retransmitted
+        now = window.deadline
+        self.assertEqual(signatures(window.outgoing(now=now)), ['sig0', 'sig1', 'sig2'])
+        self.assertEqual(window.window, 3)
+        self.assertEqual(window.in_flight, 3)
+        self.assertEqual(window.retransmits, 3)
+        self.assertEqual(window.outgoing(now=now), [])
+        # receipts for the first transmission of a lost message, don't retransmit it
+        self.assertTrue(window.acknowledge(signature='sig4', now=now))
+        self.assertTrue(window.acknowledge(signature='sig0', now=now))
+        self.assertEqual(signatures(window.outgoing(now=now)), ['sig3'])
+        self.assertTrue(window.acknowledge(signature='sig1', now=now))
+        self.assertTrue(window.acknowledge(signature='sig2', now=now))
+        # the rest lost ones before new messages
+        self.assertEqual(signatures(window.outgoing(now=now)), ['sig5', 'sig6'])
+        self.assertEqual(window.retransmits, 5)
+        acked, rest = window.split()
+        self.assertEqual(signatures(acked), ['sig0', 'sig1', 'sig2', 'sig4'])
+
+    def test_expired(self):
+        print('\n---------------- %s' % self)
+        window = new_window(count=1)
+        now = 0
+        window.outgoing(now=now)
+        for _ in range(DeliveryWindow.max_retries):
+            now = window.deadline
+            self.assertEqual(len(window.outgoing(now=now)), 1)
+            self.assertFalse(window.expired)
+        now = window.deadline
+        self.assertEqual(window.outgoing(now=now), [])
+        self.assertTrue(window.expired)
+        self.assertFalse(window.finished)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Name Index Test
+    ~~~~~~~~~~~~~~~
+
+    Full-text index for searching accounts by names
+"""
+
+import unittest
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+
+from libs.common.database.name_index import NameIndex, name_tokens
+
+
+class NameTokensTestCase(unittest.TestCase):
+
+    def test_words(self):
+        print('\n---------------- %s' % self)
+        self.assertEqual(name_tokens(name='Albert Moky'), ['albert', 'moky'])
+        self.assertEqual(name_tokens(name='hello-world, v2!'), ['hello', 'world', 'v2'])
+        # unique tokens
+        self.assertEqual(name_tokens(name='Moky moky MOKY'), ['moky'])
+        # full width
+        self.assertEqual(name_tokens(name='ＭＯＫＹ  Ｌｅｅ'), ['moky', 'lee'])
+        self.assertEqual(name_tokens(name='  '), [])
+
+    def test_cjk(self):
+        print('\n---------------- %s' % self)
+        self.assertEqual(name_tokens(name='张三丰'), ['张三', '三丰', '丰'])
+        self.assertEqual(name_tokens(name='张'), ['张'])
+        self.assertEqual(name_tokens(name='Moky张三 v2'), ['moky', '张三', '三', 'v2'])
+
+
+class NameIndexTestCase(unittest.TestCase):
+
+    @staticmethod
+    def new_index() -> NameIndex:
+        index = NameIndex()
+        index.load(names={
+            'a@x': 'Moky',
+            'b@x': 'Albert Moky',
+            'c@x': 'Moky Lee Junior',
+            'd@x': '张三丰',
+            'e@x': 'Lee',
+        })
+        return index
+
+    @staticmethod
+    def ids(results: list) -> list:
+        return [item[1] for item in results]
+
+    def test_search(self):
+        print('\n---------------- %s' % self)
+        index = self.new_index()
+        self.assertEqual(len(index), 5)
+        # prefix of tokens
+        self.assertEqual(set(self.ids(index.search(keywords=['mo']))), {'a@x', 'b@x', 'c@x'})
+        self.assertEqual(self.ids(index.search(keywords=['三'])), ['d@x'])
+        self.assertEqual(self.ids(index.search(keywords=['张三丰'])), ['d@x'])
+        # every keyword must match
+        self.assertEqual(self.ids(index.search(keywords=['moky', 'lee'])), ['c@x'])
+        self.assertEqual(index.search(keywords=['moky', 'nobody']), [])
+        self.assertEqual(index.search(keywords=[' ']), [])
+
+    def test_ranking(self):
+        print('\n---------------- %s' % self)
+        index = self.new_index()
+        # exact name first, then names covered more by the keyword
+        self.assertEqual(self.ids(index.search(keywords=['moky'])), ['a@x', 'c@x', 'b@x'])
+        self.assertEqual(self.ids(index.search(keywords=['Lee'])), ['e@x', 'c@x'])
+        results = index.search(keywords=['moky'])
+        self.assertEqual(results, sorted(results, key=lambda item: (-item[0], item[1])))
+        self.assertEqual(len(index.search(keywords=['moky'], limit=2)), 2)
+
+    def test_paging(self):
+        print('\n---------------- %s' % self)
+        index = NameIndex()
+        index.load(names={'user%04d@x' % i: 'Moky %d' % (i % 7) for i in range(1500)})
+        everything = index.search(keywords=['moky'])
+        self.assertEqual(len(everything), 1500)
+        self.assertEqual(index.candidates(keywords=['moky']), set([item[1] for item in everything]))
+        self.assertEqual(index.candidates(keywords=['nobody']), set())
+        # seek to the cursor, no cap on the ranks
+        results = []
+        page = index.search(keywords=['moky'], limit=100)
+        while len(page) > 0:
+            results.extend(page)
+            page = index.search(keywords=['moky'], after=page[-1], limit=100)
+        self.assertEqual(results, everything)
+
+    def test_update(self):
+        print('\n---------------- %s' % self)
+        index = self.new_index()
+        self.assertFalse(index.update(identifier='a@x', name='Moky'))
+        self.assertTrue(index.update(identifier='a@x', name='Hulk'))
+        self.assertEqual(index.name(identifier='a@x'), 'Hulk')
+        self.assertEqual(set(self.ids(index.search(keywords=['moky']))), {'b@x', 'c@x'})
+        self.assertEqual(self.ids(index.search(keywords=['hulk'])), ['a@x'])
+        # remove
+        self.assertTrue(index.update(identifier='d@x', name=None))
+        self.assertIsNone(index.name(identifier='d@x'))
+        self.assertEqual(index.search(keywords=['张']), [])
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.rows(), {'a@x': 'Hulk', 'b@x': 'Albert Moky', 'c@x': 'Moky Lee Junior', 'e@x': 'Lee'})
+
+
+if __name__ == '__main__':
+    unittest.main()
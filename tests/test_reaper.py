@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Reaper Test
+    ~~~~~~~~~~~
+
+    Timer wheel for idle connections
+"""
+
+import unittest
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+
+from station.reaper import TimerWheel
+
+
+def expire_ticks(wheel: TimerWheel, ticks: int) -> dict:
+    """ Advance the wheel, return key => tick expired """
+    results = {}
+    for tick in range(1, ticks + 1):
+        for key in wheel.advance():
+            results[key] = tick
+    return results
+
+
+class TimerWheelTestCase(unittest.TestCase):
+
+    def test_schedule(self):
+        print('\n---------------- %s' % self)
+        wheel = TimerWheel(slots=8)
+        for ticks in [1, 3, 7, 8, 9, 20]:
+            wheel.schedule(key='key%d' % ticks, ticks=ticks)
+        self.assertEqual(len(wheel), 6)
+        results = expire_ticks(wheel=wheel, ticks=30)
+        self.assertEqual(results, {'key%d' % ticks: ticks for ticks in [1, 3, 7, 8, 9, 20]})
+        self.assertEqual(len(wheel), 0)
+
+    def test_at_least_one_tick(self):
+        print('\n---------------- %s' % self)
+        wheel = TimerWheel(slots=4)
+        wheel.schedule(key='zero', ticks=0)
+        wheel.schedule(key='negative', ticks=-5)
+        self.assertEqual(set(wheel.advance()), {'zero', 'negative'})
+        self.assertEqual(wheel.advance(), [])
+
+    def test_reschedule_and_cancel(self):
+        print('\n---------------- %s' % self)
+        wheel = TimerWheel(slots=4)
+        wheel.schedule(key='a', ticks=2)
+        wheel.schedule(key='b', ticks=2)
+        wheel.advance()
+        # re-arm from current tick
+        wheel.schedule(key='a', ticks=5)
+        wheel.cancel(key='b')
+        wheel.cancel(key='unknown')
+        self.assertNotIn('b', wheel)
+        self.assertIn('a', wheel)
+        self.assertEqual(len(wheel), 1)
+        results = expire_ticks(wheel=wheel, ticks=10)
+        self.assertEqual(results, {'a': 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
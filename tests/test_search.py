@@ -0,0 +1,109 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Search Index Test
+    ~~~~~~~~~~~~~~~~~
+
+    Prefix index for searching accounts page by page
+"""
+
+import unittest
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+
+from libs.common.database.search_index import SearchIndex, search_keyword
+
+
+def new_index(count: int) -> SearchIndex:
+    index = SearchIndex()
+    rows = [['user%02d@address%d' % (i, i % 3), 1000000000 + i] for i in range(count)]
+    index.update(rows=rows)
+    return index
+
+
+def all_pages(index: SearchIndex, keywords: list, limit: int) -> list:
+    results = []
+    array, cursor = index.page(keywords=keywords, limit=limit)
+    results.extend(array)
+    while cursor is not None:
+        array, cursor = index.page(keywords=keywords, cursor=cursor, limit=limit)
+        results.extend(array)
+    return results
+
+
+class SearchIndexTestCase(unittest.TestCase):
+
+    def test_keyword(self):
+        print('\n---------------- %s' % self)
+        self.assertEqual(search_keyword(keyword=' Moky '), 'moky')
+        self.assertEqual(search_keyword(keyword='123-456-7890'), '1234567890')
+        self.assertIsNone(search_keyword(keyword='  '))
+
+    def test_search(self):
+        print('\n---------------- %s' % self)
+        index = new_index(count=30)
+        self.assertEqual(len(index), 30)
+        self.assertEqual(index.update(rows=[['user00@address0', 1000000000]]), 0)
+        # name, address and search number prefixes
+        self.assertEqual(len(index.search(keywords=['user'], limit=100)), 30)
+        self.assertEqual(len(index.search(keywords=['ADDRESS1'], limit=100)), 10)
+        self.assertEqual(index.search(keywords=['100-000-0012']), ['user12@address0'])
+        # every keyword must match
+        self.assertEqual(index.search(keywords=['user1', 'address2']), ['user11@address2', 'user14@address2',
+                                                                      'user17@address2'])
+        self.assertEqual(index.search(keywords=['nobody']), [])
+        self.assertEqual(index.search(keywords=[' ']), [])
+
+    def test_paging(self):
+        print('\n---------------- %s' % self)
+        index = new_index(count=30)
+        everything = index.search(keywords=['user'], limit=100)
+        for limit in [1, 7, 10, 29, 30, 100]:
+            self.assertEqual(all_pages(index=index, keywords=['user'], limit=limit), everything)
+        self.assertEqual(all_pages(index=index, keywords=['address1', 'user'], limit=3),
+                         index.search(keywords=['address1', 'user'], limit=100))
+        # last page has no cursor
+        array, cursor = index.page(keywords=['user'], limit=30)
+        self.assertEqual(len(array), 30)
+        self.assertIsNone(cursor)
+
+    def test_overlapping_keywords(self):
+        print('\n---------------- %s' % self)
+        index = SearchIndex()
+        index.update(rows=[['abx@aaa3', 1], ['aby@aaa4', 2], ['abz@aaa5', 3], ['abc@zz1', 4], ['abd@zz2', 5]])
+        everything = index.search(keywords=['a', 'ab'], limit=100)
+        self.assertEqual(len(everything), 5)
+        for limit in [1, 2, 3, 5]:
+            self.assertEqual(all_pages(index=index, keywords=['a', 'ab'], limit=limit), everything)
+            self.assertEqual(all_pages(index=index, keywords=['ab', 'a'], limit=limit),
+                             index.search(keywords=['ab', 'a'], limit=100))
+
+    def test_stable_cursor(self):
+        print('\n---------------- %s' % self)
+        index = new_index(count=30)
+        first, cursor = index.page(keywords=['user'], limit=10)
+        # changes before the cursor don't shift the next page
+        index.update(rows=[['user00a@address9', 2000000000]])
+        index.remove(identifier=first[0])
+        second, cursor = index.page(keywords=['user'], cursor=cursor, limit=10)
+        self.assertEqual(second, ['user%02d@address%d' % (i, i % 3) for i in range(10, 20)])
+        self.assertIsNotNone(cursor)
+
+    def test_bad_cursor(self):
+        print('\n---------------- %s' % self)
+        index = new_index(count=10)
+        self.assertEqual(index.page(keywords=['user'], cursor='no-space'), ([], None))
+        self.assertEqual(index.page(keywords=['user'], cursor='user01 user01@address1'), ([], None))
+        self.assertEqual(index.page(keywords=['user'], cursor='1 user01 user01@address1'), ([], None))
+        # cursor from another search
+        self.assertEqual(index.page(keywords=['user'], cursor='0 address1 user01@address1'), ([], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
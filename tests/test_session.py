@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Session Server Test
+    ~~~~~~~~~~~~~~~~~~~
+
+    Stress test for concurrent connects and disconnects
+"""
+
+import random
+import threading
+import unittest
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+
+from libs.server.session import SessionServer, OnlineUsers
+
+
+class OnlineUsersTestCase(unittest.TestCase):
+
+    def test_add_remove(self):
+        print('\n---------------- %s' % self)
+        users = OnlineUsers()
+        for i in range(10):
+            self.assertTrue(users.add('user%d' % i))
+        self.assertFalse(users.add('user3'))
+        self.assertTrue(users.remove('user3'))
+        self.assertFalse(users.remove('user3'))
+        self.assertTrue(users.remove('user9'))
+        self.assertTrue(users.remove('user0'))
+        self.assertEqual(len(users), 7)
+        self.assertEqual(set(users.all()), {'user%d' % i for i in [1, 2, 4, 5, 6, 7, 8]})
+
+    def test_sample(self):
+        print('\n---------------- %s' % self)
+        users = OnlineUsers()
+        for i in range(100):
+            users.add('user%d' % i)
+        array = users.sample(count=20)
+        self.assertEqual(len(array), 20)
+        self.assertEqual(len(set(array)), 20)
+        self.assertTrue(set(array).issubset(set(users.all())))
+        self.assertEqual(len(users.sample(count=200)), 100)
+
+
+class SessionServerTestCase(unittest.TestCase):
+
+    users = 200
+    threads = 16
+    rounds = 2000
+
+    def test_concurrent_connections(self):
+        print('\n---------------- %s' % self)
+        server = SessionServer(shards=8)
+        errors = []
+
+        def connections(seed: int):
+            rand = random.Random(seed)
+            mine = []
+            try:
+                for i in range(self.rounds):
+                    if len(mine) > 0 and rand.random() < 0.45:
+                        # disconnect
+                        session = mine.pop(rand.randrange(len(mine)))
+                        self.assertTrue(server.remove(session=session))
+                    else:
+                        # connect
+                        identifier = 'user%d@station' % rand.randrange(self.users)
+                        address = ('10.0.%d.%d' % (seed, i % 250), 10000 + i)
+                        session = server.new(identifier=identifier, client_address=address)
+                        self.assertIs(server.get(identifier=identifier, client_address=address), session)
+                        # handshake accepted
+                        session.valid = True
+                        session.active = True
+                        self.assertTrue(server.update_session(session=session))
+                        mine.append(session)
+                    # 'users' command
+                    for item in server.random_users(max_count=20):
+                        self.assertTrue(item.startswith('user'))
+                # disconnect all before exit, except the first one
+                for session in mine[1:]:
+                    self.assertTrue(server.remove(session=session))
+            except Exception as error:
+                errors.append(error)
+
+        workers = [threading.Thread(target=connections, args=(seed,)) for seed in range(self.threads)]
+        for item in workers:
+            item.start()
+        for item in workers:
+            item.join()
+        self.assertEqual(errors, [])
+        # only users with sessions are online
+        online = server.online_users()
+        self.assertEqual(len(online), len(set(online)))
+        self.assertEqual(server.online_count(), len(online))
+        for identifier in online:
+            sessions = server.all(identifier=identifier)
+            self.assertIsNotNone(sessions)
+            self.assertTrue(len(sessions) > 0)
+        total = sum([len(server.all(identifier=identifier)) for identifier in online])
+        self.assertEqual(total, self.threads)
+
+    def test_invalid_and_inactive(self):
+        print('\n---------------- %s' % self)
+        server = SessionServer(shards=4)
+        # handshake not accepted
+        guest = server.new(identifier='guest@station', client_address=('10.0.0.1', 10001))
+        guest.valid = False
+        self.assertFalse(server.update_session(session=guest))
+        # accepted
+        user = server.new(identifier='user@station', client_address=('10.0.0.2', 10002))
+        user.valid = True
+        user.active = True
+        self.assertTrue(server.update_session(session=user))
+        # accepted, but went background
+        sleeper = server.new(identifier='sleeper@station', client_address=('10.0.0.3', 10003))
+        sleeper.valid = True
+        sleeper.active = True
+        server.update_session(session=sleeper)
+        sleeper.active = False
+        self.assertFalse(server.update_session(session=sleeper))
+        for _ in range(10):
+            self.assertEqual(server.random_users(max_count=20), ['user@station'])
+        self.assertEqual(server.online_users(), ['user@station'])
+        self.assertEqual(server.online_count(), 1)
+        # back to foreground
+        sleeper.active = True
+        server.update_session(session=sleeper)
+        self.assertEqual(set(server.random_users(max_count=20)), {'user@station', 'sleeper@station'})
+        # one of two connections closed, still online
+        other = server.new(identifier='user@station', client_address=('10.0.0.4', 10004))
+        other.valid = True
+        other.active = True
+        server.update_session(session=other)
+        self.assertTrue(server.remove(session=user))
+        self.assertIn('user@station', server.online_users())
+        # connections closed
+        self.assertTrue(server.remove(session=other))
+        self.assertTrue(server.remove(session=guest))
+        self.assertEqual(server.online_users(), ['sleeper@station'])
+        self.assertIsNone(server.all(identifier='guest@station'))
+        self.assertFalse(server.update_session(session=guest))
+
+
+if __name__ == '__main__':
+    unittest.main()
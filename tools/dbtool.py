@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ==============================================================================
+# MIT License
+#
+# Copyright (c) 2019 Albert Moky
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+    Database Tool
+    ~~~~~~~~~~~~~
+
+    Maintenance commands for the station database
+
+    usages:
+        python3 tools/dbtool.py migrate        # move entities into sharded layout
+        python3 tools/dbtool.py rebuild-groups # rebuild 'groups.txt' for all users
+"""
+
+import sys
+import os
+
+curPath = os.path.abspath(os.path.dirname(__file__))
+rootPath = os.path.split(curPath)[0]
+sys.path.append(rootPath)
+sys.path.append(os.path.join(rootPath, 'libs'))
+
+from libs.common import Log
+from libs.common import Database
+
+from etc.cfg_db import base_dir, db_layout
+
+
+def migrate(database: Database):
+    """ Move all entity directories into 'public/ab/cd/{ADDRESS}',
+        the station can keep running while migrating
+    """
+    if database.layout != 'sharded':
+        Log.error('set "db_layout = \'sharded\'" in etc/cfg_db.py before migrating')
+        return
+    count = database.migrate_layout()
+    # run again for the directories created while migrating
+    if count > 0:
+        database.migrate_layout()
+    database.flush()
+
+
+def rebuild_groups(database: Database):
+    """ Rebuild user -> groups index from all 'members.txt' """
+    database.rebuild_groups()
+    database.flush()
+
+
+commands = {
+    'migrate': migrate,
+    'rebuild-groups': rebuild_groups,
+}
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print('usages: %s %s' % (sys.argv[0], '|'.join(commands.keys())))
+        sys.exit(1)
+
+    g_database = Database()
+    g_database.base_dir = base_dir
+    g_database.layout = db_layout
+    Log.info('database directory: %s (%s)' % (g_database.base_dir, g_database.layout))
+
+    commands[sys.argv[1]](g_database)
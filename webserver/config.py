@@ -45,7 +45,8 @@ from libs.server import ServerMessenger
 #
 #  Configurations
 #
-from etc.cfg_db import base_dir, ans_reserved_records
+from etc.cfg_db import base_dir, db_layout, ans_reserved_records
+from etc.cfg_db import cache_capacities, cache_missing_ttl, cache_watching
 
 """
     Key Store
@@ -63,6 +64,11 @@ g_keystore = KeyStore()
 """
 g_database = Database()
 g_database.base_dir = base_dir
+g_database.layout = db_layout
+g_database.resize_caches(capacities=cache_capacities)
+g_database.missing_ttl = cache_missing_ttl
+if cache_watching:
+    g_database.start_watching()
 Log.info("database directory: %s" % g_database.base_dir)
 
 """